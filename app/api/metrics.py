@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from app.utils.db_utils import count_jobs_by_status
+
+router = APIRouter()
+
+class JobCountCollector(Collector):
+    """Jobs are queued and processed by other processes, so the queue depth is read at scrape time."""
+
+    def _family(self) -> GaugeMetricFamily:
+        return GaugeMetricFamily("ingestion_jobs", "Jobs in the jobs table, by status; in_queue is the queue depth.",
+                                 labels=["status"])
+
+    def describe(self):
+        # Lets the registry check names without querying the database at import
+        yield self._family()
+
+    def collect(self):
+        gauge = self._family()
+        for status, count in (count_jobs_by_status() or {}).items():
+            gauge.add_metric([status], count)
+        yield gauge
+
+REGISTRY.register(JobCountCollector())
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -1,31 +1,95 @@
+import os
+import json
 import uuid
 import logging
+from typing import Dict, Optional, Tuple
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Depends, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from app.schemas.ingestion import IngestResponse
-from app.schemas.retrieval import RetrieveRequest, RetrieveResponse
-from app.schemas.job import Job, JobListResponse
+from app.schemas.retrieval import RetrieveRequest, RetrieveResponse, BatchRetrieveRequest, BatchRetrieveResponse
+from app.schemas.job import Job, JobListResponse, KnowledgeBaseSummary, KnowledgeBaseListResponse
 from app.utils.file_utils import save_uploaded_file
-from app.workers.ingestion import process_ingestion
-from app.utils.db_utils import add_job, get_job_status, get_all_jobs, get_job
+from app.config import settings
+from app.utils.db_utils import add_job_if_queue_below, get_job_status, get_jobs_page, get_job, count_jobs_with_status, get_kb_collections, get_kb_summaries
 from app.services.retrieval_service import RetrievalService
+from app.services.progress_feed import ProgressFeed
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def get_retrieval_service(request: Request) -> RetrievalService:
+    """Returns the RetrievalService shared by all requests, created in the app lifespan."""
+    return request.app.state.retrieval_service
+
+def get_progress_feed(request: Request) -> ProgressFeed:
+    """Returns the ProgressFeed shared by all requests, created in the app lifespan."""
+    return request.app.state.progress_feed
+
+def resolve_search_scope(collection_name: Optional[str] = None, kb_name: Optional[str] = None,
+                         document: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Maps a retrieval target to the collection to search and the payload filters to apply.
+    A job ID resolves to the collection holding its points: re-ingested or duplicate documents
+    are stored in the collection of the job that first ingested them, and in the shared
+    collection a job's search is narrowed to its document. A kb_name searches every document
+    of the knowledge base, which requires them to live in one collection.
+    """
+    filters = {}
+    if collection_name is not None:
+        job = get_job(collection_name)
+        if job is not None and job.get('collection_name'):
+            collection_name = job['collection_name']
+            if collection_name == settings.SHARED_COLLECTION_NAME:
+                filters = {"kb_name": job['kb_name'], "document": job['document']}
+    else:
+        collections = get_kb_collections(kb_name)
+        if collections is None:
+            raise HTTPException(status_code=503, detail="Job database is unavailable.")
+        if not collections:
+            raise HTTPException(status_code=404, detail=f"Knowledge base '{kb_name}' not found.")
+        if len(collections) > 1:
+            raise HTTPException(status_code=400, detail=(
+                f"Knowledge base '{kb_name}' is spread over {len(collections)} collections; "
+                "migrate them to the shared collection to search it as a whole."
+            ))
+        collection_name = collections[0]
+
+    # Per-job collections hold a single knowledge base, and their older points have no kb_name
+    if kb_name is not None and collection_name == settings.SHARED_COLLECTION_NAME:
+        filters['kb_name'] = kb_name
+    if document is not None:
+        filters['document'] = document
+    return collection_name, {key: value for key, value in filters.items() if value is not None}
+
+def _queue_full(queued: int) -> HTTPException:
+    logger.warning(f"Rejecting ingestion request, {queued} jobs already queued.")
+    return HTTPException(status_code=429, detail="Ingestion queue is full, retry later.", headers={"Retry-After": "30"})
+
 @router.post("/ingest", response_model=IngestResponse)
-async def ingest_pdf(
+def ingest_pdf(
     kb_name: str,
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
+    priority: int = 0
 ):
-    # Implement the ingestion logic
+    """
+    Queues a PDF for ingestion; jobs are picked up by the ingestion worker. A plain function,
+    so the file save and the database calls run in the threadpool rather than the event loop.
+    """
     logger.info(f"Received ingestion request for kb_name: {kb_name}")
 
     if file.content_type != "application/pdf":
         logger.warning(f"Invalid file type received: {file.content_type}")
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
+    # Rejects early without saving the upload; the limit itself is enforced when the job is added
+    queued = count_jobs_with_status("in_queue")
+    if queued is None:
+        raise HTTPException(status_code=503, detail="Job queue is unavailable.")
+    if queued >= settings.JOB_QUEUE_MAX_SIZE:
+        raise _queue_full(queued)
+
     file_path = save_uploaded_file(file,kb_name)
     logger.info(f"File saved to temporary path: {file_path}")
 
@@ -33,11 +97,15 @@ async def ingest_pdf(
     job_id = str(uuid.uuid4())
     status = "in_queue"
     timestamp = datetime.now()
-    add_job(job_id, status, kb_name, timestamp)
+    result = add_job_if_queue_below(job_id, kb_name, timestamp, settings.JOB_QUEUE_MAX_SIZE,
+                                    file_path=os.path.abspath(file_path), priority=priority)
+    if result is None or not result[0]:
+        os.remove(file_path)
+        if result is None:
+            raise HTTPException(status_code=503, detail="Job queue is unavailable.")
+        raise _queue_full(result[1])
     logger.info(f"Job created with ID: {job_id}")
 
-    background_tasks.add_task(process_ingestion, file_path, job_id)
-
     return IngestResponse(status=status, job_id=job_id)
 
 @router.get("/ingest/status/{job_id}")
@@ -51,12 +119,68 @@ async def get_ingestion_status(job_id: str):
     logger.info(f"Returning status '{status}' for job ID: {job_id}")
     return {"job_id": job_id, "status": status}
 
+@router.get("/ingest/progress/{job_id}")
+async def stream_ingestion_progress(job_id: str, progress_feed: ProgressFeed = Depends(get_progress_feed)):
+    """
+    Streams a job's progress as Server-Sent Events: a "progress" event with its status,
+    counters and stage timings now and whenever they change, ending once the job completes
+    or fails. Idle streams get a comment line every PROGRESS_KEEPALIVE_INTERVAL seconds.
+    """
+    logger.info(f"Received progress stream request for job ID: {job_id}")
+    if await run_in_threadpool(get_job_status, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        async for update in progress_feed.subscribe(job_id):
+            if update is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: progress\ndata: {json.dumps(update)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/jobs", response_model=JobListResponse)
-async def list_jobs():
-    """Lists all ingestion jobs."""
-    logger.info("Received request to list all jobs.")
-    jobs = get_all_jobs()
-    return JobListResponse(jobs=jobs)
+async def list_jobs(
+    limit: int = Query(settings.JOB_LIST_DEFAULT_LIMIT, ge=1, le=settings.JOB_LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    kb_name: Optional[str] = None,
+    status: Optional[str] = None,
+):
+    """
+    Lists ingestion jobs, newest first, one page at a time, optionally of one knowledge base
+    and/or status. Pass the returned next_cursor as cursor to get the following page.
+    """
+    logger.info(f"Received request to list jobs (kb: {kb_name}, status: {status}, limit: {limit}).")
+    try:
+        page = await run_in_threadpool(get_jobs_page, limit, cursor, kb_name, status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=503, detail="Job database is unavailable.")
+    jobs, next_cursor = page
+    return JobListResponse(jobs=jobs, next_cursor=next_cursor)
+
+@router.get("/kbs", response_model=KnowledgeBaseListResponse)
+async def list_knowledge_bases():
+    """Summarizes every knowledge base: job counts per status, documents and the latest job."""
+    summaries = await run_in_threadpool(get_kb_summaries)
+    if summaries is None:
+        raise HTTPException(status_code=503, detail="Job database is unavailable.")
+    return KnowledgeBaseListResponse(knowledge_bases=summaries)
+
+@router.get("/kbs/{kb_name}", response_model=KnowledgeBaseSummary)
+async def get_knowledge_base(kb_name: str):
+    """Summarizes one knowledge base."""
+    summaries = await run_in_threadpool(get_kb_summaries, kb_name)
+    if summaries is None:
+        raise HTTPException(status_code=503, detail="Job database is unavailable.")
+    if not summaries:
+        raise HTTPException(status_code=404, detail=f"Knowledge base '{kb_name}' not found.")
+    return summaries[0]
 
 @router.get("/job/{job_id}", response_model=Job)
 async def get_job_details(job_id: str):
@@ -69,9 +193,81 @@ async def get_job_details(job_id: str):
     return job
 
 @router.post("/retrieve", response_model=RetrieveResponse)
-async def retrieve_from_kb(request: RetrieveRequest):
+async def retrieve_from_kb(
+    request: RetrieveRequest,
+    retrieval_service: RetrievalService = Depends(get_retrieval_service)
+):
     """Retrieves information from a knowledge base."""
-    logger.info(f"Received retrieval request for collection: {request.collection_name}")
-    retrieval_service = RetrievalService()
-    response = retrieval_service.retrieve(request.query, request.collection_name)
-    return RetrieveResponse(response=response)
\ No newline at end of file
+    logger.info(f"Received retrieval request for collection: {request.collection_name}, kb: {request.kb_name}")
+    collection_name, filters = await run_in_threadpool(
+        resolve_search_scope, request.collection_name, request.kb_name, request.document
+    )
+    response = await retrieval_service.retrieve(request.query, collection_name, filters)
+    return RetrieveResponse(response=response)
+
+@router.post("/retrieve/stream")
+async def stream_from_kb(
+    request: RetrieveRequest,
+    retrieval_service: RetrievalService = Depends(get_retrieval_service)
+):
+    """
+    Streams an answer as Server-Sent Events: a "sources" event, then "delta" events with
+    answer tokens, then a "done" event with the full answer and its figure references.
+    """
+    logger.info(f"Received streaming retrieval request for collection: {request.collection_name}, kb: {request.kb_name}")
+    collection_name, filters = await run_in_threadpool(
+        resolve_search_scope, request.collection_name, request.kb_name, request.document
+    )
+
+    async def event_stream():
+        async for event, data in retrieval_service.retrieve_stream(request.query, collection_name, filters):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/retrieve/batch", response_model=BatchRetrieveResponse)
+async def retrieve_batch_from_kbs(
+    request: BatchRetrieveRequest,
+    retrieval_service: RetrievalService = Depends(get_retrieval_service)
+):
+    """Answers many queries, possibly across collections, in one call. Results keep the request order."""
+    if len(request.queries) > settings.BATCH_RETRIEVE_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_RETRIEVE_MAX_QUERIES} queries per batch.")
+    logger.info(f"Received batch retrieval request with {len(request.queries)} queries "
+                f"(retrieval_only={request.retrieval_only}).")
+
+    # Targets that cannot be resolved fail their own queries rather than the whole batch
+    scopes, errors = {}, {}
+    targets = [(item.collection_name, item.kb_name, item.document) for item in request.queries]
+    for target in dict.fromkeys(targets):
+        try:
+            scopes[target] = await run_in_threadpool(resolve_search_scope, *target)
+        except HTTPException as e:
+            errors[target] = e.detail
+
+    resolved = [i for i, target in enumerate(targets) if target in scopes]
+    batch_results = await retrieval_service.retrieve_batch(
+        [(request.queries[i].query, *scopes[targets[i]]) for i in resolved],
+        retrieval_only=request.retrieval_only,
+    )
+    results = [{"query": item.query, "error": errors.get(target)} for item, target in zip(request.queries, targets)]
+    for i, result in zip(resolved, batch_results):
+        results[i] = result
+    # Report the targets as requested rather than as resolved
+    for item, result in zip(request.queries, results):
+        result['collection_name'] = item.collection_name
+        result['kb_name'] = item.kb_name
+    return BatchRetrieveResponse(results=results)
+
+@router.get("/retrieve/stats")
+async def get_retrieval_stats(retrieval_service: RetrievalService = Depends(get_retrieval_service)):
+    """
+    Returns hit ratios and estimated time saved by the query embedding and answer caches,
+    and the prompt tokens saved by context packing.
+    """
+    return retrieval_service.stats()
@@ -1,4 +1,5 @@
 import logging
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -7,14 +8,145 @@ class Settings(BaseSettings):
     CHUNK_SIZE: int = 1200
     CHUNK_OVERLAP: int = 200
 
-    # Qdrant configs
-    QDRANT_URL: str
+    # Docling configs
+    # Number of pre-warmed converter processes; 0 converts in the ingestion thread
+    DOCLING_POOL_SIZE: int = 0
+
+    # Ingestion pipeline configs
+    # Pages converted per docling call; also bounds how many pages are buffered between stages
+    INGESTION_WINDOW_PAGES: int = 8
+    INGESTION_UPSERT_BATCH_SIZE: int = 100
+    # What happens to full-page images once figures are cropped: "file" saves them as PNGs under
+    # processed/pages/<document>/ and keeps their path in the parquet, "drop" discards them and
+    # "inline" keeps the bytes in the parquet
+    PAGE_IMAGE_STORAGE: Literal["file", "drop", "inline"] = "file"
+    # Keep docling's layout cells and segments, as JSON, in the processed parquet
+    PROCESSED_KEEP_LAYOUT: bool = True
+
+    # Deployment role of the API process: "api" only serves HTTP, with ingestion in separate
+    # `python -m app.workers.worker` processes; "all" also runs the worker in the API process
+    APP_ROLE: Literal["api", "all"] = "api"
+
+    # Job queue configs
+    # Connections to the jobs database kept open per process, and how long a write waits for the lock
+    JOB_DB_POOL_SIZE: int = 8
+    JOB_DB_BUSY_TIMEOUT: float = 30.0
+    # Page size of /api/jobs when no limit is given, and the largest page it returns
+    JOB_LIST_DEFAULT_LIMIT: int = 50
+    JOB_LIST_MAX_LIMIT: int = 500
+    JOB_QUEUE_MAX_SIZE: int = 100
+    WORKER_CONCURRENCY: int = 2
+    WORKER_POLL_INTERVAL: float = 1.0
+    JOB_HEARTBEAT_INTERVAL: float = 30.0
+    # Jobs in 'processing' without a heartbeat for this long are considered orphaned
+    JOB_STALE_AFTER: float = 120.0
+    JOB_MAX_ATTEMPTS: int = 3
+    # Workers write job progress at most this often; the API checks for changes this often
+    PROGRESS_FLUSH_INTERVAL: float = 1.0
+    PROGRESS_POLL_INTERVAL: float = 0.5
+    # Comment lines sent on idle progress streams so proxies keep them open
+    PROGRESS_KEEPALIVE_INTERVAL: float = 15.0
+    # The worker serves Prometheus metrics on this port (0 disables); the API serves them on /metrics
+    WORKER_METRICS_PORT: int = 9101
+
+    # Figure description configs
+    VISION_MODEL: str = "gpt-4o-mini"
+    FIGURE_MAX_CONCURRENCY: int = 8
+    FIGURE_REQUESTS_PER_MINUTE: float = 300
+
+    # Content cache configs (figure descriptions and embeddings)
+    CONTENT_CACHE_ENABLED: bool = True
+    CONTENT_CACHE_PATH: str = "data/content_cache.db"
+    CONTENT_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    # Vector store configs
+    # "qdrant" uses the Qdrant server at QDRANT_URL; "embedded" keeps collections in-process under
+    # EMBEDDED_STORE_PATH, for single-node and test deployments without a Qdrant server
+    VECTOR_STORE_BACKEND: Literal["qdrant", "embedded"] = "qdrant"
+    QDRANT_URL: str = "localhost:6333"
+    EMBEDDED_STORE_PATH: str = "storage/vectors"
+    # "auto" searches exactly (brute force) up to EMBEDDED_BRUTE_FORCE_MAX_POINTS candidates and
+    # uses an HNSW graph above that, if hnswlib is installed
+    EMBEDDED_INDEX: Literal["auto", "brute_force", "hnsw"] = "auto"
+    EMBEDDED_BRUTE_FORCE_MAX_POINTS: int = 20000
+    EMBEDDED_HNSW_M: int = 16
+    EMBEDDED_HNSW_EF_CONSTRUCTION: int = 200
+    EMBEDDED_HNSW_EF: int = 128
+    # "per_job" gives each new document its own collection; "shared" writes every knowledge base
+    # into SHARED_COLLECTION_NAME, filtered by indexed kb_name/job_id/document payload fields
+    STORAGE_MODE: Literal["per_job", "shared"] = "per_job"
+    SHARED_COLLECTION_NAME: str = "chunks"
+
+    # Model provider configs
+    # "openai" calls the OpenAI API, or the OpenAI-compatible server at OPENAI_BASE_URL; "local" embeds
+    # on this machine with sentence-transformers; "stub" returns deterministic fake output for tests
+    # and benchmarks. EMBEDDING_MODEL, LLM_MODEL and VISION_MODEL name models of the chosen provider
+    EMBEDDING_PROVIDER: Literal["openai", "local", "stub"] = "openai"
+    GENERATION_PROVIDER: Literal["openai", "stub"] = "openai"
+    # Local embedding configs; the ONNX backend needs optimum[onnxruntime]
+    LOCAL_EMBEDDING_BACKEND: Literal["torch", "onnx"] = "torch"
+    LOCAL_EMBEDDING_DEVICE: str = "cpu"
+    LOCAL_EMBEDDING_BATCH_SIZE: int = 32
+    # Inference threads of the torch backend; 0 keeps the library default
+    LOCAL_EMBEDDING_THREADS: int = 0
+    # Vector size of the stub provider when EMBEDDING_DIMENSIONS is not set
+    STUB_EMBEDDING_DIMENSIONS: int = 384
+
+    # Embedding configs
+    EMBEDDING_MODEL: str = "text-embedding-3-large"
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000
+    EMBEDDING_BATCH_MAX_SIZE: int = 256
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 5
+    EMBEDDING_RETRY_BACKOFF: float = 1.0
+    # Vector size for new collections; None keeps the model's full size. The text-embedding-3
+    # models can return shortened vectors at a small cost in accuracy
+    EMBEDDING_DIMENSIONS: Optional[int] = None
+
+    # Vector storage configs, applied when a collection is created
+    # "scalar" stores int8 codes (4x smaller), "binary" one bit per dimension (32x smaller)
+    VECTOR_QUANTIZATION: Literal["none", "scalar", "binary"] = "none"
+    # Keep full-precision vectors on disk; with quantization only the codes stay in RAM
+    VECTORS_ON_DISK: bool = False
+    # Re-rank quantized candidates with the original vectors, fetching oversampling * top_k of them
+    QUANTIZATION_RESCORE: bool = True
+    QUANTIZATION_OVERSAMPLING: float = 2.0
+
+    # Hybrid search configs: BM25 sparse vectors fused with dense results by reciprocal rank
+    HYBRID_SEARCH_ENABLED: bool = True
+    SPARSE_VECTOR_NAME: str = "bm25"
+    HYBRID_PREFETCH_LIMIT: int = 50
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    # Approximate average chunk length in terms, for BM25 length normalization at ingest time
+    BM25_AVG_DOC_LENGTH: float = 200
+
+    # Retrieval configs
+    LLM_MODEL: str = "gpt-4o-mini"
+    RETRIEVAL_TOP_K: int = 10
+    # Retrieved chunks are merged, deduplicated and packed into this many prompt tokens
+    CONTEXT_TOKEN_BUDGET: int = 6000
+    CONTEXT_DEDUP_THRESHOLD: float = 0.9
+    BATCH_RETRIEVE_MAX_QUERIES: int = 5000
+    BATCH_RETRIEVE_LLM_CONCURRENCY: int = 16
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+
+    # Query caches: normalized query -> embedding, and semantically similar query -> answer
+    QUERY_EMBEDDING_CACHE_SIZE: int = 10000
+    QUERY_EMBEDDING_CACHE_TTL: float = 24 * 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL: float = 3600
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.97
+    ANSWER_CACHE_VERSION_CHECK_INTERVAL: float = 5.0
 
     # Logging configs
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
-    OPENAI_API_KEY:str
+    # Only needed by the "openai" providers
+    OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: Optional[str] = None
 
     class Config:
         env_file = ".env"
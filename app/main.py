@@ -1,8 +1,12 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.routes import router as api_router
+from app.api.metrics import router as metrics_router
 from app.utils.db_utils import init_db
-from app.config import setup_logging
+from app.services.retrieval_service import RetrievalService
+from app.services.progress_feed import ProgressFeed
+from app.config import settings, setup_logging
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,11 +18,26 @@ async def lifespan(app: FastAPI):
     logger.info("Logging setup complete.")
     init_db()
     logger.info("Database initialized.")
+    app.state.retrieval_service = RetrievalService()
+    app.state.progress_feed = ProgressFeed()
+    worker = None
+    if settings.APP_ROLE == "all":
+        # Imported here so API-only replicas never load docling, torch and pandas
+        from app.workers.worker import IngestionWorker
+        worker = IngestionWorker()
+        await asyncio.to_thread(worker.start)
+    logger.info(f"Application started in the '{settings.APP_ROLE}' role.")
     yield
     # Shutdown
+    if worker is not None:
+        worker.stop()
+        await asyncio.to_thread(worker.join)
+    await app.state.progress_feed.close()
+    await app.state.retrieval_service.close()
     logger.info("Application shutdown.")
 
 app = FastAPI(title="Ingestion Service", lifespan=lifespan)
 
 # include routes
 app.include_router(api_router, prefix="/api")
+app.include_router(metrics_router)
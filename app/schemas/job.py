@@ -1,12 +1,29 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 
 class Job(BaseModel):
     job_id: str
     status: str
     kb_name: str
     timestamp: datetime
+    collection_name: Optional[str] = None
+    document: Optional[str] = None
+    progress: Optional[dict] = None
 
 class JobListResponse(BaseModel):
     jobs: List[Job]
+    # Pass as cursor to get the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+class KnowledgeBaseSummary(BaseModel):
+    kb_name: str
+    jobs: int
+    # Number of jobs per status
+    statuses: Dict[str, int]
+    documents: int
+    last_job_id: Optional[str] = None
+    last_job_at: Optional[datetime] = None
+
+class KnowledgeBaseListResponse(BaseModel):
+    knowledge_bases: List[KnowledgeBaseSummary]
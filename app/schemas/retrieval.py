@@ -1,8 +1,43 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
+from typing import List, Optional
 
 class RetrieveRequest(BaseModel):
     query: str
-    collection_name: str
+    # A job ID (or collection name); optional when kb_name is given
+    collection_name: Optional[str] = None
+    # Search a whole knowledge base, and optionally only one of its documents
+    kb_name: Optional[str] = None
+    document: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if self.collection_name is None and self.kb_name is None:
+            raise ValueError("Either collection_name or kb_name is required.")
+        return self
 
 class RetrieveResponse(BaseModel):
     response: str
+
+
+class Source(BaseModel):
+    document: Optional[str] = None
+    page_num: Optional[int] = None
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    score: float
+
+class BatchRetrieveRequest(BaseModel):
+    queries: List[RetrieveRequest]
+    # Skip the LLM step and only return the retrieved sources
+    retrieval_only: bool = False
+
+class BatchRetrieveResult(BaseModel):
+    query: str
+    collection_name: Optional[str] = None
+    kb_name: Optional[str] = None
+    response: Optional[str] = None
+    sources: List[Source] = []
+    error: Optional[str] = None
+
+class BatchRetrieveResponse(BaseModel):
+    results: List[BatchRetrieveResult]
@@ -0,0 +1,147 @@
+import logging
+from typing import List, NamedTuple, Tuple
+from app.utils.token_utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_SEPARATOR = "\n---\n"
+
+# A block that does not fit is cut down to the remaining budget if at least this much is left
+MIN_TRUNCATED_TOKENS = 100
+
+# Chunks separated by at most this many characters (the whitespace the splitter dropped) are adjacent
+ADJACENT_GAP = 2
+
+class ContextStats(NamedTuple):
+    hits: int
+    blocks: int
+    naive_tokens: int
+    context_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.naive_tokens - self.context_tokens
+
+class _Block:
+    def __init__(self, rank: int, text: str, key=None, start: int = None, end: int = None,
+                 page_start: int = None, page_end: int = None):
+        self.rank = rank
+        self.text = text
+        self.key = key
+        self.start = start
+        self.end = end
+        self.page_start = page_start
+        self.page_end = page_end
+
+    def pages_touch(self, other: "_Block") -> bool:
+        """Whether other starts on this block's last page or the next one; unknown pages touch."""
+        if self.page_end is None or other.page_start is None:
+            return True
+        return other.page_start <= self.page_end + 1
+
+    def extend(self, other: "_Block", text: str):
+        self.text += text
+        self.end = other.end
+        if self.page_end is not None and other.page_end is not None:
+            self.page_end = max(self.page_end, other.page_end)
+
+def _merge_overlapping(blocks: List[_Block]) -> List[_Block]:
+    """
+    Merges chunks of the same ingestion job whose offsets overlap or touch, such as neighbours
+    repeating CHUNK_OVERLAP characters. Chunks must also be on the same or consecutive pages:
+    a re-ingest chunks separate runs of changed pages, and points written before their offsets
+    were document-wide restart at 0 in every run. A merged block keeps the best rank of its chunks.
+    """
+    merged = []
+    by_key = {}
+    for block in blocks:
+        if block.key is None or block.start is None or block.end is None:
+            merged.append(block)
+        else:
+            by_key.setdefault(block.key, []).append(block)
+
+    for key_blocks in by_key.values():
+        # Page order first keeps each run of pages together when offsets restart per run
+        key_blocks.sort(key=lambda block: (block.page_start if block.page_start is not None else -1, block.start))
+        current = key_blocks[0]
+        for block in key_blocks[1:]:
+            if block.start <= current.end and current.pages_touch(block):
+                if block.end > current.end:
+                    current.extend(block, block.text[current.end - block.start:])
+                current.rank = min(current.rank, block.rank)
+            elif block.start - current.end <= ADJACENT_GAP and block.start >= current.end and current.pages_touch(block):
+                current.extend(block, "\n\n" + block.text)
+                current.rank = min(current.rank, block.rank)
+            else:
+                merged.append(current)
+                current = block
+        merged.append(current)
+
+    return sorted(merged, key=lambda block: block.rank)
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = text.lower().split()
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _drop_near_duplicates(blocks: List[_Block], threshold: float) -> List[_Block]:
+    """
+    Drops blocks whose word shingles are mostly contained in another block (e.g. repeated
+    boilerplate, or a chunk that is also part of a merged block). The larger block is kept
+    and inherits the better rank.
+    """
+    kept = []
+    for block in blocks:
+        shingles = _shingles(block.text)
+        duplicate = False
+        for i, (other, other_shingles) in enumerate(kept):
+            common = len(shingles & other_shingles)
+            if common / len(shingles) >= threshold:
+                other.rank = min(other.rank, block.rank)
+                duplicate = True
+                break
+            if common / len(other_shingles) >= threshold:
+                block.rank = min(block.rank, other.rank)
+                kept[i] = (block, shingles)
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append((block, shingles))
+    return sorted((block for block, _ in kept), key=lambda block: block.rank)
+
+def build_context(search_results: list, token_budget: int, dedup_threshold: float, model: str) -> Tuple[str, ContextStats]:
+    """
+    Packs retrieved chunks into the LLM context: overlapping chunks are merged, near-duplicates
+    dropped, and the remaining blocks are added in relevance order while they fit the token budget.
+    """
+    blocks = []
+    for rank, hit in enumerate(search_results):
+        payload = hit.payload or {}
+        key = (payload.get('document'), payload.get('job_id'))
+        blocks.append(_Block(rank, payload['content'], key, payload.get('start_offset'), payload.get('end_offset'),
+                             payload.get('page_start'), payload.get('page_end')))
+
+    naive_tokens = count_tokens(CONTEXT_SEPARATOR.join(block.text for block in blocks), model)
+
+    blocks = _drop_near_duplicates(_merge_overlapping(blocks), dedup_threshold)
+
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR, model)
+    selected, used = [], 0
+    for block in blocks:
+        tokens = count_tokens(block.text, model) + (separator_tokens if selected else 0)
+        if used + tokens > token_budget:
+            remaining = token_budget - used
+            if remaining < MIN_TRUNCATED_TOKENS:
+                continue
+            # Keep the start of the block, sized proportionally to the tokens left, and stop
+            selected.append(block.text[:int(len(block.text) * remaining / tokens * 0.95)])
+            break
+        selected.append(block.text)
+        used += tokens
+
+    context = CONTEXT_SEPARATOR.join(selected)
+    stats = ContextStats(len(search_results), len(selected), naive_tokens, count_tokens(context, model))
+    logger.info(f"Packed {stats.hits} hits into {stats.blocks} blocks: {stats.context_tokens} tokens "
+                f"({stats.tokens_saved} saved).")
+    return context, stats
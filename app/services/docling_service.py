@@ -1,31 +1,93 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, Future
+from collections import deque
 from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
 from docling.document_converter import DocumentConverter, PdfFormatOption
 from docling.utils.export import generate_multimodal_pages
-from docling.utils.utils import create_hash
+from docling.utils.utils import create_hash, create_file_hash
+from app.config import settings
+import fitz
+import hashlib
+import multiprocessing
+import threading
+import logging
 import pandas as pd
 import io
 
+logger = logging.getLogger(__name__)
+
 IMAGE_RESOLUTION_SCALE = 2.0
 
+# Process-level converter cache, keyed by the serialized pipeline options
+_converters: dict = {}
+_converters_lock = threading.Lock()
+
+_converter_pool = None
+_converter_pool_lock = threading.Lock()
+
 def _get_image_bytes(image):
     with io.BytesIO() as output:
         image.save(output, format="PNG")
         return output.getvalue()
 
-def create_df_from_pdf(file_path,output_dir):
+def _page_content_hash(content_dt: str, image_bytes: bytes) -> str:
+    return hashlib.sha256(content_dt.encode("utf-8") + b"\0" + image_bytes).hexdigest()
+
+def _build_pipeline_options() -> PdfPipelineOptions:
     pipeline_options = PdfPipelineOptions()
     pipeline_options.images_scale = IMAGE_RESOLUTION_SCALE
     pipeline_options.generate_page_images = True
+    return pipeline_options
+
+def get_document_converter(pipeline_options: PdfPipelineOptions = None) -> DocumentConverter:
+    """
+    Returns a DocumentConverter for the given pipeline options, building it on first use.
+    Converters are cached per process so layout and table models are only loaded once.
+    """
+    pipeline_options = pipeline_options or _build_pipeline_options()
+    key = pipeline_options.model_dump_json()
 
-    doc_converter = DocumentConverter(
-        format_options={
-            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
-        }
-    )
+    with _converters_lock:
+        doc_converter = _converters.get(key)
+        if doc_converter is None:
+            logger.info("Building DocumentConverter for new pipeline options.")
+            doc_converter = DocumentConverter(
+                format_options={
+                    InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+                }
+            )
+            doc_converter.initialize_pipeline(InputFormat.PDF)
+            _converters[key] = doc_converter
+    return doc_converter
 
-    conv_res = doc_converter.convert(file_path)
+def get_document_hash(file_path) -> str:
+    """Returns the same document hash docling assigns to a converted file."""
+    return create_file_hash(Path(file_path))
+
+def get_pdf_page_count(file_path) -> int:
+    with fitz.open(file_path) as pdf:
+        return pdf.page_count
+
+def _index_pages_by_page_no(conv_res):
+    """
+    generate_multimodal_pages looks pages up by their absolute page number, which only
+    lines up with list positions for a full conversion. For a page-range conversion, pad
+    the list so every converted page sits at the index of its page number.
+    """
+    pages_by_no = {page.page_no: page for page in conv_res.pages}
+    if pages_by_no:
+        conv_res.pages = [pages_by_no.get(i) for i in range(max(pages_by_no) + 1)]
+
+def create_df_from_pdf(file_path,output_dir,page_range=None):
+    doc_converter = get_document_converter()
+
+    if page_range is None:
+        conv_res = doc_converter.convert(file_path)
+    else:
+        # page_range is 1-based and inclusive
+        conv_res = doc_converter.convert(file_path, page_range=page_range)
+        _index_pages_by_page_no(conv_res)
 
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -40,6 +102,7 @@ def create_df_from_pdf(file_path,output_dir):
         page,
     ) in generate_multimodal_pages(conv_res):
         dpi = page._default_image_scale * 72
+        image_bytes = _get_image_bytes(page.image)
 
         rows.append(
             {
@@ -48,10 +111,13 @@ def create_df_from_pdf(file_path,output_dir):
                 "page_hash": create_hash(
                     conv_res.input.document_hash + ":" + str(page.page_no - 1)
                 ),
+                # Unlike page_hash, this only depends on what is on the page, so it is
+                # stable across revisions of the same document
+                "content_hash": _page_content_hash(content_dt, image_bytes),
                 "image": {
                     "width": page.image.width,
                     "height": page.image.height,
-                    "bytes": _get_image_bytes(page.image),
+                    "bytes": image_bytes,
                 },
                 "cells": page_cells,
                 "contents": content_text,
@@ -69,4 +135,79 @@ def create_df_from_pdf(file_path,output_dir):
 
     df_result = pd.json_normalize(rows)
 
-    return df_result
\ No newline at end of file
+    return df_result
+
+def _warm_worker():
+    """Pool initializer: loads the converter models once per worker process."""
+    get_document_converter()
+    logger.info(f"Docling worker {multiprocessing.current_process().name} warmed up.")
+
+class ConverterPool:
+    """
+    A pool of worker processes, each holding its own pre-warmed DocumentConverter,
+    so several PDFs can be converted in parallel without paying model-load cost per job.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._executor = ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+        # Force every worker to start and load its models now rather than on the first job
+        for future in [self._executor.submit(_noop) for _ in range(size)]:
+            future.result()
+        logger.info(f"Started docling converter pool with {size} workers.")
+
+    def submit(self, file_path, output_dir, page_range=None) -> Future:
+        return self._executor.submit(create_df_from_pdf, file_path, output_dir, page_range)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        logger.info("Docling converter pool shut down.")
+
+def _noop():
+    return None
+
+def get_converter_pool():
+    """Returns the shared converter pool, or None if DOCLING_POOL_SIZE is 0."""
+    global _converter_pool
+    if settings.DOCLING_POOL_SIZE <= 0:
+        return None
+    with _converter_pool_lock:
+        if _converter_pool is None:
+            _converter_pool = ConverterPool(settings.DOCLING_POOL_SIZE)
+    return _converter_pool
+
+def shutdown_converter_pool():
+    global _converter_pool
+    with _converter_pool_lock:
+        if _converter_pool is not None:
+            _converter_pool.shutdown()
+            _converter_pool = None
+
+def iter_pdf_pages(file_path, output_dir, window_pages: int = settings.INGESTION_WINDOW_PAGES):
+    """
+    Yields converted page rows in page order, converting the PDF one window of pages at a time.
+    With the converter pool enabled, up to one window per worker is converted ahead.
+    """
+    page_count = get_pdf_page_count(file_path)
+    page_ranges = [
+        (start, min(start + window_pages - 1, page_count))
+        for start in range(1, page_count + 1, window_pages)
+    ]
+    pool = get_converter_pool()
+    lookahead = pool.size if pool is not None else 0
+
+    pending = deque()
+    for page_range in page_ranges:
+        if pool is None:
+            df = create_df_from_pdf(file_path, output_dir, page_range)
+            yield from df.to_dict("records")
+            continue
+        pending.append(pool.submit(file_path, output_dir, page_range))
+        if len(pending) >= lookahead:
+            yield from pending.popleft().result().to_dict("records")
+    while pending:
+        yield from pending.popleft().result().to_dict("records")
@@ -0,0 +1,613 @@
+"""
+Embedded, in-process vector store for single-node and test deployments.
+
+Implements the subset of the Qdrant client API that VectorStoreService and RetrievalService
+use, taking and returning the same qdrant_client models, so either backend can sit behind them.
+Each collection lives in its own directory under EMBEDDED_STORE_PATH:
+
+    config.json   vector size, sparse vector names and indexed payload fields
+    vectors.f32   L2-normalized dense vectors, appended row by row and memory-mapped for search
+    points.db     SQLite table of point IDs, payloads, sparse vectors and deletion marks
+    hnsw.bin      HNSW graph over the vectors, if hnswlib is installed and the index is used
+
+Points are never rewritten in place: an upsert marks the previous row of the ID deleted and
+appends a new one. Every change carries a sequence number, so a process only loads the rows
+changed since it last looked; the API process picks up the worker's appends that way.
+Only one process should write to a collection at a time.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import threading
+from array import array
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from qdrant_client import models
+from qdrant_client.http.models import QueryResponse
+from app.config import settings
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+RRF_K = 60
+# HNSW graphs are written back to disk after this many new points
+HNSW_SAVE_EVERY = 1000
+
+_stores: Dict[str, "EmbeddedVectorStore"] = {}
+_stores_lock = threading.Lock()
+
+def _matches(value, match) -> bool:
+    values = value if isinstance(value, list) else [value]
+    if isinstance(match, models.MatchValue):
+        return match.value in values
+    if isinstance(match, models.MatchAny):
+        return any(v in match.any for v in values)
+    raise TypeError(f"Unsupported match in embedded store: {type(match).__name__}")
+
+def _filter_key(query_filter: Optional[models.Filter]) -> str:
+    return query_filter.model_dump_json() if query_filter is not None else ""
+
+class _Collection:
+    """One collection's vectors, payloads and indexes. All access goes through its lock."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        with open(os.path.join(path, "config.json")) as f:
+            self.config = json.load(f)
+        self.dimensions = self.config['dimensions']
+
+        self._conn = sqlite3.connect(os.path.join(path, "points.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS points
+            (row INTEGER PRIMARY KEY,
+             id TEXT,
+             payload TEXT,
+             sparse TEXT,
+             deleted INTEGER DEFAULT 0,
+             seq INTEGER)
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_points_seq ON points (seq)")
+        self._conn.commit()
+
+        self._ids: List = []
+        self._payloads: List[Optional[dict]] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._id_rows: Dict = {}
+        # payload field -> value -> rows, for fields with a payload index
+        self._field_index = {field: defaultdict(list) for field in self.config['payload_indexes']}
+        # sparse vector name -> term -> (rows, weights)
+        self._postings = {name: defaultdict(lambda: (array("q"), array("f"))) for name in self.config['sparse_vectors']}
+        self._matrix = None
+        self._seq = 0
+        self._data_version = None
+        self._hnsw = None
+        self._hnsw_rows = 0
+        self._hnsw_saved_rows = 0
+        self._refresh(force=True)
+
+    # Loading
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def _refresh(self, force: bool = False):
+        """Loads rows changed by any connection since the last refresh."""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if not force and data_version == self._data_version:
+            return
+        self._data_version = data_version
+        changed = self._conn.execute(
+            "SELECT row, id, payload, sparse, deleted, seq FROM points WHERE seq > ? ORDER BY row", (self._seq,)
+        ).fetchall()
+        if not changed:
+            return
+
+        n_rows = len(self._ids)
+        new_rows = max(row for row, *_ in changed) + 1 - n_rows
+        if new_rows > 0:
+            # Rows are padded as deleted: an interrupted write can leave vectors without a point
+            self._ids.extend([None] * new_rows)
+            self._payloads.extend([None] * new_rows)
+            self._alive = np.concatenate([self._alive, np.zeros(new_rows, dtype=bool)])
+            self._matrix = np.memmap(self._vectors_path(), dtype=np.float32, mode="r",
+                                     shape=(len(self._ids), self.dimensions))
+
+        for row, point_id, payload, sparse, deleted, seq in changed:
+            self._seq = max(self._seq, seq)
+            if row >= n_rows:
+                self._add_row(row, json.loads(point_id), json.loads(payload), json.loads(sparse) if sparse else None)
+            if deleted:
+                self._remove_row(row)
+
+    def _add_row(self, row: int, point_id, payload: dict, sparse: Optional[dict]):
+        self._ids[row] = point_id
+        self._payloads[row] = payload
+        self._alive[row] = True
+        self._id_rows[point_id] = row
+        for field, index in self._field_index.items():
+            value = payload.get(field)
+            for v in (value if isinstance(value, list) else [value]):
+                index[v].append(row)
+        for name, (indices, values) in (sparse or {}).items():
+            postings = self._postings.get(name)
+            if postings is None:
+                continue
+            for term, weight in zip(indices, values):
+                rows, weights = postings[term]
+                rows.append(row)
+                weights.append(weight)
+
+    def _remove_row(self, row: int):
+        if not self._alive[row]:
+            return
+        self._alive[row] = False
+        if self._id_rows.get(self._ids[row]) == row:
+            del self._id_rows[self._ids[row]]
+        if self._hnsw is not None and row < self._hnsw_rows:
+            try:
+                self._hnsw.mark_deleted(row)
+            except RuntimeError:
+                pass
+
+    # Writing
+
+    def _next_seq(self) -> int:
+        return (self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM points").fetchone()[0]) + 1
+
+    def upsert(self, points: Sequence[models.PointStruct]):
+        with self._lock:
+            self._refresh()
+            dense = np.zeros((len(points), self.dimensions), dtype=np.float32)
+            sparse = []
+            for i, point in enumerate(points):
+                vector = point.vector
+                named = vector if isinstance(vector, dict) else {"": vector}
+                dense[i] = named[""]
+                sparse.append({
+                    name: [list(v.indices), list(v.values)]
+                    for name, v in named.items() if name and name in self._postings
+                } or None)
+            norms = np.linalg.norm(dense, axis=1, keepdims=True)
+            dense /= np.maximum(norms, 1e-12)
+
+            # Vectors go to disk before the rows that reference them are committed
+            vectors_path = self._vectors_path()
+            first_row = os.path.getsize(vectors_path) // (4 * self.dimensions) if os.path.exists(vectors_path) else 0
+            with open(vectors_path, "ab") as f:
+                f.write(dense.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._conn:
+                seq = self._next_seq()
+                replaced = [self._id_rows[p.id] for p in points if p.id in self._id_rows]
+                self._conn.executemany("UPDATE points SET deleted = 1, seq = ? WHERE row = ?",
+                                       [(seq, row) for row in replaced])
+                self._conn.executemany(
+                    "INSERT INTO points (row, id, payload, sparse, deleted, seq) VALUES (?, ?, ?, ?, 0, ?)",
+                    [
+                        (first_row + i, json.dumps(point.id), json.dumps(point.payload or {}),
+                         json.dumps(point_sparse) if point_sparse else None, seq)
+                        for i, (point, point_sparse) in enumerate(zip(points, sparse))
+                    ]
+                )
+            self._refresh(force=True)
+
+    def delete(self, query_filter: models.Filter) -> int:
+        with self._lock:
+            self._refresh()
+            rows = np.flatnonzero(self._mask(query_filter))
+            if len(rows):
+                with self._conn:
+                    seq = self._next_seq()
+                    self._conn.executemany("UPDATE points SET deleted = 1, seq = ? WHERE row = ?",
+                                           [(seq, int(row)) for row in rows])
+                self._refresh(force=True)
+            return len(rows)
+
+    def create_payload_index(self, field_name: str):
+        with self._lock:
+            if field_name in self._field_index:
+                return
+            index = defaultdict(list)
+            for row in np.flatnonzero(self._alive):
+                value = self._payloads[row].get(field_name)
+                for v in (value if isinstance(value, list) else [value]):
+                    index[v].append(int(row))
+            self._field_index[field_name] = index
+            self.config['payload_indexes'].append(field_name)
+            _write_config(self.path, self.config)
+
+    # Reading
+
+    def _mask(self, query_filter: Optional[models.Filter]) -> np.ndarray:
+        """Rows that are alive and match the filter's must / must_not field conditions."""
+        mask = self._alive.copy()
+        if query_filter is None:
+            return mask
+        for conditions, keep in ((query_filter.must, True), (query_filter.must_not, False)):
+            for condition in (conditions if isinstance(conditions, list) else [conditions] if conditions else []):
+                if not isinstance(condition, models.FieldCondition):
+                    raise TypeError(f"Unsupported condition in embedded store: {type(condition).__name__}")
+                matched = self._condition_mask(condition)
+                mask &= matched if keep else ~matched
+        return mask
+
+    def _condition_mask(self, condition: models.FieldCondition) -> np.ndarray:
+        matched = np.zeros(len(self._alive), dtype=bool)
+        index = self._field_index.get(condition.key)
+        if index is not None and isinstance(condition.match, (models.MatchValue, models.MatchAny)):
+            values = [condition.match.value] if isinstance(condition.match, models.MatchValue) else condition.match.any
+            for value in values:
+                matched[index.get(value, [])] = True
+            return matched
+        for row in np.flatnonzero(self._alive):
+            payload = self._payloads[row]
+            if condition.key in payload and _matches(payload[condition.key], condition.match):
+                matched[row] = True
+        return matched
+
+    def _use_hnsw(self, candidates: int) -> bool:
+        if settings.EMBEDDED_INDEX == "brute_force" or hnswlib is None:
+            return False
+        return settings.EMBEDDED_INDEX == "hnsw" or candidates > settings.EMBEDDED_BRUTE_FORCE_MAX_POINTS
+
+    def _dense_search(self, queries: np.ndarray, mask: np.ndarray, limit: int) -> List[tuple]:
+        """Returns (rows, scores) per query, best first, among the rows selected by mask."""
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0 or limit <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))] * len(queries)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        if self._use_hnsw(len(candidates)):
+            try:
+                return self._hnsw_search(queries, mask, candidates, limit)
+            except RuntimeError as e:
+                logger.warning(f"HNSW search in {self.path} failed ({e}), falling back to brute force.")
+
+        # One matrix product for the whole batch of queries
+        if len(candidates) == len(self._alive):
+            scores = queries @ self._matrix.T
+        else:
+            scores = queries @ self._matrix[candidates].T
+        k = min(limit, len(candidates))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for i in range(len(queries)):
+            order = top[i][np.argsort(-scores[i, top[i]])]
+            rows = order if len(candidates) == len(self._alive) else candidates[order]
+            results.append((rows, scores[i, order]))
+        return results
+
+    def _hnsw_index(self):
+        """Loads or builds the HNSW graph and adds any rows appended since."""
+        n_rows = len(self._ids)
+        if self._hnsw is None:
+            index = hnswlib.Index(space="ip", dim=self.dimensions)
+            graph_path = os.path.join(self.path, "hnsw.bin")
+            meta_path = os.path.join(self.path, "hnsw.json")
+            self._hnsw_rows = 0
+            if os.path.exists(graph_path) and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    saved_rows = json.load(f)['rows']
+                if saved_rows <= n_rows:
+                    index.load_index(graph_path, max_elements=max(n_rows, 1))
+                    self._hnsw_rows = saved_rows
+                    for row in np.flatnonzero(~self._alive[:saved_rows]):
+                        try:
+                            index.mark_deleted(int(row))
+                        except RuntimeError:
+                            pass
+            if self._hnsw_rows == 0:
+                index.init_index(max_elements=max(n_rows, 1024), ef_construction=settings.EMBEDDED_HNSW_EF_CONSTRUCTION,
+                                 M=settings.EMBEDDED_HNSW_M)
+            self._hnsw = index
+            self._hnsw_saved_rows = self._hnsw_rows
+
+        if n_rows > self._hnsw_rows:
+            if n_rows > self._hnsw.get_max_elements():
+                self._hnsw.resize_index(max(n_rows, 2 * self._hnsw.get_max_elements()))
+            new_rows = np.arange(self._hnsw_rows, n_rows)
+            new_rows = new_rows[self._alive[new_rows]]
+            if len(new_rows):
+                self._hnsw.add_items(np.asarray(self._matrix[new_rows]), new_rows)
+            self._hnsw_rows = n_rows
+            if self._hnsw_rows - self._hnsw_saved_rows >= HNSW_SAVE_EVERY or self._hnsw_saved_rows == 0:
+                self._save_hnsw()
+        return self._hnsw
+
+    def _save_hnsw(self):
+        graph_path = os.path.join(self.path, "hnsw.bin")
+        # Written to a temporary file and renamed, so other processes never load a partial graph
+        self._hnsw.save_index(graph_path + ".tmp")
+        os.replace(graph_path + ".tmp", graph_path)
+        _write_json(os.path.join(self.path, "hnsw.json"), {"rows": self._hnsw_rows})
+        self._hnsw_saved_rows = self._hnsw_rows
+
+    def _hnsw_search(self, queries: np.ndarray, mask: np.ndarray, candidates: np.ndarray, limit: int) -> List[tuple]:
+        index = self._hnsw_index()
+        k = min(limit, len(candidates))
+        index.set_ef(max(settings.EMBEDDED_HNSW_EF, k))
+        row_filter = None if len(candidates) == int(self._alive.sum()) else (lambda row: bool(mask[row]))
+        labels, distances = index.knn_query(queries, k=k, filter=row_filter)
+        # hnswlib's inner-product distance is 1 - dot product
+        return [(labels[i].astype(np.int64), 1.0 - distances[i]) for i in range(len(queries))]
+
+    def _sparse_search(self, name: str, query: models.SparseVector, mask: np.ndarray, limit: int) -> tuple:
+        """BM25-style scoring: query weight x stored term weight x IDF over the live points."""
+        postings = self._postings.get(name)
+        if postings is None:
+            raise ValueError(f"Collection has no sparse vector '{name}'")
+        scores = np.zeros(len(self._alive), dtype=np.float32)
+        n_points = int(self._alive.sum())
+        for term, query_weight in zip(query.indices, query.values):
+            if term not in postings:
+                continue
+            rows, weights = postings[term]
+            rows = np.frombuffer(rows, dtype=np.int64)
+            weights = np.frombuffer(weights, dtype=np.float32)
+            live = self._alive[rows]
+            doc_freq = int(live.sum())
+            if doc_freq == 0:
+                continue
+            idf = math.log((n_points - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+            np.add.at(scores, rows[live], query_weight * idf * weights[live])
+        scores[~mask] = 0
+        matched = np.flatnonzero(scores > 0)
+        order = matched[np.argsort(-scores[matched])][:limit]
+        return order, scores[order]
+
+    def _scored_points(self, rows, scores, with_payload: bool) -> List[models.ScoredPoint]:
+        return [
+            models.ScoredPoint(
+                id=self._ids[row], version=0, score=float(score),
+                payload=self._payloads[row] if with_payload else None,
+            )
+            for row, score in zip(rows, scores)
+        ]
+
+    def query_batch(self, requests: Sequence[models.QueryRequest]) -> List[List[models.ScoredPoint]]:
+        """
+        Runs dense, sparse and RRF-fused queries. Dense stages that share a filter are
+        scored together in one matrix product.
+        """
+        with self._lock:
+            self._refresh()
+            masks = {}
+
+            def stage_mask(*filters):
+                key = "|".join(_filter_key(f) for f in filters)
+                if key not in masks:
+                    mask = self._alive.copy()
+                    for query_filter in filters:
+                        mask &= self._mask(query_filter)
+                    masks[key] = mask
+                return key
+
+            # Collect every dense stage, grouped by filter, and score each group at once
+            dense_stages = defaultdict(list)
+            for request in requests:
+                for stage in [request, *(request.prefetch or [])]:
+                    if isinstance(stage.query, list) and stage.using in (None, ""):
+                        key = stage_mask(request.filter, stage.filter if stage is not request else None)
+                        dense_stages[key].append(stage)
+            dense_results = {}
+            for key, stages in dense_stages.items():
+                limit = max(stage.limit or settings.RETRIEVAL_TOP_K for stage in stages)
+                queries = np.asarray([stage.query for stage in stages], dtype=np.float32)
+                for stage, result in zip(stages, self._dense_search(queries, masks[key], limit)):
+                    rows, scores = result
+                    dense_results[id(stage)] = (rows[:stage.limit], scores[:stage.limit])
+
+            results = []
+            for request in requests:
+                limit = request.limit or settings.RETRIEVAL_TOP_K
+                if isinstance(request.query, models.FusionQuery):
+                    rankings = []
+                    for prefetch in request.prefetch or []:
+                        if id(prefetch) in dense_results:
+                            rankings.append(dense_results[id(prefetch)][0])
+                        else:
+                            key = stage_mask(request.filter, prefetch.filter)
+                            rankings.append(self._sparse_search(prefetch.using, prefetch.query, masks[key], prefetch.limit)[0])
+                    rows, scores = _reciprocal_rank_fusion(rankings, limit)
+                elif id(request) in dense_results:
+                    rows, scores = dense_results[id(request)]
+                elif isinstance(request.query, models.SparseVector):
+                    rows, scores = self._sparse_search(request.using, request.query, masks[stage_mask(request.filter)], limit)
+                else:
+                    raise TypeError(f"Unsupported query in embedded store: {type(request.query).__name__}")
+                results.append(self._scored_points(rows[:limit], scores[:limit], request.with_payload is not False))
+            return results
+
+    def scroll(self, limit: int, offset: Optional[int], query_filter: Optional[models.Filter],
+               with_payload: bool, with_vectors: bool) -> tuple:
+        with self._lock:
+            self._refresh()
+            rows = np.flatnonzero(self._mask(query_filter))
+            rows = rows[rows >= (offset or 0)]
+            page, rest = rows[:limit], rows[limit:]
+            records = []
+            for row in page:
+                vector = None
+                if with_vectors:
+                    vector = {"": np.asarray(self._matrix[row]).tolist()}
+                    for name, (indices, values) in (self._sparse_of(row) or {}).items():
+                        vector[name] = models.SparseVector(indices=indices, values=values)
+                    if len(vector) == 1:
+                        vector = vector[""]
+                records.append(models.Record(
+                    id=self._ids[row], payload=self._payloads[row] if with_payload else None, vector=vector
+                ))
+            return records, int(rest[0]) if len(rest) else None
+
+    def _sparse_of(self, row: int) -> Optional[dict]:
+        result = self._conn.execute("SELECT sparse FROM points WHERE row = ?", (int(row),)).fetchone()
+        return json.loads(result[0]) if result and result[0] else None
+
+    def count(self, query_filter: Optional[models.Filter] = None) -> int:
+        with self._lock:
+            self._refresh()
+            return int(self._mask(query_filter).sum())
+
+    def info(self):
+        """Collection description with the same attribute paths as Qdrant's CollectionInfo."""
+        sparse_vectors = {
+            name: models.SparseVectorParams(modifier=models.Modifier.IDF) for name in self.config['sparse_vectors']
+        } or None
+        return SimpleNamespace(
+            points_count=self.count(),
+            payload_schema={field: models.PayloadSchemaType.KEYWORD for field in self.config['payload_indexes']},
+            config=SimpleNamespace(
+                params=SimpleNamespace(
+                    vectors=models.VectorParams(size=self.dimensions, distance=models.Distance.COSINE),
+                    sparse_vectors=sparse_vectors,
+                ),
+                # Vectors are kept at full precision; quantization settings are not applied
+                quantization_config=None,
+            ),
+        )
+
+    def close(self):
+        with self._lock:
+            if self._hnsw is not None and self._hnsw_rows > self._hnsw_saved_rows:
+                self._save_hnsw()
+            self._conn.close()
+
+def _reciprocal_rank_fusion(rankings: List[np.ndarray], limit: int) -> tuple:
+    """Scores each row by the sum of 1 / (RRF_K + rank) over the rankings it appears in."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[int(row)] += 1.0 / (RRF_K + rank)
+    rows = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return np.asarray(rows, dtype=np.int64), np.asarray([scores[row] for row in rows], dtype=np.float32)
+
+def _write_json(path: str, data: dict):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+def _write_config(path: str, config: dict):
+    _write_json(os.path.join(path, "config.json"), config)
+
+class EmbeddedVectorStore:
+    """Qdrant-compatible client over the collections stored under one directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _collection_path(self, collection_name: str) -> str:
+        if not collection_name or os.sep in collection_name or collection_name.startswith("."):
+            raise ValueError(f"Invalid collection name '{collection_name}'")
+        return os.path.join(self.path, collection_name)
+
+    def _collection(self, collection_name: str) -> _Collection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                path = self._collection_path(collection_name)
+                if not os.path.exists(os.path.join(path, "config.json")):
+                    raise ValueError(f"Collection {collection_name} not found")
+                collection = self._collections[collection_name] = _Collection(path)
+            return collection
+
+    def create_collection(self, collection_name: str, vectors_config: models.VectorParams,
+                          sparse_vectors_config: Optional[dict] = None,
+                          quantization_config: Optional[models.QuantizationConfig] = None, **kwargs):
+        if vectors_config.distance != models.Distance.COSINE:
+            raise ValueError(f"The embedded store only supports cosine distance, not {vectors_config.distance}")
+        if quantization_config is not None:
+            logger.warning(f"Collection {collection_name} keeps full-precision vectors; "
+                           f"the configured quantization only applies to Qdrant.")
+        path = self._collection_path(collection_name)
+        # Held so that of two threads creating the same collection, exactly one sees it missing
+        with self._lock:
+            if os.path.exists(os.path.join(path, "config.json")):
+                raise ValueError(f"Collection {collection_name} already exists")
+            os.makedirs(path, exist_ok=True)
+            _write_config(path, {
+                "dimensions": vectors_config.size,
+                "sparse_vectors": sorted(sparse_vectors_config or {}),
+                "payload_indexes": [],
+            })
+        return True
+
+    def get_collection(self, collection_name: str):
+        return self._collection(collection_name).info()
+
+    def delete_collection(self, collection_name: str):
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(self._collection_path(collection_name), ignore_errors=True)
+        return True
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, wait: bool = True):
+        self._collection(collection_name).create_payload_index(field_name)
+
+    def upsert(self, collection_name: str, points: Sequence[models.PointStruct], wait: bool = True):
+        self._collection(collection_name).upsert(points)
+
+    def delete(self, collection_name: str, points_selector: models.FilterSelector, wait: bool = True):
+        self._collection(collection_name).delete(points_selector.filter)
+
+    def query_batch_points(self, collection_name: str, requests: Sequence[models.QueryRequest]):
+        return [
+            QueryResponse(points=points)
+            for points in self._collection(collection_name).query_batch(requests)
+        ]
+
+    def scroll(self, collection_name: str, limit: int = 10, offset: Optional[int] = None,
+               scroll_filter: Optional[models.Filter] = None, with_payload: bool = True, with_vectors: bool = False):
+        return self._collection(collection_name).scroll(limit, offset, scroll_filter, with_payload, with_vectors)
+
+    def count(self, collection_name: str, count_filter: Optional[models.Filter] = None, exact: bool = True):
+        return models.CountResult(count=self._collection(collection_name).count(count_filter))
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+
+class AsyncEmbeddedVectorStore:
+    """Async facade for RetrievalService: runs the embedded store's calls in worker threads."""
+
+    def __init__(self, store: EmbeddedVectorStore):
+        self.store = store
+
+    async def get_collection(self, collection_name: str):
+        return await asyncio.to_thread(self.store.get_collection, collection_name)
+
+    async def query_batch_points(self, collection_name: str, requests: Sequence[models.QueryRequest]):
+        return await asyncio.to_thread(self.store.query_batch_points, collection_name, requests)
+
+    async def close(self):
+        # The store is shared by the process; it is closed with it
+        pass
+
+def get_embedded_store(path: str = None) -> EmbeddedVectorStore:
+    """Returns the process-wide store for a directory, so all services share loaded collections."""
+    path = os.path.abspath(path or settings.EMBEDDED_STORE_PATH)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = EmbeddedVectorStore(path)
+        return store
@@ -0,0 +1,154 @@
+import logging
+import random
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from app.config import settings
+from app.services.model_clients import create_embedding_client
+from app.utils.token_utils import count_tokens
+from app.utils.content_cache import get_content_cache, content_key, EMBEDDINGS
+
+logger = logging.getLogger(__name__)
+
+# Failures that can succeed on a later attempt; anything else (bad input, key or model) is raised at once
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+# Full output size of the supported embedding models
+MODEL_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+def embedding_dimensions(model: str = settings.EMBEDDING_MODEL,
+                         dimensions: Optional[int] = settings.EMBEDDING_DIMENSIONS,
+                         provider: str = settings.EMBEDDING_PROVIDER) -> int:
+    """Vector size produced for the model, either the configured shortened size or the full one."""
+    if dimensions:
+        return dimensions
+    if provider == "stub":
+        return settings.STUB_EMBEDDING_DIMENSIONS
+    if provider == "local":
+        from app.services.local_embeddings import model_dimensions
+        return model_dimensions(model)
+    if model not in MODEL_DIMENSIONS:
+        raise ValueError(f"Unknown dimensions for embedding model '{model}'; set EMBEDDING_DIMENSIONS.")
+    return MODEL_DIMENSIONS[model]
+
+def dimension_kwargs(model: str, dimensions: Optional[int]) -> dict:
+    """Extra embeddings.create arguments to request shortened vectors, if any."""
+    if not dimensions or dimensions == MODEL_DIMENSIONS.get(model):
+        return {}
+    return {"dimensions": dimensions}
+
+def model_key(model: str, dimensions: Optional[int], provider: str = settings.EMBEDDING_PROVIDER) -> str:
+    """
+    Identifies a provider, model and output size, so caches never mix vectors of different
+    sizes or stub vectors with real ones.
+    """
+    key = model if not dimension_kwargs(model, dimensions) else f"{model}:{dimensions}"
+    if provider != "openai":
+        key = f"{provider}:{key}"
+    return key
+
+class EmbeddingService:
+    """
+    Embeds texts in token-bounded batches, sending several batches concurrently.
+    Results are always returned in the same order as the input texts.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        model: str = settings.EMBEDDING_MODEL,
+        max_batch_tokens: int = settings.EMBEDDING_BATCH_MAX_TOKENS,
+        max_batch_size: int = settings.EMBEDDING_BATCH_MAX_SIZE,
+        max_concurrency: int = settings.EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = settings.EMBEDDING_MAX_RETRIES,
+        retry_backoff: float = settings.EMBEDDING_RETRY_BACKOFF,
+        dimensions: Optional[int] = settings.EMBEDDING_DIMENSIONS,
+    ):
+        self.client = client or create_embedding_client()
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.dimensions = dimensions
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Groups text indices into batches bounded by token count and batch size."""
+        batches = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text, self.model)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embeds one batch, retrying transient API errors with exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.embeddings.create(
+                    input=batch, model=self.model, **dimension_kwargs(self.model, self.dimensions)
+                )
+                data = sorted(response.data, key=lambda item: item.index)
+                return [item.embedding for item in data]
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt) * (1 + random.random())
+                logger.warning(f"Embedding batch of {len(batch)} failed ({e}), retrying in {delay:.1f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+
+    def _cache_key(self, text: str) -> str:
+        return content_key(model_key(self.model, self.dimensions), text.encode("utf-8"))
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds all texts and returns their vectors in input order, reusing cached vectors."""
+        if not texts:
+            return []
+
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+
+        cache = get_content_cache()
+        if cache is not None:
+            keys = [self._cache_key(text) for text in texts]
+            cached = cache.get_many(EMBEDDINGS, keys)
+            for i, key in enumerate(keys):
+                if key in cached:
+                    embeddings[i] = array("f", cached[key]).tolist()
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+
+        missing_texts = [texts[i] for i in missing]
+        batches = self.make_batches(missing_texts)
+        logger.info(f"Embedding {len(missing_texts)} texts in {len(batches)} batches "
+                    f"({len(texts) - len(missing_texts)} cached, concurrency {self.max_concurrency}).")
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            futures = [
+                (indices, executor.submit(self._embed_batch, [missing_texts[i] for i in indices]))
+                for indices in batches
+            ]
+            for indices, future in futures:
+                for i, embedding in zip(indices, future.result()):
+                    embeddings[missing[i]] = embedding
+
+        if cache is not None:
+            cache.set_many(EMBEDDINGS, {
+                keys[i]: array("f", embeddings[i]).tobytes() for i in missing
+            })
+
+        return embeddings
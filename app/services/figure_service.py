@@ -3,22 +3,59 @@ import json
 import io
 import base64
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Tuple
 from PIL import Image
-from openai import OpenAI
 import logging
 from app.config import settings
+from app.services.model_clients import create_generation_client
+from app.utils.rate_limit import TokenBucket
+from app.utils.content_cache import get_content_cache, content_key, FIGURE_DESCRIPTIONS
 
 logger = logging.getLogger(__name__)
 
+FAILED_DESCRIPTION = "Description could not be generated."
+
+_vision_client = None
+_vision_rate_limiter = None
+_vision_executor = None
+_vision_lock = threading.Lock()
+
+class FigureCrop(NamedTuple):
+    figure_index: int
+    unique_id: str
+    dt_span: Tuple[int, int]
+    md_span: Tuple[int, int]
+    figure_block: str
+    image_bytes: bytes
+
+def _get_vision_resources():
+    """Lazily creates the shared vision client, rate limiter and worker pool."""
+    global _vision_client, _vision_rate_limiter, _vision_executor
+    with _vision_lock:
+        if _vision_client is None:
+            _vision_client = create_generation_client()
+            _vision_rate_limiter = TokenBucket(
+                rate=settings.FIGURE_REQUESTS_PER_MINUTE / 60.0,
+                capacity=settings.FIGURE_MAX_CONCURRENCY,
+            )
+            _vision_executor = ThreadPoolExecutor(
+                max_workers=settings.FIGURE_MAX_CONCURRENCY,
+                thread_name_prefix="vision",
+            )
+    return _vision_client, _vision_rate_limiter, _vision_executor
+
 def get_figure_description_from_openai(image_bytes: bytes) -> str:
     """
-    Sends image bytes to the OpenAI GPT-4V (Vision) model and returns a description.
+    Sends image bytes to the vision model (VISION_MODEL of GENERATION_PROVIDER) and returns a description.
     """
     try:
+        client, rate_limiter, _ = _get_vision_resources()
+        rate_limiter.acquire()
         base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=settings.VISION_MODEL,
             messages=[
                 {
                     "role": "user",
@@ -32,30 +69,62 @@ def get_figure_description_from_openai(image_bytes: bytes) -> str:
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
-        logger.error(f"Error calling OpenAI API: {e}", exc_info=True)
-        return "Description could not be generated."
+        logger.error(f"Error calling vision model: {e}", exc_info=True)
+        return FAILED_DESCRIPTION
 
-def process_figures(content_dt: str, content_md: str, page_image_bytes: bytes, page_num: int, images_dir: str) -> tuple[str, str]:
+def describe_figures(crops: List[FigureCrop]) -> List[str]:
     """
-    Finds figures in a document, extracts them, gets a description, saves them, and updates the document.
+    Describes figure crops concurrently through the shared vision client, in input order.
+    Descriptions of identical crops are served from the content cache when available.
+    """
+    if not crops:
+        return []
+
+    cache = get_content_cache()
+    # Stub descriptions must not be served from the cache once a real model is configured
+    cache_model = settings.VISION_MODEL if settings.GENERATION_PROVIDER == "openai" else f"{settings.GENERATION_PROVIDER}:{settings.VISION_MODEL}"
+    keys = [content_key(cache_model, crop.image_bytes) for crop in crops]
+    cached = cache.get_many(FIGURE_DESCRIPTIONS, keys) if cache is not None else {}
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+
+    _, _, executor = _get_vision_resources()
+    logger.info(f"Describing {len(missing)} figures, {len(crops) - len(missing)} cached "
+                f"(concurrency {settings.FIGURE_MAX_CONCURRENCY}).")
+    described = list(executor.map(get_figure_description_from_openai, [crops[i].image_bytes for i in missing]))
+
+    if cache is not None:
+        cache.set_many(FIGURE_DESCRIPTIONS, {
+            keys[i]: description.encode("utf-8")
+            for i, description in zip(missing, described)
+            if description != FAILED_DESCRIPTION
+        })
+
+    descriptions = [cached[key].decode("utf-8") if key in cached else None for key in keys]
+    for i, description in zip(missing, described):
+        descriptions[i] = description
+    return descriptions
+
+def extract_figures(content_dt: str, content_md: str, page_image_bytes: bytes, page_num: int) -> List[FigureCrop]:
+    """
+    Finds the figures on a page and crops them from the page image.
     """
     figure_matches_dt = list(re.finditer(r"(<figure>.*?</figure>)", content_dt, re.DOTALL))
     image_matches_md = list(re.finditer(r"<!-- image -->", content_md))
 
     if len(figure_matches_dt) != len(image_matches_md):
         logger.warning(f"Warning: Mismatch in figure count - DocTags: {len(figure_matches_dt)}, Markdown: {len(image_matches_md)}")
-        return content_dt, content_md
+        return []
 
     if not figure_matches_dt:
-        return content_dt, content_md
+        return []
 
     logger.info(f"Found {len(figure_matches_dt)} figures to process on page {page_num}")
 
     page_image = Image.open(io.BytesIO(page_image_bytes))
     page_width, page_height = page_image.size
 
-    for i, (dt_match, md_match) in enumerate(reversed(list(zip(figure_matches_dt, image_matches_md)))):
-        figure_index = len(figure_matches_dt) - 1 - i
+    crops = []
+    for figure_index, (dt_match, md_match) in enumerate(zip(figure_matches_dt, image_matches_md)):
         full_figure_block = dt_match.group(0)
 
         loc_numbers = re.findall(r"<loc_(\d+)>", full_figure_block)
@@ -73,30 +142,78 @@ def process_figures(content_dt: str, content_md: str, page_image_bytes: bytes, p
             cropped_image.save(output, format="PNG")
             cropped_image_bytes = output.getvalue()
 
-        logger.info(f"Getting description for figure {figure_index} at location: {coords}...")
+        crops.append(FigureCrop(
+            figure_index=figure_index,
+            unique_id=f"pg_{page_num}_fig_{figure_index + 1}",
+            dt_span=dt_match.span(),
+            md_span=md_match.span(),
+            figure_block=full_figure_block,
+            image_bytes=cropped_image_bytes,
+        ))
 
-        try:
-            description_text = get_figure_description_from_openai(cropped_image_bytes)
-            unique_id = f"pg_{page_num}_fig_{figure_index + 1}"
+    return crops
 
+def apply_figure_descriptions(content_dt: str, content_md: str, crops: List[FigureCrop], descriptions: List[str], images_dir: str) -> tuple[str, str]:
+    """
+    Saves the figure images and splices their descriptions into the page contents.
+    Figures are applied from last to first so earlier match offsets stay valid.
+    """
+    for crop, description_text in sorted(zip(crops, descriptions), key=lambda item: item[0].figure_index, reverse=True):
+        try:
             # Save the image
-            image_path = os.path.join(images_dir, f"{unique_id}.png")
-            cropped_image.save(image_path, "PNG")
+            image_path = os.path.join(images_dir, f"{crop.unique_id}.png")
+            with open(image_path, "wb") as f:
+                f.write(crop.image_bytes)
             logger.info(f"✓ Saved figure image to {image_path}")
 
-            figcaption = f"<figcaption>[figure: {unique_id}]{description_text}</figcaption>"
-            new_figure_block = full_figure_block.replace("</figure>", f"{figcaption}</figure>", 1)
+            figcaption = f"<figcaption>[figure: {crop.unique_id}]{description_text}</figcaption>"
+            new_figure_block = crop.figure_block.replace("</figure>", f"{figcaption}</figure>", 1)
 
-            start, end = dt_match.span()
+            start, end = crop.dt_span
             content_dt = content_dt[:start] + new_figure_block + content_dt[end:]
 
-            image_markdown = f"![{description_text}]<!-- figure: {unique_id} -->"
-            md_start, md_end = md_match.span()
+            image_markdown = f"![{description_text}]<!-- figure: {crop.unique_id} -->"
+            md_start, md_end = crop.md_span
             content_md = content_md[:md_start] + image_markdown + content_md[md_end:]
 
-            logger.info(f"✓ Processed figure {figure_index} with ID: {unique_id}")
+            logger.info(f"✓ Processed figure {crop.figure_index} with ID: {crop.unique_id}")
         except Exception as e:
-            logger.error(f"✗ Failed to process figure {figure_index}: {str(e)}", exc_info=True)
+            logger.error(f"✗ Failed to process figure {crop.figure_index}: {str(e)}", exc_info=True)
             continue
 
-    return content_dt, content_md
\ No newline at end of file
+    return content_dt, content_md
+
+def process_figures(content_dt: str, content_md: str, page_image_bytes: bytes, page_num: int, images_dir: str) -> tuple[str, str]:
+    """
+    Finds figures in a document, extracts them, gets a description, saves them, and updates the document.
+    """
+    crops = extract_figures(content_dt, content_md, page_image_bytes, page_num)
+    if not crops:
+        return content_dt, content_md
+    descriptions = describe_figures(crops)
+    return apply_figure_descriptions(content_dt, content_md, crops, descriptions, images_dir)
+
+def process_pages_figures(rows: List[dict], images_dir: str) -> List[dict]:
+    """
+    Collects the figure crops of all given page rows, describes them concurrently,
+    and splices the descriptions back into each row's contents_dt/contents_md.
+    """
+    page_crops = [
+        extract_figures(row['contents_dt'], row['contents_md'], row['image.bytes'], row['extra.page_num'])
+        for row in rows
+    ]
+    descriptions = describe_figures([crop for crops in page_crops for crop in crops])
+
+    offset = 0
+    for row, crops in zip(rows, page_crops):
+        if not crops:
+            continue
+        row['contents_dt'], row['contents_md'] = apply_figure_descriptions(
+            row['contents_dt'],
+            row['contents_md'],
+            crops,
+            descriptions[offset:offset + len(crops)],
+            images_dir
+        )
+        offset += len(crops)
+    return rows
@@ -0,0 +1,98 @@
+"""
+Local CPU embeddings with sentence-transformers, for nodes without access to the OpenAI API.
+EMBEDDING_MODEL names a sentence-transformers model (a Hugging Face ID or a local path),
+run with PyTorch or, with LOCAL_EMBEDDING_BACKEND=onnx, with ONNX Runtime.
+"""
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Union
+import numpy as np
+from app.config import settings
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+_models: Dict[str, "SentenceTransformer"] = {}
+_model_locks: Dict[str, threading.Lock] = {}
+_models_lock = threading.Lock()
+
+def load_model(name: str):
+    """Loads a model once per process; later calls return the same instance."""
+    if SentenceTransformer is None:
+        raise RuntimeError("EMBEDDING_PROVIDER=local needs sentence-transformers: pip install sentence-transformers "
+                           "(and optimum[onnxruntime] for LOCAL_EMBEDDING_BACKEND=onnx).")
+    with _models_lock:
+        if name not in _models:
+            if settings.LOCAL_EMBEDDING_THREADS > 0 and settings.LOCAL_EMBEDDING_BACKEND == "torch":
+                import torch
+                torch.set_num_threads(settings.LOCAL_EMBEDDING_THREADS)
+            kwargs = {"backend": "onnx"} if settings.LOCAL_EMBEDDING_BACKEND == "onnx" else {}
+            _models[name] = SentenceTransformer(name, device=settings.LOCAL_EMBEDDING_DEVICE, **kwargs)
+            _model_locks[name] = threading.Lock()
+            logger.info(f"Loaded local embedding model '{name}' ({settings.LOCAL_EMBEDDING_BACKEND} on "
+                        f"{settings.LOCAL_EMBEDDING_DEVICE}, {_models[name].get_sentence_embedding_dimension()} dimensions).")
+        return _models[name]
+
+def model_dimensions(name: str) -> int:
+    return load_model(name).get_sentence_embedding_dimension()
+
+def encode(texts: List[str], model: str, dimensions: Optional[int] = None) -> np.ndarray:
+    """
+    Embeds texts into unit vectors, LOCAL_EMBEDDING_BATCH_SIZE at a time. Calls on one model
+    are serialized; the backend parallelizes each batch over LOCAL_EMBEDDING_THREADS threads.
+    Vectors are shortened to dimensions, if given, by truncating and re-normalizing.
+    """
+    st_model = load_model(model)
+    with _model_locks[model]:
+        vectors = st_model.encode(
+            texts,
+            batch_size=settings.LOCAL_EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+    if dimensions and dimensions != vectors.shape[1]:
+        if dimensions > vectors.shape[1]:
+            raise ValueError(f"Model '{model}' produces {vectors.shape[1]}-dimensional vectors, {dimensions} requested.")
+        vectors = vectors[:, :dimensions]
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors
+
+def _response(vectors: np.ndarray, model: str):
+    """Shapes vectors like the OpenAI embeddings response."""
+    return SimpleNamespace(
+        data=[SimpleNamespace(index=i, embedding=vector.tolist()) for i, vector in enumerate(vectors)],
+        model=model,
+        usage=SimpleNamespace(prompt_tokens=0, total_tokens=0),
+    )
+
+class LocalEmbeddingClient:
+    """Implements the OpenAI client's embeddings.create over a local model."""
+
+    def __init__(self):
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    def _create(self, input: Union[str, List[str]], model: str, dimensions: Optional[int] = None, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        return _response(encode(texts, model, dimensions), model)
+
+    def close(self):
+        pass
+
+class AsyncLocalEmbeddingClient:
+    """Async variant for the retrieval service; encoding runs in a worker thread."""
+
+    def __init__(self):
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    async def _create(self, input: Union[str, List[str]], model: str, dimensions: Optional[int] = None, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        return _response(await asyncio.to_thread(encode, texts, model, dimensions), model)
+
+    async def close(self):
+        pass
@@ -0,0 +1,157 @@
+"""
+Creates the embedding and generation clients for the configured providers.
+
+Services call models through the OpenAI client API (embeddings.create and
+chat.completions.create), so a provider is any object with those methods:
+  - "openai": the OpenAI API, or any OpenAI-compatible server at OPENAI_BASE_URL
+  - "local":  sentence-transformers on this machine (embeddings only)
+  - "stub":   deterministic fake output, for tests and load benchmarks
+"""
+import time
+from types import SimpleNamespace
+from typing import Optional
+import httpx
+from app.config import settings
+from app.utils.metrics import MODEL_API_CALLS, MODEL_API_ERRORS, MODEL_API_SECONDS, MODEL_TOKENS
+
+def _record_usage(provider: str, model: Optional[str], usage):
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if tokens:
+            MODEL_TOKENS.labels(provider, model, kind).inc(tokens)
+
+class InstrumentedClient:
+    """
+    Wraps a model client's embeddings.create and chat.completions.create, counting calls,
+    errors and latency per provider and operation, and the tokens the responses report.
+    Streamed completions report tokens in their last chunk.
+    """
+
+    def __init__(self, client, provider: str, is_async: bool):
+        self.client = client
+        self.provider = provider
+        wrap = self._wrap_async if is_async else self._wrap
+        if hasattr(client, "embeddings"):
+            self.embeddings = SimpleNamespace(create=wrap(client.embeddings.create, "embeddings"))
+        if hasattr(client, "chat"):
+            self.chat = SimpleNamespace(completions=SimpleNamespace(create=wrap(client.chat.completions.create, "chat")))
+
+    def _wrap(self, create, operation: str):
+        def call(*args, **kwargs):
+            MODEL_API_CALLS.labels(self.provider, operation).inc()
+            start = time.perf_counter()
+            try:
+                response = create(*args, **kwargs)
+            except Exception:
+                MODEL_API_ERRORS.labels(self.provider, operation).inc()
+                raise
+            finally:
+                MODEL_API_SECONDS.labels(self.provider, operation).observe(time.perf_counter() - start)
+            _record_usage(self.provider, kwargs.get("model"), getattr(response, "usage", None))
+            return response
+        return call
+
+    def _wrap_async(self, create, operation: str):
+        async def call(*args, **kwargs):
+            MODEL_API_CALLS.labels(self.provider, operation).inc()
+            start = time.perf_counter()
+            try:
+                response = await create(*args, **kwargs)
+            except Exception:
+                MODEL_API_ERRORS.labels(self.provider, operation).inc()
+                raise
+            finally:
+                MODEL_API_SECONDS.labels(self.provider, operation).observe(time.perf_counter() - start)
+            if kwargs.get("stream"):
+                return self._track_stream(response, operation, kwargs.get("model"))
+            _record_usage(self.provider, kwargs.get("model"), getattr(response, "usage", None))
+            return response
+        return call
+
+    async def _track_stream(self, stream, operation: str, model: Optional[str]):
+        try:
+            async for chunk in stream:
+                _record_usage(self.provider, model, getattr(chunk, "usage", None))
+                yield chunk
+        except Exception:
+            MODEL_API_ERRORS.labels(self.provider, operation).inc()
+            raise
+
+    def close(self):
+        return self.client.close()
+
+def _openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+
+def _async_openai_client(limits: Optional[httpx.Limits]):
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=DefaultAsyncHttpxClient(limits=limits) if limits is not None else None,
+    )
+
+def create_embedding_client():
+    """Synchronous embeddings client for ingestion, per EMBEDDING_PROVIDER."""
+    if settings.EMBEDDING_PROVIDER == "local":
+        from app.services.local_embeddings import LocalEmbeddingClient
+        client = LocalEmbeddingClient()
+    elif settings.EMBEDDING_PROVIDER == "stub":
+        from app.services.stub_models import StubModelClient
+        client = StubModelClient()
+    else:
+        client = _openai_client()
+    return InstrumentedClient(client, settings.EMBEDDING_PROVIDER, is_async=False)
+
+def create_generation_client():
+    """Synchronous chat client for figure descriptions, per GENERATION_PROVIDER."""
+    if settings.GENERATION_PROVIDER == "stub":
+        from app.services.stub_models import StubModelClient
+        client = StubModelClient()
+    else:
+        client = _openai_client()
+    return InstrumentedClient(client, settings.GENERATION_PROVIDER, is_async=False)
+
+class AsyncModelClient:
+    """Routes embeddings and chat completions to clients of different providers."""
+
+    def __init__(self, embedding_client, generation_client):
+        self.embeddings = embedding_client.embeddings
+        self.chat = generation_client.chat
+        self._clients = [embedding_client] if embedding_client is generation_client else [embedding_client, generation_client]
+
+    async def close(self):
+        for client in self._clients:
+            await client.close()
+
+def create_async_model_client(limits: Optional[httpx.Limits] = None):
+    """
+    Asynchronous client for the retrieval service, with embeddings from EMBEDDING_PROVIDER
+    and chat completions from GENERATION_PROVIDER. OpenAI connections share the given limits.
+    """
+    if settings.EMBEDDING_PROVIDER == "openai" and settings.GENERATION_PROVIDER == "openai":
+        return InstrumentedClient(_async_openai_client(limits), "openai", is_async=True)
+
+    if settings.GENERATION_PROVIDER == "stub":
+        from app.services.stub_models import AsyncStubModelClient
+        generation_client = AsyncStubModelClient()
+    else:
+        generation_client = _async_openai_client(limits)
+
+    if settings.EMBEDDING_PROVIDER == "local":
+        from app.services.local_embeddings import AsyncLocalEmbeddingClient
+        embedding_client = AsyncLocalEmbeddingClient()
+    elif settings.EMBEDDING_PROVIDER == "stub":
+        from app.services.stub_models import AsyncStubModelClient
+        embedding_client = generation_client if isinstance(generation_client, AsyncStubModelClient) else AsyncStubModelClient()
+    else:
+        embedding_client = _async_openai_client(limits)
+    embedding_client = InstrumentedClient(embedding_client, settings.EMBEDDING_PROVIDER, is_async=True)
+    if embedding_client.client is not generation_client:
+        generation_client = InstrumentedClient(generation_client, settings.GENERATION_PROVIDER, is_async=True)
+    else:
+        generation_client = embedding_client
+    return AsyncModelClient(embedding_client, generation_client)
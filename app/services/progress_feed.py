@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Optional, Set
+from app.config import settings
+from app.utils.db_utils import get_jobs_progress
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+class ProgressFeed:
+    """
+    Pushes ingestion progress to subscribers. A single polling task reads the status and
+    progress of every watched job in one query each PROGRESS_POLL_INTERVAL, so the database
+    load does not grow with the number of open streams, and subscribers are only woken when
+    their job changed. One instance is created at startup and shared by all requests.
+    """
+
+    def __init__(self, poll_interval: float = settings.PROGRESS_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._last: Dict[str, tuple] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._subscribers:
+                continue
+            jobs = await asyncio.to_thread(get_jobs_progress, list(self._subscribers))
+            if jobs is None:
+                continue
+            for job_id, state in jobs.items():
+                self._publish(job_id, state)
+
+    def _publish(self, job_id: str, state: tuple):
+        if self._last.get(job_id) == state:
+            return
+        self._last[job_id] = state
+        for queue in self._subscribers.get(job_id, ()):
+            # Subscribers only need the latest state; drop one they have not read yet
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(state)
+
+    async def subscribe(self, job_id: str, keepalive: float = settings.PROGRESS_KEEPALIVE_INTERVAL) -> AsyncIterator[Optional[dict]]:
+        """
+        Yields the job's status and progress now and after every change, until the job
+        completes or fails. Yields None when nothing changed for keepalive seconds.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll())
+
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers[job_id].add(queue)
+        try:
+            state = self._last.get(job_id)
+            if state is None:
+                jobs = await asyncio.to_thread(get_jobs_progress, [job_id])
+                state = (jobs or {}).get(job_id)
+                if state is None:
+                    return
+                self._last[job_id] = state
+            if queue.empty():
+                queue.put_nowait(state)
+
+            while True:
+                try:
+                    status, progress = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield {"job_id": job_id, "status": status, "progress": progress}
+                if status in TERMINAL_STATUSES:
+                    return
+        finally:
+            self._subscribers[job_id].discard(queue)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+                self._last.pop(job_id, None)
@@ -0,0 +1,131 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+def normalize_query(query: str) -> str:
+    """Normalizes query text so trivially different phrasings share a cache entry."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+class LatencyTracker:
+    """Running mean of a latency, used to estimate the time saved by cache hits."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.mean += (seconds - self.mean) / self.count
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+class QueryEmbeddingCache:
+    """In-memory LRU cache of normalized query text -> embedding, with a TTL per entry."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.latency = LatencyTracker()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, normalize_query(query))
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            self.stats.saved_seconds += self.latency.mean
+            return entry[0]
+        if entry is not None:
+            del self._entries[key]
+        self.stats.misses += 1
+        return None
+
+    def set(self, model: str, query: str, embedding: List[float]):
+        key = (model, normalize_query(query))
+        self._entries[key] = (embedding, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class _CollectionAnswers:
+    def __init__(self, version):
+        self.version = version
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.entries: List[dict] = []
+
+class SemanticAnswerCache:
+    """
+    Caches answers per collection, keyed by query embedding: a query whose embedding has
+    cosine similarity >= threshold with a cached query reuses its answer. Each collection's
+    entries are tagged with the collection version and dropped when it changes (re-ingestion).
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.latency = LatencyTracker()
+        self._collections: Dict[str, _CollectionAnswers] = {}
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _collection(self, collection_name: str, version) -> _CollectionAnswers:
+        answers = self._collections.get(collection_name)
+        if answers is None or answers.version != version:
+            answers = _CollectionAnswers(version)
+            self._collections[collection_name] = answers
+        return answers
+
+    def get(self, collection_name: str, version, embedding: List[float]) -> Optional[dict]:
+        answers = self._collection(collection_name, version)
+        if answers.entries:
+            similarities = answers.vectors @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            entry = answers.entries[best]
+            if similarities[best] >= self.threshold and time.monotonic() - entry['created'] < self.ttl:
+                entry['last_used'] = time.monotonic()
+                self.stats.hits += 1
+                self.stats.saved_seconds += self.latency.mean
+                return entry['value']
+        self.stats.misses += 1
+        return None
+
+    def set(self, collection_name: str, version, embedding: List[float], value: Any):
+        answers = self._collection(collection_name, version)
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        entries = answers.entries + [{"value": value, "created": now, "last_used": now}]
+        vectors = np.vstack([answers.vectors, vector]) if answers.entries else vector[np.newaxis, :]
+
+        if len(entries) > self.max_entries:
+            # Evict the least recently used entry
+            evict = min(range(len(entries)), key=lambda i: entries[i]['last_used'])
+            del entries[evict]
+            vectors = np.delete(vectors, evict, axis=0)
+
+        answers.entries = entries
+        answers.vectors = vectors
+
+    def invalidate(self, collection_name: str):
+        self._collections.pop(collection_name, None)
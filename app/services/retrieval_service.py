@@ -1,117 +1,571 @@
+import asyncio
 import logging
-from openai import OpenAI
-from qdrant_client import QdrantClient
+import re
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+import httpx
+from openai import AsyncOpenAI
+from qdrant_client import AsyncQdrantClient, models
 from app.config import settings
+from app.services.context_builder import build_context
+from app.services.embedding_service import dimension_kwargs, model_key
+from app.services.model_clients import create_async_model_client
+from app.services.query_cache import QueryEmbeddingCache, SemanticAnswerCache
+from app.services.sparse_encoder import encode_query
+from app.services.vector_clients import create_async_vector_client
+from app.utils.db_utils import get_collection_version, kb_version_key
+from app.utils.metrics import RETRIEVAL_REQUESTS, RETRIEVAL_SECONDS
 
 logger = logging.getLogger(__name__)
 
+FIGURE_REFERENCE_PATTERN = re.compile(r'\[(?:Fig|figure): (.*?)\]', re.IGNORECASE)
+
+def parse_figure_references(text: str) -> List[str]:
+    """Returns the unique figure IDs referenced as [Fig: pg_X_fig_Y] in an answer, in order."""
+    return list(dict.fromkeys(match.group(1) for match in FIGURE_REFERENCE_PATTERN.finditer(text)))
+
+def source_from_hit(hit) -> dict:
+    """Summarizes a search hit for clients, without its full content."""
+    payload = hit.payload or {}
+    return {
+        "document": payload.get('document'),
+        "page_num": payload.get('page_num'),
+        "page_start": payload.get('page_start'),
+        "page_end": payload.get('page_end'),
+        "score": hit.score,
+    }
+
+def search_filter(filters: Optional[Dict[str, str]]) -> Optional[models.Filter]:
+    """Builds an exact-match payload filter, e.g. {"kb_name": ..., "document": ...}."""
+    if not filters:
+        return None
+    return models.Filter(must=[
+        models.FieldCondition(key=key, match=models.MatchValue(value=value))
+        for key, value in sorted(filters.items())
+    ])
+
+class AnswerScope(NamedTuple):
+    """What a cached answer is valid for: a collection, or the part of it a filter selects."""
+    cache_key: str
+    version_key: str
+
+def answer_scope(collection_name: str, filters: Optional[Dict[str, str]] = None) -> AnswerScope:
+    if not filters:
+        return AnswerScope(collection_name, collection_name)
+    cache_key = collection_name + "?" + "&".join(f"{key}={value}" for key, value in sorted(filters.items()))
+    # Ingestion bumps a per-KB version as well, so answers for other KBs in a shared collection survive
+    version_key = kb_version_key(collection_name, filters['kb_name']) if 'kb_name' in filters else collection_name
+    return AnswerScope(cache_key, version_key)
+
+class CollectionProfile(NamedTuple):
+    """What a collection was created with, which decides how it is queried."""
+    dimensions: Optional[int]
+    hybrid: bool
+    quantized: bool
+
 class RetrievalService:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.qdrant_client = QdrantClient(url=settings.QDRANT_URL)
+    """
+    Answers queries against a collection. Uses async OpenAI and Qdrant clients with
+    keep-alive connection pooling; one instance is created at startup and shared by all requests.
+    """
+
+    def __init__(self, openai_client: AsyncOpenAI = None, qdrant_client: AsyncQdrantClient = None):
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        self.openai_client = openai_client or create_async_model_client(limits)
+        self.qdrant_client = qdrant_client or create_async_vector_client(limits)
+
+        self.embedding_cache = None
+        if settings.QUERY_EMBEDDING_CACHE_SIZE > 0:
+            self.embedding_cache = QueryEmbeddingCache(
+                max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+                ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+            )
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_MAX_ENTRIES > 0:
+            self.answer_cache = SemanticAnswerCache(
+                threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                ttl=settings.ANSWER_CACHE_TTL,
+            )
+        self._collection_versions = {}
+        self._collection_profiles = {}
+        self.context_stats = {"queries": 0, "context_tokens": 0, "tokens_saved": 0}
+
+    async def close(self):
+        await self.openai_client.close()
+        await self.qdrant_client.close()
+
+    def _build_messages(self, query: str, context: str) -> list:
+        """Builds the system and user messages for answering a query from the retrieved context."""
+        sys_prompt = f"""
+        You are a helpful AI assistant. Your task is to answer the user's query based *STRICTLY AND EXCLUSIVELY* on the provided context below.
+
+        **CRITICAL RULES - VIOLATION WILL RESULT IN INCORRECT OUTPUT:**
+
+        1. **FIGURE REFERENCES - ZERO TOLERANCE FOR HALLUCINATION:**
+        - You may ONLY reference figures using IDs that appear EXACTLY as `<!-- figure: pg_X_fig_Y -->` in the context
+        - **MANDATORY:** Before outputting any figure reference, you MUST verify that the figure's description or content is relevant to your answer
+        - **Input Format in Context:** `<!-- figure: pg_X_fig_Y -->`
+        - **Output Format in Answer:** `[Fig: pg_X_fig_Y]`
+        - **PROCESS:** 1) Find `<!-- figure: pg_X_fig_Y -->` tag → 2) Read the preceding description in encapsulated in ![...] → 3) Verify relevance → 4) Only then reference if appropriate
+        - **FORBIDDEN:** Referencing figures without understanding their content or relevance
+        - **IF NO FIGURE TAGS EXIST IN CONTEXT:** Do not reference any figures at all
+
+        2. **STRICT CONTEXT ADHERENCE:**
+        - Answer ONLY based on information explicitly stated in the context
+        - Do not add external knowledge, assumptions, or inferences
+        - If information is not in the context, state: "This information is not available in the provided context."
+
+        3. **FIGURE REFERENCE VALIDATION CHECKLIST:**
+        Before using ANY figure reference, verify ALL of these:
+        - [ ] Does `<!-- figure: pg_X_fig_Y -->` appear in the context?
+        - [ ] Have I read the text/description around this figure tag?
+        - [ ] Is this figure's content relevant to answering the user's query?
+        - [ ] Am I copying the pg_X_fig_Y part exactly as written?
+        - [ ] Am I using the correct output format `[Fig: pg_X_fig_Y]`?
+        
+        **If you cannot check ALL five boxes, DO NOT include the figure reference.**
+
+        4. **TABLE HANDLING:**
+        - If context contains tabular data, render it in proper Markdown table format
+        - Only include tables that are explicitly present in the context
+
+        **EXAMPLE OF CORRECT BEHAVIOR:**
+        - Context: "The network topology shows three layers. <!-- figure: pg_1_fig_1 --> This diagram illustrates the hierarchical structure."
+        - Query: "What does the network topology look like?"
+        - Correct Process: 1) Find tag → 2) Read description ("three layers", "hierarchical structure") → 3) Verify relevance (matches query) → 4) Reference
+        - Correct Answer: "The network topology shows three layers with a hierarchical structure [Fig: pg_1_fig_1]"
+        - WRONG: Referencing [Fig: pg_1_fig_1] for a query about "database performance" when the figure is about network topology
+
+        **REMEMBER:** Your accuracy depends on following these rules precisely. When in doubt, omit figure references rather than guess.
+
+        ---
+        **Context:**
+        {context}
+        ---
+        """
+
+        prompt = f"""
+        **User Query:**
+        {query}
+
+        **Instructions Reminder:**
+        - Answer based ONLY on the provided context above
+        - Use figure references ONLY if they exist as `<!-- figure: pg_X_fig_Y -->` in the context
+        - **CRITICAL:** Read and understand the figure's description/context before referencing it
+        - Only reference figures that are relevant to answering the user's specific query
+        - Transform figure references from `<!-- figure: pg_X_fig_Y -->` to `[Fig: pg_X_fig_Y]`
+        - Copy the pg_X_fig_Y part EXACTLY as it appears
+        - If uncertain about any information, state that it's not available in the context
+
+        **Answer:**
+        """
+
+        return [
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    async def _embed_query(self, query: str, dimensions: Optional[int] = None) -> List[float]:
+        cache_model = model_key(settings.EMBEDDING_MODEL, dimensions)
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(cache_model, query)
+            if cached is not None:
+                return cached
+
+        start = time.perf_counter()
+        query_embedding = (await self.openai_client.embeddings.create(
+            input=query,
+            model=settings.EMBEDDING_MODEL,
+            **dimension_kwargs(settings.EMBEDDING_MODEL, dimensions)
+        )).data[0].embedding
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.latency.record(time.perf_counter() - start)
+            self.embedding_cache.set(cache_model, query, query_embedding)
+        return query_embedding
+
+    async def _collection_profile(self, collection_name: str) -> CollectionProfile:
+        """
+        Returns the collection's vector size, whether it has BM25 sparse vectors and whether it
+        is quantized. Collections keep the settings they were created with, so this is memoized.
+        """
+        profile = self._collection_profiles.get(collection_name)
+        if profile is None:
+            collection = await self.qdrant_client.get_collection(collection_name=collection_name)
+            try:
+                params = collection.config
+                sparse_vectors = params.params.sparse_vectors or {}
+                profile = CollectionProfile(
+                    dimensions=params.params.vectors.size,
+                    hybrid=settings.SPARSE_VECTOR_NAME in sparse_vectors,
+                    quantized=params.quantization_config is not None,
+                )
+            except AttributeError:
+                profile = CollectionProfile(dimensions=None, hybrid=False, quantized=False)
+            self._collection_profiles[collection_name] = profile
+        return profile
+
+    def _query_request(self, query: str, query_embedding: List[float], profile: CollectionProfile,
+                       filters: Optional[Dict[str, str]] = None) -> models.QueryRequest:
+        """
+        Builds the Qdrant query. Hybrid queries prefetch dense and BM25 candidates and
+        fuse the two rankings with reciprocal rank fusion on the server. Quantized
+        collections rescore an oversampled candidate set with the original vectors.
+        Filters restrict every stage to points with matching payload fields.
+        """
+        query_filter = search_filter(filters)
+        search_params = None
+        if profile.quantized:
+            search_params = models.SearchParams(quantization=models.QuantizationSearchParams(
+                rescore=settings.QUANTIZATION_RESCORE,
+                oversampling=settings.QUANTIZATION_OVERSAMPLING,
+            ))
+        if not (settings.HYBRID_SEARCH_ENABLED and profile.hybrid):
+            return models.QueryRequest(
+                query=query_embedding, filter=query_filter, params=search_params,
+                limit=settings.RETRIEVAL_TOP_K, with_payload=True
+            )
+        return models.QueryRequest(
+            prefetch=[
+                models.Prefetch(query=query_embedding, filter=query_filter, params=search_params,
+                                limit=settings.HYBRID_PREFETCH_LIMIT),
+                models.Prefetch(query=encode_query(query), using=settings.SPARSE_VECTOR_NAME,
+                                filter=query_filter, limit=settings.HYBRID_PREFETCH_LIMIT),
+            ],
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            filter=query_filter,
+            limit=settings.RETRIEVAL_TOP_K,
+            with_payload=True,
+        )
+
+    async def _search(self, query: str, query_embedding: List[float], collection_name: str,
+                      filters: Optional[Dict[str, str]] = None) -> list:
+        profile = await self._collection_profile(collection_name)
+        responses = await self.qdrant_client.query_batch_points(
+            collection_name=collection_name,
+            requests=[self._query_request(query, query_embedding, profile, filters)]
+        )
+        return responses[0].points
+
+    async def _collection_version(self, collection_name: str):
+        """
+        Returns the collection's version, bumped by every ingestion into it. The value is
+        re-read from the jobs database at most every ANSWER_CACHE_VERSION_CHECK_INTERVAL seconds.
+        """
+        cached = self._collection_versions.get(collection_name)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < settings.ANSWER_CACHE_VERSION_CHECK_INTERVAL:
+            return cached[0]
+        version = await asyncio.to_thread(get_collection_version, collection_name)
+        self._collection_versions[collection_name] = (version, now)
+        return version
+
+    async def _cached_answer(self, scope: AnswerScope, query_embedding: List[float]):
+        """Returns (cached answer or None, version of the scope)."""
+        if self.answer_cache is None:
+            return None, None
+        version = await self._collection_version(scope.version_key)
+        if version is None:
+            return None, None
+        return self.answer_cache.get(scope.cache_key, version, query_embedding), version
+
+    def stats(self) -> dict:
+        return {
+            "query_embeddings": self.embedding_cache.stats.as_dict() if self.embedding_cache else None,
+            "answers": self.answer_cache.stats.as_dict() if self.answer_cache else None,
+            "context": dict(self.context_stats),
+        }
+
+    def _format_context(self, search_results: list) -> str:
+        context, stats = build_context(
+            search_results,
+            token_budget=settings.CONTEXT_TOKEN_BUDGET,
+            dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD,
+            model=settings.LLM_MODEL,
+        )
+        self.context_stats['queries'] += 1
+        self.context_stats['context_tokens'] += stats.context_tokens
+        self.context_stats['tokens_saved'] += stats.tokens_saved
+        return context
 
-    def retrieve(self, query: str, collection_name: str) -> str:
+    async def _error_message(self, collection_name: str) -> str:
         try:
-            # 1. Embed the query
-            query_embedding = self.openai_client.embeddings.create(
-                input=query,
-                model="text-embedding-3-large"
-            ).data[0].embedding
+            await self.qdrant_client.get_collection(collection_name=collection_name)
+        except Exception:
+            return f"Error: Collection '{collection_name}' not found."
+        return "An error occurred during retrieval."
+
+    async def retrieve(self, query: str, collection_name: str, filters: Optional[Dict[str, str]] = None) -> str:
+        try:
+            start = time.perf_counter()
+            scope = answer_scope(collection_name, filters)
+
+            # 1. Embed the query, at the collection's vector size
+            profile = await self._collection_profile(collection_name)
+            with RETRIEVAL_SECONDS.labels("embed", "single").time():
+                query_embedding = await self._embed_query(query, profile.dimensions)
+
+            cached, version = await self._cached_answer(scope, query_embedding)
+            if cached is not None:
+                RETRIEVAL_REQUESTS.labels("single", "cached").inc()
+                return cached['response']
 
             # 2. Perform similarity search in Qdrant
-            search_results = self.qdrant_client.search(
-                collection_name=collection_name,
-                query_vector=query_embedding,
-                limit=10
-            )
+            with RETRIEVAL_SECONDS.labels("search", "single").time():
+                search_results = await self._search(query, query_embedding, collection_name, filters)
 
             # 3. Format the context
-            context = "\n---\n".join([
-                hit.payload['content'] for hit in search_results
-            ])
+            context = self._format_context(search_results)
 
-            # print(context)
             # 4. Prepare the prompt for the LLM
-            sys_prompt = f"""
-            You are a helpful AI assistant. Your task is to answer the user's query based *STRICTLY AND EXCLUSIVELY* on the provided context below.
-
-            **CRITICAL RULES - VIOLATION WILL RESULT IN INCORRECT OUTPUT:**
-
-            1. **FIGURE REFERENCES - ZERO TOLERANCE FOR HALLUCINATION:**
-            - You may ONLY reference figures using IDs that appear EXACTLY as `<!-- figure: pg_X_fig_Y -->` in the context
-            - **MANDATORY:** Before outputting any figure reference, you MUST verify that the figure's description or content is relevant to your answer
-            - **Input Format in Context:** `<!-- figure: pg_X_fig_Y -->`
-            - **Output Format in Answer:** `[Fig: pg_X_fig_Y]`
-            - **PROCESS:** 1) Find `<!-- figure: pg_X_fig_Y -->` tag → 2) Read the preceding description in encapsulated in ![...] → 3) Verify relevance → 4) Only then reference if appropriate
-            - **FORBIDDEN:** Referencing figures without understanding their content or relevance
-            - **IF NO FIGURE TAGS EXIST IN CONTEXT:** Do not reference any figures at all
-
-            2. **STRICT CONTEXT ADHERENCE:**
-            - Answer ONLY based on information explicitly stated in the context
-            - Do not add external knowledge, assumptions, or inferences
-            - If information is not in the context, state: "This information is not available in the provided context."
-
-            3. **FIGURE REFERENCE VALIDATION CHECKLIST:**
-            Before using ANY figure reference, verify ALL of these:
-            - [ ] Does `<!-- figure: pg_X_fig_Y -->` appear in the context?
-            - [ ] Have I read the text/description around this figure tag?
-            - [ ] Is this figure's content relevant to answering the user's query?
-            - [ ] Am I copying the pg_X_fig_Y part exactly as written?
-            - [ ] Am I using the correct output format `[Fig: pg_X_fig_Y]`?
-            
-            **If you cannot check ALL five boxes, DO NOT include the figure reference.**
-
-            4. **TABLE HANDLING:**
-            - If context contains tabular data, render it in proper Markdown table format
-            - Only include tables that are explicitly present in the context
-
-            **EXAMPLE OF CORRECT BEHAVIOR:**
-            - Context: "The network topology shows three layers. <!-- figure: pg_1_fig_1 --> This diagram illustrates the hierarchical structure."
-            - Query: "What does the network topology look like?"
-            - Correct Process: 1) Find tag → 2) Read description ("three layers", "hierarchical structure") → 3) Verify relevance (matches query) → 4) Reference
-            - Correct Answer: "The network topology shows three layers with a hierarchical structure [Fig: pg_1_fig_1]"
-            - WRONG: Referencing [Fig: pg_1_fig_1] for a query about "database performance" when the figure is about network topology
-
-            **REMEMBER:** Your accuracy depends on following these rules precisely. When in doubt, omit figure references rather than guess.
-
-            ---
-            **Context:**
-            {context}
-            ---
-            """
-
-            prompt = f"""
-            **User Query:**
-            {query}
-
-            **Instructions Reminder:**
-            - Answer based ONLY on the provided context above
-            - Use figure references ONLY if they exist as `<!-- figure: pg_X_fig_Y -->` in the context
-            - **CRITICAL:** Read and understand the figure's description/context before referencing it
-            - Only reference figures that are relevant to answering the user's specific query
-            - Transform figure references from `<!-- figure: pg_X_fig_Y -->` to `[Fig: pg_X_fig_Y]`
-            - Copy the pg_X_fig_Y part EXACTLY as it appears
-            - If uncertain about any information, state that it's not available in the context
-
-            **Answer:**
-            """
+            messages = self._build_messages(query, context)
 
             # 5. Send context and query to LLM
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": prompt}
-                ],
+            with RETRIEVAL_SECONDS.labels("llm", "single").time():
+                response = await self.openai_client.chat.completions.create(
+                    model=settings.LLM_MODEL,
+                    messages=messages,
+                    temperature=0.1,
+                )
+            answer = response.choices[0].message.content
+
+            if version is not None:
+                self.answer_cache.latency.record(time.perf_counter() - start)
+                self.answer_cache.set(scope.cache_key, version, query_embedding, {
+                    "response": answer,
+                    "sources": [source_from_hit(hit) for hit in search_results],
+                })
+
+            RETRIEVAL_SECONDS.labels("total", "single").observe(time.perf_counter() - start)
+            RETRIEVAL_REQUESTS.labels("single", "answered").inc()
+            return answer
+
+        except Exception as e:
+            logger.error(f"Error during retrieval from collection {collection_name}: {e}", exc_info=True)
+            RETRIEVAL_REQUESTS.labels("single", "error").inc()
+            return await self._error_message(collection_name)
+
+    async def retrieve_stream(self, query: str, collection_name: str,
+                              filters: Optional[Dict[str, str]] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of retrieve. Yields (event, data) pairs: one "sources" event with the
+        retrieved chunks, "delta" events with answer tokens as they are generated, and a final
+        "done" event with the full answer and the figure IDs it references.
+        Failures are reported as a single "error" event.
+        """
+        try:
+            start = time.perf_counter()
+            scope = answer_scope(collection_name, filters)
+            profile = await self._collection_profile(collection_name)
+            with RETRIEVAL_SECONDS.labels("embed", "stream").time():
+                query_embedding = await self._embed_query(query, profile.dimensions)
+
+            cached, version = await self._cached_answer(scope, query_embedding)
+            if cached is not None:
+                RETRIEVAL_REQUESTS.labels("stream", "cached").inc()
+                yield "sources", cached['sources']
+                yield "delta", cached['response']
+                yield "done", {"response": cached['response'], "figures": parse_figure_references(cached['response'])}
+                return
+
+            with RETRIEVAL_SECONDS.labels("search", "stream").time():
+                search_results = await self._search(query, query_embedding, collection_name, filters)
+            sources = [source_from_hit(hit) for hit in search_results]
+            yield "sources", sources
+
+            messages = self._build_messages(query, self._format_context(search_results))
+            llm_start = time.perf_counter()
+            stream = await self.openai_client.chat.completions.create(
+                model=settings.LLM_MODEL,
+                messages=messages,
                 temperature=0.1,
+                stream=True,
+                stream_options={"include_usage": True},
             )
 
-            return response.choices[0].message.content
+            answer = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    answer.append(delta)
+                    yield "delta", delta
+
+            response = "".join(answer)
+            # Includes the time the client took to read the tokens
+            RETRIEVAL_SECONDS.labels("llm", "stream").observe(time.perf_counter() - llm_start)
+            if version is not None:
+                self.answer_cache.latency.record(time.perf_counter() - start)
+                self.answer_cache.set(scope.cache_key, version, query_embedding, {
+                    "response": response,
+                    "sources": sources,
+                })
+            RETRIEVAL_SECONDS.labels("total", "stream").observe(time.perf_counter() - start)
+            RETRIEVAL_REQUESTS.labels("stream", "answered").inc()
+            yield "done", {"response": response, "figures": parse_figure_references(response)}
 
         except Exception as e:
-            logger.error(f"Error during retrieval from collection {collection_name}: {e}", exc_info=True)
+            logger.error(f"Error during streaming retrieval from collection {collection_name}: {e}", exc_info=True)
+            RETRIEVAL_REQUESTS.labels("stream", "error").inc()
+            yield "error", await self._error_message(collection_name)
+
+    async def _embed_queries(self, queries: List[str], dimensions: Optional[int] = None) -> List[List[float]]:
+        """Embeds many queries with as few API calls as possible, using the query embedding cache."""
+        cache_model = model_key(settings.EMBEDDING_MODEL, dimensions)
+        embeddings: List[Optional[List[float]]] = [None] * len(queries)
+        if self.embedding_cache is not None:
+            for i, query in enumerate(queries):
+                embeddings[i] = self.embedding_cache.get(cache_model, query)
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        batch_size = settings.EMBEDDING_BATCH_MAX_SIZE
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        responses = await asyncio.gather(*[
+            self.openai_client.embeddings.create(
+                input=[queries[i] for i in batch],
+                model=settings.EMBEDDING_MODEL,
+                **dimension_kwargs(settings.EMBEDDING_MODEL, dimensions)
+            )
+            for batch in batches
+        ])
+        for batch, response in zip(batches, responses):
+            for item in response.data:
+                i = batch[item.index]
+                embeddings[i] = item.embedding
+                if self.embedding_cache is not None:
+                    self.embedding_cache.set(cache_model, queries[i], item.embedding)
+        return embeddings
+
+    async def _search_collection_batch(self, collection_name: str, queries: List[str],
+                                       query_embeddings: List[List[float]],
+                                       filters: List[Optional[Dict[str, str]]]) -> list:
+        """Runs several searches against one collection in a single request."""
+        profile = await self._collection_profile(collection_name)
+        responses = await self.qdrant_client.query_batch_points(
+            collection_name=collection_name,
+            requests=[
+                self._query_request(query, embedding, profile, query_filters)
+                for query, embedding, query_filters in zip(queries, query_embeddings, filters)
+            ]
+        )
+        return [response.points for response in responses]
+
+    async def retrieve_batch(self, items: List[Tuple[str, str, Optional[Dict[str, str]]]],
+                             retrieval_only: bool = False) -> List[dict]:
+        """
+        Answers many (query, collection_name, filters) items. Queries are embedded in batched calls,
+        searched with one batch request per collection, and answered concurrently with at most
+        BATCH_RETRIEVE_LLM_CONCURRENCY completions in flight. Results keep the input order;
+        with retrieval_only the LLM step is skipped and only sources are returned.
+        """
+        results = [
+            {"query": query, "collection_name": collection_name, "response": None, "sources": [], "error": None}
+            for query, collection_name, _ in items
+        ]
+        if not items:
+            return results
+
+        start = time.perf_counter()
+        by_collection = defaultdict(list)
+        for i, (_, collection_name, _) in enumerate(items):
+            by_collection[collection_name].append(i)
+
+        # Collections may have been created with different vector sizes
+        profiles = {}
+
+        async def _profile(collection_name, indices):
+            try:
+                profiles[collection_name] = await self._collection_profile(collection_name)
+            except Exception as e:
+                logger.error(f"Error reading collection {collection_name}: {e}", exc_info=True)
+                error = await self._error_message(collection_name)
+                for i in indices:
+                    results[i]['error'] = error
+
+        await asyncio.gather(*[_profile(name, indices) for name, indices in by_collection.items()])
+
+        by_dimensions = defaultdict(list)
+        for collection_name, profile in profiles.items():
+            by_dimensions[profile.dimensions].extend(by_collection[collection_name])
+
+        query_embeddings: List[Optional[List[float]]] = [None] * len(items)
+        try:
+            with RETRIEVAL_SECONDS.labels("embed", "batch").time():
+                for dimensions, indices in by_dimensions.items():
+                    embeddings = await self._embed_queries([items[i][0] for i in indices], dimensions)
+                    for i, embedding in zip(indices, embeddings):
+                        query_embeddings[i] = embedding
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(items)} queries: {e}", exc_info=True)
+            for result in results:
+                result['error'] = result['error'] or "An error occurred during retrieval."
+            RETRIEVAL_REQUESTS.labels("batch", "error").inc(len(items))
+            return results
+
+        async def _search(collection_name, indices):
             try:
-                self.qdrant_client.get_collection(collection_name=collection_name)
-            except Exception:
-                return f"Error: Collection '{collection_name}' not found."
-            return "An error occurred during retrieval."
\ No newline at end of file
+                hits = await self._search_collection_batch(
+                    collection_name,
+                    [items[i][0] for i in indices],
+                    [query_embeddings[i] for i in indices],
+                    [items[i][2] for i in indices],
+                )
+            except Exception as e:
+                logger.error(f"Error during batch search in collection {collection_name}: {e}", exc_info=True)
+                error = await self._error_message(collection_name)
+                for i in indices:
+                    results[i]['error'] = error
+                return
+            for i, search_results in zip(indices, hits):
+                results[i]['search_results'] = search_results
+                results[i]['sources'] = [source_from_hit(hit) for hit in search_results]
+
+        with RETRIEVAL_SECONDS.labels("search", "batch").time():
+            await asyncio.gather(*[_search(name, by_collection[name]) for name in profiles])
+
+        if not retrieval_only:
+            semaphore = asyncio.Semaphore(settings.BATCH_RETRIEVE_LLM_CONCURRENCY)
+
+            async def _answer(i):
+                result = results[i]
+                scope = answer_scope(result['collection_name'], items[i][2])
+                async with semaphore:
+                    try:
+                        cached, version = await self._cached_answer(scope, query_embeddings[i])
+                        if cached is not None:
+                            result['response'] = cached['response']
+                            result['cached'] = True
+                            return
+                        llm_start = time.perf_counter()
+                        messages = self._build_messages(result['query'], self._format_context(result['search_results']))
+                        with RETRIEVAL_SECONDS.labels("llm", "batch").time():
+                            response = await self.openai_client.chat.completions.create(
+                                model=settings.LLM_MODEL,
+                                messages=messages,
+                                temperature=0.1,
+                            )
+                        result['response'] = response.choices[0].message.content
+                        if version is not None:
+                            self.answer_cache.latency.record(time.perf_counter() - llm_start)
+                            self.answer_cache.set(scope.cache_key, version, query_embeddings[i], {
+                                "response": result['response'],
+                                "sources": result['sources'],
+                            })
+                    except Exception as e:
+                        logger.error(f"Error answering batch query {i}: {e}", exc_info=True)
+                        result['error'] = "An error occurred during retrieval."
+
+            await asyncio.gather(*[_answer(i) for i, result in enumerate(results) if result['error'] is None])
+
+        RETRIEVAL_SECONDS.labels("total", "batch").observe(time.perf_counter() - start)
+        for result in results:
+            result.pop('search_results', None)
+            outcome = "error" if result['error'] else "cached" if result.pop('cached', False) else "answered"
+            RETRIEVAL_REQUESTS.labels("batch", outcome).inc()
+        return results
@@ -0,0 +1,37 @@
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+from qdrant_client import models
+from app.config import settings
+
+# Keeps identifiers such as part numbers and error codes (AB-1234, E.101, x_200) as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _term_index(term: str) -> int:
+    """Stable 32-bit index of a term, so no vocabulary has to be stored."""
+    return zlib.crc32(term.encode("utf-8"))
+
+def _sparse_vector(weights: Dict[int, float]) -> models.SparseVector:
+    indices = sorted(weights)
+    return models.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+def encode_document(text: str) -> models.SparseVector:
+    """
+    Encodes a chunk as BM25 term weights (saturated, length-normalized term frequency).
+    The IDF part is applied by Qdrant through the collection's IDF modifier.
+    """
+    terms = tokenize(text)
+    k1, b = settings.BM25_K1, settings.BM25_B
+    length_norm = 1 - b + b * len(terms) / settings.BM25_AVG_DOC_LENGTH
+    weights = {}
+    for term, tf in Counter(terms).items():
+        index = _term_index(term)
+        weights[index] = weights.get(index, 0.0) + tf * (k1 + 1) / (tf + k1 * length_norm)
+    return _sparse_vector(weights)
+
+def encode_query(text: str) -> models.SparseVector:
+    return _sparse_vector({_term_index(term): 1.0 for term in set(tokenize(text))})
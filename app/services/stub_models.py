@@ -0,0 +1,114 @@
+"""
+Deterministic stand-ins for the embedding and generation models, for tests and load benchmarks.
+They implement the OpenAI client methods the services call and return instantly, without
+network access. Embeddings hash the text's terms into a fixed-size vector, so texts that share
+terms are similar and retrieval still returns sensible chunks.
+"""
+import asyncio
+import hashlib
+import re
+import zlib
+from types import SimpleNamespace
+from typing import List, Optional, Union
+import numpy as np
+from app.config import settings
+from app.services.sparse_encoder import tokenize
+
+CONTEXT_FIGURE_PATTERN = re.compile(r"<!-- figure: (.*?) -->")
+
+def stub_embedding(text: str, dimensions: int) -> List[float]:
+    """Signed feature hashing of the text's terms, normalized to a unit vector."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for term in tokenize(text) or [text]:
+        index = zlib.crc32(term.encode("utf-8"))
+        vector[index % dimensions] += 1.0 if index & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0], norm = 1.0, 1.0
+    return (vector / norm).tolist()
+
+def _embeddings_response(input: Union[str, List[str]], model: str, dimensions: Optional[int]):
+    texts = [input] if isinstance(input, str) else list(input)
+    dimensions = dimensions or settings.STUB_EMBEDDING_DIMENSIONS
+    return SimpleNamespace(
+        data=[SimpleNamespace(index=i, embedding=stub_embedding(text, dimensions)) for i, text in enumerate(texts)],
+        model=model,
+        usage=SimpleNamespace(prompt_tokens=0, total_tokens=0),
+    )
+
+def stub_answer(messages: list) -> str:
+    """
+    Answers a chat request from its content alone: figure requests get a description keyed
+    by the image, retrieval prompts an answer citing the first figure in their context.
+    """
+    text = []
+    for message in messages:
+        content = message['content']
+        if isinstance(content, str):
+            text.append(content)
+            continue
+        for part in content:
+            if part.get('type') == "image_url":
+                digest = hashlib.sha256(part['image_url']['url'].encode("utf-8")).hexdigest()[:12]
+                return f"Stub description of figure {digest}."
+            text.append(part.get('text', ""))
+    prompt = "\n".join(text)
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    answer = f"Stub answer {digest} from {len(prompt)} characters of prompt."
+    # The retrieval prompt's instructions quote example figure tags ahead of the context
+    figures = CONTEXT_FIGURE_PATTERN.findall(prompt.rsplit("**Context:**", 1)[-1])
+    if figures:
+        answer += f" See [Fig: {figures[0]}]."
+    return answer
+
+def _completion(answer: str, model: str):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(index=0, finish_reason="stop", message=SimpleNamespace(role="assistant", content=answer))],
+        model=model,
+        usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0),
+    )
+
+def _chunks(answer: str) -> List[SimpleNamespace]:
+    return [
+        SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=token))])
+        for token in re.findall(r"\S+\s*", answer)
+    ]
+
+class StubModelClient:
+    """Synchronous stand-in for the OpenAI client: embeddings and chat completions."""
+
+    def __init__(self):
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    def _embed(self, input: Union[str, List[str]], model: str, dimensions: Optional[int] = None, **kwargs):
+        return _embeddings_response(input, model, dimensions)
+
+    def _chat(self, model: str, messages: list, stream: bool = False, **kwargs):
+        answer = stub_answer(messages)
+        return iter(_chunks(answer)) if stream else _completion(answer, model)
+
+    def close(self):
+        pass
+
+class AsyncStubModelClient:
+    """Asynchronous stand-in for the OpenAI client, for the retrieval service."""
+
+    def __init__(self):
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    async def _embed(self, input: Union[str, List[str]], model: str, dimensions: Optional[int] = None, **kwargs):
+        return _embeddings_response(input, model, dimensions)
+
+    async def _chat(self, model: str, messages: list, stream: bool = False, **kwargs):
+        answer = stub_answer(messages)
+        return self._stream(answer) if stream else _completion(answer, model)
+
+    async def _stream(self, answer: str):
+        for chunk in _chunks(answer):
+            await asyncio.sleep(0)
+            yield chunk
+
+    async def close(self):
+        pass
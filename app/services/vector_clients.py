@@ -0,0 +1,27 @@
+"""
+Creates the vector store client for the configured VECTOR_STORE_BACKEND.
+
+Services talk to the store through the Qdrant client API, so a backend is any object with
+the methods they call: get_collection, create_collection, create_payload_index, upsert,
+delete, scroll, count, delete_collection and query_batch_points (async on the retrieval side:
+get_collection, query_batch_points and close). The embedded store implements that subset.
+"""
+from typing import Optional
+import httpx
+from app.config import settings
+
+def create_vector_client():
+    """Synchronous client, for ingestion and maintenance tools."""
+    if settings.VECTOR_STORE_BACKEND == "embedded":
+        from app.services.embedded_vector_store import get_embedded_store
+        return get_embedded_store()
+    from qdrant_client import QdrantClient
+    return QdrantClient(url=settings.QDRANT_URL, timeout=60.0)
+
+def create_async_vector_client(limits: Optional[httpx.Limits] = None):
+    """Asynchronous client for the retrieval service, sharing its connection limits."""
+    if settings.VECTOR_STORE_BACKEND == "embedded":
+        from app.services.embedded_vector_store import AsyncEmbeddedVectorStore, get_embedded_store
+        return AsyncEmbeddedVectorStore(get_embedded_store())
+    from qdrant_client import AsyncQdrantClient
+    return AsyncQdrantClient(url=settings.QDRANT_URL, limits=limits)
@@ -1,89 +1,322 @@
 import logging
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from openai import OpenAI
-from qdrant_client import QdrantClient, models
+from qdrant_client import models
 from app.config import settings
+from app.services.embedding_service import EmbeddingService, embedding_dimensions
+from app.services.sparse_encoder import encode_document
+from app.services.vector_clients import create_vector_client
+from app.utils.chunk_utils import StreamingChunker, TextChunk, page_span
+from app.utils.pipeline_utils import prefetch, ordered_map
+from app.utils.progress import JobProgress
+from typing import Iterable, Iterator, List, Optional
+import time
 import uuid
 import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# Payload fields indexed in shared collections, so filtered searches and deletes stay fast
+TENANT_FIELDS = ("kb_name", "job_id", "document")
+
+def quantization_config() -> Optional[models.QuantizationConfig]:
+    """Quantization for new collections, per VECTOR_QUANTIZATION. Codes are always kept in RAM."""
+    if settings.VECTOR_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+        ))
+    if settings.VECTOR_QUANTIZATION == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
 class VectorStoreService:
-    def __init__(self, collection_name: str):
+    """
+    Writes chunks of one collection. A multi-tenant collection holds many knowledge bases,
+    told apart by the indexed kb_name, job_id and document payload fields.
+    """
+
+    def __init__(self, collection_name: str, multi_tenant: bool = False):
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=settings.CHUNK_SIZE,
             chunk_overlap=settings.CHUNK_OVERLAP,
             length_function=len,
         )
-        self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.qdrant_client = QdrantClient(url=settings.QDRANT_URL, timeout=60.0)
+        self.qdrant_client = create_vector_client()
         self.collection_name = collection_name
+        self.multi_tenant = multi_tenant
         self._ensure_collection_exists()
+        if multi_tenant:
+            self._ensure_payload_indexes()
+        # Embed at the collection's own size, which may predate the current EMBEDDING_DIMENSIONS
+        self.embedding_service = EmbeddingService(dimensions=self.dimensions)
 
-    def _ensure_collection_exists(self):
+    def _use_collection(self, collection):
+        params = collection.config.params
+        self.dimensions = params.vectors.size
+        # Collections created before hybrid search only hold dense vectors
+        self.sparse_enabled = settings.SPARSE_VECTOR_NAME in (params.sparse_vectors or {})
+
+    def _get_collection(self):
         try:
-            self.qdrant_client.get_collection(collection_name=self.collection_name)
-            logger.info(f"Collection '{self.collection_name}' already exists.")
+            return self.qdrant_client.get_collection(collection_name=self.collection_name)
         except Exception:
-            self.qdrant_client.recreate_collection(
+            return None
+
+    def _ensure_collection_exists(self):
+        collection = self._get_collection()
+        if collection is not None:
+            logger.info(f"Collection '{self.collection_name}' already exists.")
+            self._use_collection(collection)
+            return
+
+        self.dimensions = embedding_dimensions()
+        sparse_vectors_config = None
+        if settings.HYBRID_SEARCH_ENABLED:
+            sparse_vectors_config = {
+                settings.SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)
+            }
+        try:
+            self.qdrant_client.create_collection(
                 collection_name=self.collection_name,
-                vectors_config=models.VectorParams(size=3072, distance=models.Distance.COSINE), # text-embedding-3-large has 3072 dimensions
+                vectors_config=models.VectorParams(
+                    size=self.dimensions,
+                    distance=models.Distance.COSINE,
+                    on_disk=settings.VECTORS_ON_DISK,
+                ),
+                sparse_vectors_config=sparse_vectors_config,
+                quantization_config=quantization_config(),
             )
-            logger.info(f"Collection '{self.collection_name}' created.")
+        except Exception:
+            # Another job or worker may have created it since the check (409 from Qdrant,
+            # ValueError from the embedded store); anything else leaves it missing
+            collection = self._get_collection()
+            if collection is None:
+                raise
+            logger.info(f"Collection '{self.collection_name}' was created concurrently.")
+            self._use_collection(collection)
+            return
+        self.sparse_enabled = sparse_vectors_config is not None
+        logger.info(f"Collection '{self.collection_name}' created ({self.dimensions} dimensions, "
+                    f"quantization {settings.VECTOR_QUANTIZATION}, vectors on disk {settings.VECTORS_ON_DISK}).")
+
+    def _ensure_payload_indexes(self):
+        indexed = self.qdrant_client.get_collection(collection_name=self.collection_name).payload_schema or {}
+        for field in TENANT_FIELDS:
+            if field in indexed:
+                continue
+            try:
+                self.qdrant_client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    # Qdrant co-locates each tenant's points when the field is marked as the tenant key
+                    field_schema=models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=field == "kb_name"),
+                    wait=True,
+                )
+            except Exception:
+                # Tolerated if a concurrent job created the index in the meantime
+                indexed = self.qdrant_client.get_collection(collection_name=self.collection_name).payload_schema or {}
+                if field not in indexed:
+                    raise
+                continue
+            logger.info(f"Created payload index on '{field}' in collection '{self.collection_name}'.")
 
     def embed_and_store(self, df: pd.DataFrame):
-        full_text = ""
-        page_offsets = []
+        self.store_pages(df.to_dict("records"))
+
+    def _chunk_payload(self, chunk: TextChunk, page_offsets: List[int], page_metadata: List[dict]) -> dict:
+        # Map the chunk's offsets to the pages it covers
+        first_page, last_page = page_span(page_offsets, chunk.start, chunk.end)
+        covered = page_metadata[first_page:last_page + 1]
+        metadata = page_metadata[first_page].copy()
+        metadata['page_start'] = page_metadata[first_page]['page_num']
+        metadata['page_end'] = page_metadata[last_page]['page_num']
+        metadata['page_hashes'] = [page['page_hash'] for page in covered]
+        metadata['page_nums'] = [page['page_num'] for page in covered]
+        metadata['start_offset'] = chunk.start
+        metadata['end_offset'] = chunk.end
+        metadata['content'] = chunk.text
+        return metadata
+
+    def _iter_chunk_groups(self, rows: Iterable[dict], base_payload: Optional[dict] = None,
+                           only_pages: Optional[set] = None) -> Iterator[List[dict]]:
+        """
+        Chunks pages as they arrive and yields chunk payloads in groups of upsert size.
+        Runs of consecutive pages are chunked together; a gap in page numbers starts a new run.
+        A run's offsets start at its first page's document_offset if rows carry one, otherwise
+        where the previous run ended, so offsets never repeat within a document.
+        If only_pages is given, chunks that do not touch any of those pages are dropped.
+        """
+        group = []
+        chunker = None
         page_metadata = []
+        last_page_num = None
+
+        def _collect(chunks):
+            for chunk in chunks:
+                payload = self._chunk_payload(chunk, chunker.page_offsets, page_metadata)
+                if only_pages is not None and only_pages.isdisjoint(payload['page_nums']):
+                    continue
+                if base_payload:
+                    payload.update(base_payload)
+                group.append(payload)
+
+        for row in rows:
+            page_num = row['extra.page_num']
+            if chunker is None or page_num != last_page_num + 1:
+                start_offset = 0
+                if chunker is not None:
+                    _collect(chunker.finish())
+                    start_offset = chunker.length
+                start_offset = row.get('document_offset', start_offset)
+                chunker = StreamingChunker(self.text_splitter, settings.CHUNK_SIZE, start_offset=start_offset)
+                page_metadata = []
+            last_page_num = page_num
 
-        for _, row in df.iterrows():
-            page_offsets.append(len(full_text))
-            full_text += row['contents_md'] + "\n\n" # Add page separator
             page_metadata.append({
                 "document": row['document'],
                 "page_hash": row['page_hash'],
-                "page_num": row['extra.page_num'],
+                "page_num": page_num,
             })
+            _collect(chunker.add_page(row['contents_md']))
+            while len(group) >= settings.INGESTION_UPSERT_BATCH_SIZE:
+                yield group[:settings.INGESTION_UPSERT_BATCH_SIZE]
+                del group[:settings.INGESTION_UPSERT_BATCH_SIZE]
 
-        chunks = self.text_splitter.split_text(full_text)
-        
-        chunk_points = []
-        for chunk in chunks:
-            # Find the page number for the chunk
-            chunk_start_offset = full_text.find(chunk)
-            page_index = -1
-            for i, offset in enumerate(page_offsets):
-                if chunk_start_offset >= offset:
-                    page_index = i
-                else:
-                    break
-            
-            if page_index != -1:
-                metadata = page_metadata[page_index].copy()
-                metadata['content'] = chunk
-
-                embedding = self.openai_client.embeddings.create(
-                    input=chunk,
-                    model="text-embedding-3-large"
-                ).data[0].embedding
-
-                chunk_points.append(
-                    models.PointStruct(
-                        id=str(uuid.uuid4()),
-                        vector=embedding,
-                        payload=metadata
-                    )
-                )
-        
-        if chunk_points:
-            batch_size = 100  # Adjust batch size as needed
-            for i in range(0, len(chunk_points), batch_size):
-                batch = chunk_points[i:i + batch_size]
-                self.qdrant_client.upsert(
-                    collection_name=self.collection_name,
-                    points=batch,
-                    wait=True # Wait for the upsert to complete
-                )
-                logger.info(f"Upserted batch {i//batch_size + 1}/{(len(chunk_points) - 1)//batch_size + 1}")
-            
-        logger.info(f"Successfully embedded and stored {len(chunk_points)} chunks in Qdrant.")
\ No newline at end of file
+        if chunker is not None:
+            _collect(chunker.finish())
+        for i in range(0, len(group), settings.INGESTION_UPSERT_BATCH_SIZE):
+            yield group[i:i + settings.INGESTION_UPSERT_BATCH_SIZE]
+
+    def _point_vector(self, embedding: List[float], content: str):
+        if not self.sparse_enabled:
+            return embedding
+        # "" is the collection's unnamed dense vector
+        return {"": embedding, settings.SPARSE_VECTOR_NAME: encode_document(content)}
+
+    def _embed_group(self, payloads: List[dict]) -> List[models.PointStruct]:
+        embeddings = self.embedding_service.embed([payload['content'] for payload in payloads])
+        return [
+            models.PointStruct(
+                id=str(uuid.uuid4()),
+                vector=self._point_vector(embedding, payload['content']),
+                payload=payload
+            )
+            for embedding, payload in zip(embeddings, payloads)
+        ]
+
+    def store_pages(self, rows: Iterable[dict], base_payload: Optional[dict] = None,
+                    only_pages: Optional[set] = None, progress: Optional[JobProgress] = None) -> int:
+        """
+        Chunks, embeds and upserts pages as a stream. Chunking runs ahead in its own thread,
+        several chunk groups are embedded concurrently, and each group is upserted as soon
+        as its embeddings arrive, so memory is bounded by a few groups rather than the document.
+        base_payload is merged into every point's payload. Embedded chunks and upserted
+        points are counted in progress, if given.
+        """
+        embed_group = self._embed_group
+        if progress is not None:
+            def embed_group(payloads: List[dict]) -> List[models.PointStruct]:
+                with progress.timed("embed"):
+                    points = self._embed_group(payloads)
+                progress.add("chunks_embedded", len(points))
+                return points
+
+        chunk_groups = prefetch(self._iter_chunk_groups(rows, base_payload, only_pages), maxsize=settings.EMBEDDING_MAX_CONCURRENCY, name="chunker")
+        stored = 0
+        for batch_num, points in enumerate(ordered_map(embed_group, chunk_groups, settings.EMBEDDING_MAX_CONCURRENCY), start=1):
+            upsert_start = time.perf_counter()
+            self.qdrant_client.upsert(
+                collection_name=self.collection_name,
+                points=points,
+                wait=True # Wait for the upsert to complete
+            )
+            stored += len(points)
+            if progress is not None:
+                progress.add_time("upsert", time.perf_counter() - upsert_start)
+                progress.add("points_upserted", len(points))
+            logger.info(f"Upserted batch {batch_num} ({stored} chunks so far)")
+
+        logger.info(f"Successfully embedded and stored {stored} chunks in collection '{self.collection_name}'.")
+        return stored
+
+    def import_points(self, records: List[models.Record], payload_defaults: dict) -> int:
+        """
+        Upserts points read from another collection, keeping their IDs and dense vectors.
+        payload_defaults fills payload fields the points lack; sparse vectors are re-encoded
+        from the content so they match this collection's configuration.
+        """
+        points = []
+        for record in records:
+            payload = {**payload_defaults, **(record.payload or {})}
+            embedding = record.vector.get("") if isinstance(record.vector, dict) else record.vector
+            points.append(models.PointStruct(
+                id=record.id,
+                vector=self._point_vector(embedding, payload.get('content', "")),
+                payload=payload,
+            ))
+        if points:
+            self.qdrant_client.upsert(collection_name=self.collection_name, points=points, wait=True)
+        return len(points)
+
+    def _document_conditions(self, document: str, kb_name: Optional[str] = None) -> List[models.FieldCondition]:
+        must = [models.FieldCondition(key="document", match=models.MatchValue(value=document))]
+        # Per-job collections hold a single knowledge base, and their older points have no kb_name
+        if self.multi_tenant and kb_name is not None:
+            must.append(models.FieldCondition(key="kb_name", match=models.MatchValue(value=kb_name)))
+        return must
+
+    def document_page_spans(self, document: str, kb_name: Optional[str] = None, batch_size: int = 1000) -> List[tuple]:
+        """Returns the first and last page of every stored chunk of a document, one pair per point."""
+        spans = []
+        offset = None
+        while True:
+            records, offset = self.qdrant_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=models.Filter(must=self._document_conditions(document, kb_name)),
+                limit=batch_size,
+                offset=offset,
+                with_payload=["page_nums", "page_num"],
+                with_vectors=False,
+            )
+            for record in records:
+                payload = record.payload or {}
+                # Points from before page_nums was stored only name their first page
+                page_nums = payload.get('page_nums') or [payload[key] for key in ('page_num',) if key in payload]
+                if page_nums:
+                    spans.append((min(page_nums), max(page_nums)))
+            if offset is None:
+                return spans
+
+    def delete_document_points(self, document: str, page_nums: Optional[Iterable[int]] = None,
+                               keep_job_id: Optional[str] = None, kb_name: Optional[str] = None):
+        """
+        Deletes a document's points, optionally only those covering the given pages,
+        and keeping points written by keep_job_id. In a multi-tenant collection only the
+        points of kb_name are affected.
+        """
+        must = self._document_conditions(document, kb_name)
+        if page_nums is not None:
+            page_nums = list(page_nums)
+            if not page_nums:
+                return
+            must.append(models.FieldCondition(key="page_nums", match=models.MatchAny(any=page_nums)))
+        must_not = []
+        if keep_job_id is not None:
+            must_not.append(models.FieldCondition(key="job_id", match=models.MatchValue(value=keep_job_id)))
+
+        self.qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(filter=models.Filter(must=must, must_not=must_not)),
+            wait=True
+        )
+        logger.info(f"Deleted stale points of '{document}' from collection '{self.collection_name}'.")
+
+    def delete_job_points(self, job_id: str):
+        """Deletes every point written by a job, e.g. after it failed part-way."""
+        self.qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(filter=models.Filter(must=[
+                models.FieldCondition(key="job_id", match=models.MatchValue(value=job_id))
+            ])),
+            wait=True
+        )
+        logger.info(f"Deleted points of job {job_id} from collection '{self.collection_name}'.")
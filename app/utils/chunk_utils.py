@@ -0,0 +1,103 @@
+from bisect import bisect_right
+from typing import List, NamedTuple, Tuple
+
+PAGE_SEPARATOR = "\n\n"
+
+class TextChunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+
+def join_pages(pages: List[str], separator: str = PAGE_SEPARATOR) -> Tuple[str, List[int]]:
+    """
+    Joins page texts into one document in a single pass.
+    Returns the full text and the start offset of every page.
+    """
+    page_offsets = []
+    offset = 0
+    for page in pages:
+        page_offsets.append(offset)
+        offset += len(page) + len(separator)
+    full_text = "".join(page + separator for page in pages)
+    return full_text, page_offsets
+
+def split_text_with_offsets(text_splitter, text: str) -> List[TextChunk]:
+    """
+    Splits text with the given splitter and locates every chunk in the source text.
+    Chunks are emitted in document order, so each search starts just after the previous
+    chunk's start and only scans about one chunk of text, and repeated text (headers,
+    boilerplate) resolves to the occurrence that was actually split.
+    """
+    chunks = []
+    search_from = 0
+    for chunk in text_splitter.split_text(text):
+        start = text.find(chunk, search_from)
+        if start == -1:
+            # Splitter normalized the chunk in a way that is not a verbatim substring
+            start = text.find(chunk)
+            if start == -1:
+                continue
+        end = start + len(chunk)
+        chunks.append(TextChunk(chunk, start, end))
+        search_from = start + 1
+    return chunks
+
+def page_span(page_offsets: List[int], start: int, end: int) -> Tuple[int, int]:
+    """Returns the indices of the first and last page covered by the [start, end) range."""
+    first = bisect_right(page_offsets, start) - 1
+    last = bisect_right(page_offsets, max(start, end - 1)) - 1
+    return first, last
+
+class StreamingChunker:
+    """
+    Splits a document page by page without holding its full text.
+    Text is buffered until it is several chunks long, then split; every chunk except the
+    last is emitted and the buffer restarts at the last chunk, so chunk boundaries and
+    overlaps match splitting the whole document closely. Emitted chunks carry offsets
+    into the full (virtual) document, and page_offsets covers every page added so far.
+    start_offset is the document offset of the first page, for a run starting mid-document.
+    """
+
+    def __init__(self, text_splitter, chunk_size: int, separator: str = PAGE_SEPARATOR, flush_chunks: int = 4,
+                 start_offset: int = 0):
+        self.text_splitter = text_splitter
+        self.separator = separator
+        self.flush_threshold = chunk_size * flush_chunks
+        self.page_offsets: List[int] = []
+        self._buffer = ""
+        self._buffer_start = start_offset
+        self._length = start_offset
+
+    @property
+    def length(self) -> int:
+        """Document offset just past the last page added."""
+        return self._length
+
+    def add_page(self, text: str) -> List[TextChunk]:
+        self.page_offsets.append(self._length)
+        self._buffer += text + self.separator
+        self._length += len(text) + len(self.separator)
+        if len(self._buffer) < self.flush_threshold:
+            return []
+        return self._flush(final=False)
+
+    def finish(self) -> List[TextChunk]:
+        return self._flush(final=True)
+
+    def _flush(self, final: bool) -> List[TextChunk]:
+        chunks = split_text_with_offsets(self.text_splitter, self._buffer)
+        if final:
+            keep_from = len(self._buffer)
+        else:
+            if len(chunks) < 2:
+                return []
+            keep_from = chunks[-1].start
+            chunks = chunks[:-1]
+
+        emitted = [
+            TextChunk(chunk.text, chunk.start + self._buffer_start, chunk.end + self._buffer_start)
+            for chunk in chunks
+        ]
+        self._buffer = self._buffer[keep_from:]
+        self._buffer_start += keep_from
+        return emitted
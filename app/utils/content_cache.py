@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+FIGURE_DESCRIPTIONS = "figure_description"
+EMBEDDINGS = "embedding"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def content_key(model: str, content: bytes) -> str:
+    """Content-addressed key: hash of the model name and the raw content."""
+    return hashlib.sha256(model.encode("utf-8") + b"\0" + content).hexdigest()
+
+class ContentCache:
+    """
+    Persistent SQLite cache of expensive API results (figure descriptions, embeddings),
+    keyed by content hash plus model name. Entries are evicted least-recently-used
+    once the total stored size exceeds max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache
+            (key TEXT PRIMARY KEY,
+             namespace TEXT,
+             value BLOB,
+             size INTEGER,
+             last_access REAL)
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def get_many(self, namespace: str, keys: List[str]) -> Dict[str, bytes]:
+        """Returns the cached values found for the given keys and refreshes their recency."""
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE namespace = ? AND key IN ({placeholders})",
+                    (namespace, *batch),
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE cache SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        self.hits[namespace] += sum(1 for key in keys if key in found)
+        self.misses[namespace] += sum(1 for key in keys if key not in found)
+        return found
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        return self.get_many(namespace, [key]).get(key)
+
+    def set_many(self, namespace: str, items: Dict[str, bytes]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            for key, value in items.items():
+                previous = self._conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, namespace, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, namespace, value, len(value), now),
+                )
+                self._total_bytes += len(value) - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    def set(self, namespace: str, key: str, value: bytes):
+        self.set_many(namespace, {key: value})
+
+    def _evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM cache ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        namespaces = set(self.hits) | set(self.misses)
+        return {
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "namespaces": {
+                namespace: {"hits": self.hits[namespace], "misses": self.misses[namespace]}
+                for namespace in sorted(namespaces)
+            },
+        }
+
+def get_content_cache() -> Optional[ContentCache]:
+    """Returns the shared content cache, or None if caching is disabled."""
+    global _cache
+    if not settings.CONTENT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ContentCache(settings.CONTENT_CACHE_PATH, settings.CONTENT_CACHE_MAX_BYTES)
+    return _cache
@@ -1,53 +1,195 @@
 import sqlite3
 import os
+import json
+import base64
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 DB_FILE = "jobs.db"
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", DB_FILE)
 
+# Columns added to the jobs table after its initial schema
+JOB_QUEUE_COLUMNS = {
+    "collection_name": "TEXT",
+    "file_path": "TEXT",
+    "priority": "INTEGER DEFAULT 0",
+    "attempts": "INTEGER DEFAULT 0",
+    "worker_id": "TEXT",
+    "heartbeat": "DATETIME",
+    "document": "TEXT",
+    # JSON counters and stage timings written by the worker while the job runs
+    "progress": "TEXT",
+}
+
+JOB_COLUMNS = "job_id, status, kb_name, timestamp, collection_name, document, progress"
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections shared by the threads of a process. The database runs in
+    WAL mode, so readers are not blocked by a writer, and connections wait up to busy_timeout
+    seconds for the write lock instead of failing with 'database is locked'. Connections are
+    in autocommit mode; statements that must apply together run in _transaction().
+    """
+
+    def __init__(self, path: str, size: int, busy_timeout: float):
+        self.path = path
+        self.size = max(1, size)
+        self.busy_timeout = busy_timeout
+        self.pid = os.getpid()
+        self._idle = []
+        self._created = 0
+        self._available = threading.Condition()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Durable across application crashes; only a power loss can drop the last commits
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                self._available.wait()
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._created += 1
+        try:
+            if conn is None:
+                conn = self._connect()
+            yield conn
+        except BaseException:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            with self._available:
+                if conn is not None:
+                    self._idle.append(conn)
+                else:
+                    self._created -= 1
+                self._available.notify()
+
+    def close(self):
+        """Closes the idle connections; connections in use are closed when released."""
+        with self._available:
+            for conn in self._idle:
+                conn.close()
+            self._idle = []
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ConnectionPool:
+    """The process's connection pool, recreated when DB_PATH changes or after a fork."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB_PATH or _pool.pid != os.getpid():
+            if _pool is not None and _pool.pid == os.getpid():
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH, settings.JOB_DB_POOL_SIZE, settings.JOB_DB_BUSY_TIMEOUT)
+        return _pool
+
+def _connection():
+    return _get_pool().connection()
+
+@contextmanager
+def _transaction():
+    """A connection with a write transaction, committed when the block succeeds."""
+    with _connection() as conn:
+        # IMMEDIATE takes the write lock up front, so the transaction never fails to upgrade later
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.execute("COMMIT")
+
 def init_db():
     """Initializes the database and creates the jobs table if it doesn't exist."""
     try:
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS jobs
-            (job_id TEXT PRIMARY KEY, 
-             status TEXT, 
-             kb_name TEXT, 
-             timestamp DATETIME)
-        ''')
-        conn.commit()
-        conn.close()
+        with _transaction() as conn:
+            c = conn.cursor()
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS jobs
+                (job_id TEXT PRIMARY KEY, 
+                 status TEXT, 
+                 kb_name TEXT, 
+                 timestamp DATETIME)
+            ''')
+            # Jobs that reuse an earlier document's collection record where their points live
+            columns = [row[1] for row in c.execute("PRAGMA table_info(jobs)")]
+            for column, column_type in JOB_QUEUE_COLUMNS.items():
+                if column not in columns:
+                    c.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, timestamp)")
+            # Job listings are ordered by (timestamp, job_id), optionally within a kb or status
+            c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_timestamp ON jobs (timestamp, job_id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_kb_timestamp ON jobs (kb_name, timestamp, job_id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_timestamp ON jobs (status, timestamp, job_id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_collection ON jobs (collection_name)")
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS documents
+                (kb_name TEXT,
+                 document TEXT,
+                 hash TEXT,
+                 collection_name TEXT,
+                 job_id TEXT,
+                 page_hashes TEXT,
+                 timestamp DATETIME,
+                 PRIMARY KEY (kb_name, document))
+            ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS collection_versions
+                (collection_name TEXT PRIMARY KEY,
+                 version INTEGER)
+            ''')
         logger.info("Database initialized successfully.")
     except Exception as e:
         logger.error("Error initializing database.", exc_info=True)
 
-def add_job(job_id, status, kb_name, timestamp):
-    """Adds a new job to the database."""
+def add_job(job_id, status, kb_name, timestamp, file_path=None, priority=0):
+    """Adds a new job to the database. Returns True if the job was stored."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("INSERT INTO jobs (job_id, status, kb_name, timestamp) VALUES (?, ?, ?, ?)", 
-                    (job_id, status, kb_name, timestamp))
-        conn.commit()
-        conn.close()
+        with _connection() as conn:
+            conn.execute("INSERT INTO jobs (job_id, status, kb_name, timestamp, file_path, priority) VALUES (?, ?, ?, ?, ?, ?)", 
+                         (job_id, status, kb_name, timestamp, file_path, priority))
         logger.info(f"Added job {job_id} with status '{status}' to the database.")
+        return True
+    except Exception as e:
+        logger.error(f"Error adding job {job_id} to the database.", exc_info=True)
+        return False
+
+def add_job_if_queue_below(job_id, kb_name, timestamp, max_queued, file_path=None, priority=0):
+    """
+    Queues a new job unless max_queued jobs are already waiting, counting and inserting in one
+    write transaction so concurrent requests cannot overfill the queue.
+    Returns (added, jobs queued before this one), or None on error.
+    """
+    try:
+        with _transaction() as conn:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'in_queue'").fetchone()[0]
+            if queued < max_queued:
+                conn.execute("INSERT INTO jobs (job_id, status, kb_name, timestamp, file_path, priority) "
+                             "VALUES (?, 'in_queue', ?, ?, ?, ?)", (job_id, kb_name, timestamp, file_path, priority))
+        if queued >= max_queued:
+            return False, queued
+        logger.info(f"Added job {job_id} with status 'in_queue' to the database.")
+        return True, queued
     except Exception as e:
         logger.error(f"Error adding job {job_id} to the database.", exc_info=True)
+        return None
 
 def update_job_status(job_id, status):
     """Updates the status of a job."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE jobs SET status = ? WHERE job_id = ?", (status, job_id))
-        conn.commit()
-        conn.close()
+        with _connection() as conn:
+            conn.execute("UPDATE jobs SET status = ? WHERE job_id = ?", (status, job_id))
         logger.info(f"Updated job {job_id} status to '{status}'.")
     except Exception as e:
         logger.error(f"Error updating job {job_id} status.", exc_info=True)
@@ -55,11 +197,8 @@ def update_job_status(job_id, status):
 def get_job_status(job_id):
     """Gets the status of a job."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,))
-        result = c.fetchone()
-        conn.close()
+        with _connection() as conn:
+            result = conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
         if result:
             logger.info(f"Retrieved status for job {job_id}: '{result[0]}'")
             return result[0]
@@ -70,36 +209,300 @@ def get_job_status(job_id):
         logger.error(f"Error getting status for job {job_id}.", exc_info=True)
         return None
 
+def _job_from_row(row):
+    job = dict(row)
+    if 'progress' in job:
+        job['progress'] = json.loads(job['progress']) if job['progress'] else None
+    return job
+
 def get_all_jobs():
     """Gets all jobs from the database."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT job_id, status, kb_name, timestamp FROM jobs ORDER BY timestamp DESC")
-        results = c.fetchall()
-        conn.close()
+        with _connection() as conn:
+            results = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY timestamp DESC").fetchall()
         logger.info(f"Retrieved {len(results)} jobs from the database.")
-        return [dict(row) for row in results]
+        return [_job_from_row(row) for row in results]
     except Exception as e:
         logger.error("Error getting all jobs.", exc_info=True)
         return []
 
+def encode_job_cursor(job):
+    """Opaque cursor pointing just past a job in the listing order."""
+    position = json.dumps([job['timestamp'], job['job_id']])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+def decode_job_cursor(cursor):
+    """Returns the (timestamp, job_id) a cursor points past; raises ValueError if it is malformed."""
+    try:
+        timestamp, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor '{cursor}'.") from e
+    return timestamp, job_id
+
+def get_jobs_page(limit, cursor=None, kb_name=None, status=None):
+    """
+    Gets up to limit jobs, newest first, optionally of one knowledge base and/or status.
+    Returns (jobs, next_cursor), with next_cursor None on the last page, or None on error.
+    Pages are keyed on (timestamp, job_id), so they stay consistent while jobs are added
+    and cost the same however deep the listing goes.
+    """
+    conditions, params = [], []
+    if kb_name is not None:
+        conditions.append("kb_name = ?")
+        params.append(kb_name)
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    if cursor is not None:
+        conditions.append("(timestamp, job_id) < (?, ?)")
+        params.extend(decode_job_cursor(cursor))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    try:
+        with _connection() as conn:
+            rows = conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs {where} ORDER BY timestamp DESC, job_id DESC LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+        jobs = [_job_from_row(row) for row in rows[:limit]]
+        next_cursor = encode_job_cursor(jobs[-1]) if len(rows) > limit else None
+        return jobs, next_cursor
+    except Exception as e:
+        logger.error("Error listing jobs.", exc_info=True)
+        return None
+
 def get_job(job_id):
     """Gets a job by its ID."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT job_id, status, kb_name, timestamp FROM jobs WHERE job_id = ?", (job_id,))
-        result = c.fetchone()
-        conn.close()
+        with _connection() as conn:
+            result = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
         if result:
             logger.info(f"Retrieved job {job_id}.")
-            return dict(result)
+            return _job_from_row(result)
         else:
             logger.warning(f"Job {job_id} not found in the database.")
             return None
     except Exception as e:
         logger.error(f"Error getting job {job_id}.", exc_info=True)
-        return None
\ No newline at end of file
+        return None
+
+def set_job_collection(job_id, collection_name, document=None):
+    """Records the collection a job's points were written to, and the document it ingested."""
+    try:
+        with _connection() as conn:
+            conn.execute("UPDATE jobs SET collection_name = ?, document = COALESCE(?, document) WHERE job_id = ?",
+                         (collection_name, document, job_id))
+        logger.info(f"Set job {job_id} collection to '{collection_name}'.")
+    except Exception as e:
+        logger.error(f"Error setting collection for job {job_id}.", exc_info=True)
+
+def set_job_progress(job_id, progress):
+    """Stores a running job's progress counters and stage timings."""
+    try:
+        with _connection() as conn:
+            conn.execute("UPDATE jobs SET progress = ? WHERE job_id = ?", (json.dumps(progress), job_id))
+    except Exception as e:
+        logger.error(f"Error updating progress of job {job_id}.", exc_info=True)
+
+def get_jobs_progress(job_ids):
+    """Gets {job_id: (status, progress)} for the given jobs; None on error."""
+    try:
+        job_ids = list(job_ids)
+        placeholders = ", ".join("?" * len(job_ids))
+        with _connection() as conn:
+            rows = conn.execute(f"SELECT job_id, status, progress FROM jobs WHERE job_id IN ({placeholders})", job_ids).fetchall()
+        return {
+            job_id: (status, json.loads(progress) if progress else None)
+            for job_id, status, progress in rows
+        }
+    except Exception as e:
+        logger.error("Error getting progress of jobs.", exc_info=True)
+        return None
+
+def get_kb_summaries(kb_name=None):
+    """
+    Summarizes knowledge bases from their jobs and documents: job counts per status, number
+    of documents, and the latest job. Covers one knowledge base if kb_name is given.
+    Returns a list ordered by the latest job, newest first, or None on error.
+    """
+    kb_filter = "WHERE kb_name = ?" if kb_name is not None else ""
+    params = (kb_name,) if kb_name is not None else ()
+    try:
+        with _connection() as conn:
+            status_rows = conn.execute(
+                f"SELECT kb_name, status, COUNT(*), MAX(timestamp) FROM jobs {kb_filter} GROUP BY kb_name, status",
+                params,
+            ).fetchall()
+            document_counts = dict(conn.execute(
+                f"SELECT kb_name, COUNT(*) FROM documents {kb_filter} GROUP BY kb_name", params,
+            ).fetchall())
+            summaries = {}
+            for name, status, count, last_job_at in status_rows:
+                summary = summaries.setdefault(name, {
+                    "kb_name": name, "jobs": 0, "statuses": {}, "documents": document_counts.get(name, 0),
+                    "last_job_id": None, "last_job_at": None,
+                })
+                summary['jobs'] += count
+                summary['statuses'][status] = count
+                if summary['last_job_at'] is None or last_job_at > summary['last_job_at']:
+                    summary['last_job_at'] = last_job_at
+            for summary in summaries.values():
+                row = conn.execute(
+                    "SELECT job_id FROM jobs WHERE kb_name = ? ORDER BY timestamp DESC, job_id DESC LIMIT 1",
+                    (summary['kb_name'],),
+                ).fetchone()
+                summary['last_job_id'] = row[0] if row else None
+        return sorted(summaries.values(), key=lambda summary: summary['last_job_at'] or "", reverse=True)
+    except Exception as e:
+        logger.error("Error summarizing knowledge bases.", exc_info=True)
+        return None
+
+def get_document(kb_name, document):
+    """Gets the latest ingested version of a document in a knowledge base."""
+    try:
+        with _connection() as conn:
+            result = conn.execute("SELECT kb_name, document, hash, collection_name, job_id, page_hashes, timestamp "
+                                  "FROM documents WHERE kb_name = ? AND document = ?", (kb_name, document)).fetchone()
+        if result:
+            document_record = dict(result)
+            document_record['page_hashes'] = {
+                int(page_num): content_hash
+                for page_num, content_hash in json.loads(document_record['page_hashes'] or "{}").items()
+            }
+            return document_record
+        return None
+    except Exception as e:
+        logger.error(f"Error getting document '{document}' of kb '{kb_name}'.", exc_info=True)
+        return None
+
+def upsert_document(kb_name, document, hash, collection_name, job_id, page_hashes, timestamp):
+    """Records the ingested version of a document and its per-page content hashes."""
+    try:
+        with _connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO documents "
+                         "(kb_name, document, hash, collection_name, job_id, page_hashes, timestamp) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (kb_name, document, hash, collection_name, job_id, json.dumps(page_hashes), timestamp))
+        logger.info(f"Recorded document '{document}' of kb '{kb_name}' (job {job_id}).")
+    except Exception as e:
+        logger.error(f"Error recording document '{document}' of kb '{kb_name}'.", exc_info=True)
+
+
+def get_kb_collections(kb_name):
+    """Gets the collections holding a knowledge base's documents; None on error."""
+    try:
+        with _connection() as conn:
+            rows = conn.execute("SELECT DISTINCT collection_name FROM documents WHERE kb_name = ?", (kb_name,)).fetchall()
+        return [row[0] for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting collections of kb '{kb_name}'.", exc_info=True)
+        return None
+
+def reassign_collection(old_collection_name, new_collection_name):
+    """Points the jobs and documents stored in one collection at another, e.g. after a migration."""
+    try:
+        with _transaction() as conn:
+            # Jobs from before collection_name was recorded used their own ID as the collection
+            conn.execute("UPDATE jobs SET collection_name = ? WHERE collection_name = ? "
+                         "OR (collection_name IS NULL AND job_id = ?)",
+                         (new_collection_name, old_collection_name, old_collection_name))
+            conn.execute("UPDATE documents SET collection_name = ? WHERE collection_name = ?",
+                         (new_collection_name, old_collection_name))
+        logger.info(f"Reassigned collection '{old_collection_name}' to '{new_collection_name}'.")
+        return True
+    except Exception as e:
+        logger.error(f"Error reassigning collection '{old_collection_name}'.", exc_info=True)
+        return False
+
+def count_jobs_with_status(status):
+    """Counts the jobs with the given status, or returns None on error."""
+    try:
+        with _connection() as conn:
+            result = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()
+        return result[0]
+    except Exception as e:
+        logger.error(f"Error counting jobs with status '{status}'.", exc_info=True)
+        return None
+
+def count_jobs_by_status():
+    """Gets {status: number of jobs}; None on error."""
+    try:
+        with _connection() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+    except Exception as e:
+        logger.error("Error counting jobs by status.", exc_info=True)
+        return None
+
+def claim_next_job(worker_id):
+    """
+    Atomically moves the highest-priority, oldest queued job to 'processing' and returns it.
+    Returns None if the queue is empty.
+    """
+    try:
+        # The write lock is held from the SELECT on, so two workers cannot claim the same job
+        with _transaction() as conn:
+            result = conn.execute("SELECT job_id, kb_name, file_path, attempts FROM jobs WHERE status = 'in_queue' "
+                                  "ORDER BY priority DESC, timestamp LIMIT 1").fetchone()
+            if result is not None:
+                conn.execute("UPDATE jobs SET status = 'processing', worker_id = ?, heartbeat = ?, attempts = attempts + 1 "
+                             "WHERE job_id = ?", (worker_id, datetime.now(), result['job_id']))
+        if result is None:
+            return None
+        logger.info(f"Worker {worker_id} claimed job {result['job_id']}.")
+        return dict(result)
+    except Exception as e:
+        logger.error(f"Error claiming next job for worker {worker_id}.", exc_info=True)
+        return None
+
+def touch_job(job_id):
+    """Refreshes the heartbeat of a job that is being processed."""
+    try:
+        with _connection() as conn:
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE job_id = ?", (datetime.now(), job_id))
+    except Exception as e:
+        logger.error(f"Error updating heartbeat of job {job_id}.", exc_info=True)
+
+def requeue_stale_jobs(stale_before, max_attempts):
+    """
+    Recovers jobs left in 'processing' by a crashed worker (heartbeat older than stale_before).
+    Jobs that still have attempts left are re-queued, the others are marked failed.
+    """
+    try:
+        with _transaction() as conn:
+            failed = conn.execute("UPDATE jobs SET status = 'failed' WHERE status = 'processing' "
+                                  "AND (heartbeat IS NULL OR heartbeat < ?) AND (attempts >= ? OR file_path IS NULL)",
+                                  (stale_before, max_attempts)).rowcount
+            requeued = conn.execute("UPDATE jobs SET status = 'in_queue', worker_id = NULL WHERE status = 'processing' "
+                                    "AND (heartbeat IS NULL OR heartbeat < ?)", (stale_before,)).rowcount
+        if failed or requeued:
+            logger.warning(f"Recovered stale jobs: {requeued} re-queued, {failed} failed after {max_attempts} attempts.")
+        return requeued
+    except Exception as e:
+        logger.error("Error re-queueing stale jobs.", exc_info=True)
+        return 0
+
+
+def bump_collection_version(collection_name):
+    """Marks a collection's contents as changed, invalidating answers cached for it."""
+    try:
+        with _connection() as conn:
+            conn.execute("INSERT INTO collection_versions (collection_name, version) VALUES (?, 1) "
+                         "ON CONFLICT(collection_name) DO UPDATE SET version = version + 1", (collection_name,))
+        logger.info(f"Bumped version of collection '{collection_name}'.")
+    except Exception as e:
+        logger.error(f"Error bumping version of collection '{collection_name}'.", exc_info=True)
+
+def kb_version_key(collection_name, kb_name):
+    """Version key of one knowledge base within a shared collection."""
+    return f"{collection_name}/{kb_name}"
+
+def get_collection_version(collection_name):
+    """Gets a collection's version; 0 if it was never bumped, None on error."""
+    try:
+        with _connection() as conn:
+            result = conn.execute("SELECT version FROM collection_versions WHERE collection_name = ?",
+                                  (collection_name,)).fetchone()
+        return result[0] if result else 0
+    except Exception as e:
+        logger.error(f"Error getting version of collection '{collection_name}'.", exc_info=True)
+        return None
@@ -1,5 +1,9 @@
+import json
+import math
 import os
+import shutil
 import uuid
+from functools import lru_cache
 from fastapi import UploadFile
 
 BASE_STORAGE = "storage"
@@ -26,3 +30,135 @@ def save_uploaded_file(file: UploadFile, kb_name: str) -> str:
     file.file.seek(0)
 
     return temp_path
+
+def original_filename(file_path: str) -> str:
+    """Strips the unique prefix added by save_uploaded_file from a stored file's name."""
+    name = os.path.basename(file_path)
+    prefix, sep, rest = name.partition("_")
+    if sep:
+        try:
+            uuid.UUID(prefix)
+            return rest
+        except ValueError:
+            pass
+    return name
+
+# Where page images are saved under a processed directory, when not kept in the parquet
+PAGE_IMAGE_DIR = "pages"
+
+# Nested columns stored as JSON text
+JSON_COLUMNS = ('cells', 'segments')
+
+@lru_cache(maxsize=1)
+def processed_page_schema():
+    """
+    Arrow schema of processed parquet files. Text and page metadata come first and the bulky
+    layout and image columns last; readers projecting text columns never read the others.
+    """
+    import pyarrow as pa
+    return pa.schema([
+        ("document", pa.string()),
+        ("hash", pa.string()),
+        ("page_hash", pa.string()),
+        ("content_hash", pa.string()),
+        ("extra.page_num", pa.int32()),
+        ("extra.width_in_points", pa.float64()),
+        ("extra.height_in_points", pa.float64()),
+        ("extra.dpi", pa.float64()),
+        ("contents", pa.string()),
+        ("contents_md", pa.string()),
+        ("contents_dt", pa.string()),
+        ("image.width", pa.int32()),
+        ("image.height", pa.int32()),
+        # Relative to the processed directory; set when the image is saved as a file
+        ("image.path", pa.string()),
+        ("cells", pa.string()),
+        ("segments", pa.string()),
+        # Only set with PAGE_IMAGE_STORAGE=inline
+        ("image.bytes", pa.binary()),
+    ])
+
+def _column_value(name: str, value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if name in JSON_COLUMNS and not isinstance(value, str):
+        return json.dumps(value, default=str)
+    return value
+
+class ParquetAppender:
+    """
+    Writes processed page rows to a parquet file incrementally with processed_page_schema,
+    one row group per flush, so a document never has to be held in memory as a whole.
+
+    Page images are handled per page_images: "file" saves each as pages/<file stem>/page_<n>.png
+    next to the parquet file and records the relative path in image.path, "drop" discards them
+    and "inline" keeps the bytes in the parquet. With keep_layout off, cells and segments are
+    left out. Columns outside the schema are ignored.
+    """
+
+    def __init__(self, path: str, rows_per_group: int, page_images: str = "inline", keep_layout: bool = True):
+        self.path = path
+        self.rows_per_group = rows_per_group
+        self.page_images = page_images
+        self.keep_layout = keep_layout
+        self.base_dir = os.path.dirname(path)
+        self.page_images_dir = os.path.join(PAGE_IMAGE_DIR, os.path.splitext(os.path.basename(path))[0])
+        self._rows = []
+        self._writer = None
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _store_page_image(self, row: dict) -> dict:
+        image_bytes = row.get('image.bytes')
+        if self.page_images == "inline" or not image_bytes:
+            return row
+        row = {column: value for column, value in row.items() if column != 'image.bytes'}
+        if self.page_images == "file":
+            relative_path = os.path.join(self.page_images_dir, f"page_{int(row['extra.page_num']):04d}.png")
+            image_path = os.path.join(self.base_dir, relative_path)
+            os.makedirs(os.path.dirname(image_path), exist_ok=True)
+            with open(image_path, "wb") as f:
+                f.write(image_bytes)
+            row['image.path'] = relative_path
+        return row
+
+    def append(self, row: dict):
+        row = self._store_page_image(row)
+        if not self.keep_layout:
+            row = {column: value for column, value in row.items() if column not in JSON_COLUMNS}
+        self._rows.append(row)
+        if len(self._rows) >= self.rows_per_group:
+            self.flush()
+
+    def _open_writer(self):
+        # Imported here so the API, which only saves uploads, does not load pyarrow
+        import pyarrow.parquet as pq
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, processed_page_schema(), compression="zstd")
+        return self._writer
+
+    def flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        schema = processed_page_schema()
+        table = pa.Table.from_pydict(
+            {name: [_column_value(name, row.get(name)) for row in self._rows] for name in schema.names},
+            schema=schema,
+        )
+        self._open_writer().write_table(table)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        # A document without pages still gets a file with the schema
+        self._open_writer().close()
+
+    def abort(self):
+        """Discards buffered rows and removes what was written: the parquet file and page images."""
+        self._rows = []
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        shutil.rmtree(os.path.join(self.base_dir, self.page_images_dir), ignore_errors=True)
@@ -0,0 +1,60 @@
+"""
+Prometheus metrics of this process, in prometheus_client's default registry.
+
+The API serves the registry on /metrics; the ingestion worker runs in its own process and
+serves its registry on WORKER_METRICS_PORT.
+"""
+import errno
+import logging
+from prometheus_client import Counter, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Request latencies, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Whole-job and per-stage ingestion times, in seconds
+STAGE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> bool:
+    """
+    Serves /metrics on a background thread, for processes without an HTTP API. A port in use,
+    e.g. by a second worker on the host, is logged and skipped so the process still runs.
+    """
+    if port <= 0:
+        return False
+    try:
+        start_http_server(port, addr=host)
+    except OSError as e:
+        if e.errno != errno.EADDRINUSE:
+            raise
+        logger.warning(f"Metrics port {port} is already in use, not serving metrics from this process.")
+        return False
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return True
+
+# Ingestion
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_seconds", "Busy time per ingestion stage and job (convert, figures, embed, upsert, parquet).",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+INGESTION_JOB_SECONDS = Histogram(
+    "ingestion_job_seconds", "Wall time of ingestion jobs, by final status.", ["status"], buckets=STAGE_BUCKETS,
+)
+INGESTION_PAGES = Counter("ingestion_pages", "Pages converted by ingestion jobs.")
+INGESTION_CHUNKS = Counter("ingestion_chunks", "Chunks embedded and upserted by ingestion jobs.")
+
+# Retrieval
+RETRIEVAL_SECONDS = Histogram(
+    "retrieval_stage_seconds", "Retrieval latency by stage (embed, search, llm, total) and mode.", ["stage", "mode"],
+    buckets=DEFAULT_BUCKETS,
+)
+RETRIEVAL_REQUESTS = Counter(
+    "retrieval_requests", "Retrieval requests by mode and outcome (answered, cached, error).", ["mode", "outcome"],
+)
+
+# Model APIs
+MODEL_API_CALLS = Counter("model_api_calls", "Calls to embedding and generation APIs.", ["provider", "operation"])
+MODEL_API_ERRORS = Counter("model_api_errors", "Failed calls to embedding and generation APIs.", ["provider", "operation"])
+MODEL_API_SECONDS = Histogram("model_api_seconds", "Latency of embedding and generation API calls.", ["provider", "operation"],
+                              buckets=DEFAULT_BUCKETS)
+MODEL_TOKENS = Counter("model_tokens", "Tokens reported by the model APIs, by kind (prompt, completion).", ["provider", "model", "kind"])
@@ -0,0 +1,90 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+def prefetch(iterable: Iterable[T], maxsize: int, name: str = None) -> Iterator[T]:
+    """
+    Runs an iterable in a background thread, buffering at most maxsize items ahead of
+    the consumer. Chaining prefetch() between generator stages lets the stages overlap
+    while the bounded queues keep memory proportional to the buffer sizes.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put(item):
+                    return
+            _put(_DONE)
+        except BaseException as e:
+            _put(_Failure(e))
+        finally:
+            # Propagate early shutdown to upstream generator stages
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=_produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[list]:
+    """Groups items into lists of at most size items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ordered_map(fn: Callable[[T], R], iterable: Iterable[T], max_workers: int) -> Iterator[R]:
+    """
+    Applies fn to items on a thread pool with at most max_workers calls in flight,
+    yielding results in input order.
+    """
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        try:
+            for item in iterable:
+                pending.append(executor.submit(fn, item))
+                if len(pending) >= max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,124 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, TypeVar
+from app.config import settings
+from app.utils.db_utils import set_job_progress
+from app.utils.metrics import INGESTION_CHUNKS, INGESTION_JOB_SECONDS, INGESTION_PAGES, INGESTION_STAGE_SECONDS
+
+T = TypeVar("T")
+
+# Counters reported for every job, in pipeline order
+PROGRESS_COUNTERS = (
+    "pages_total",
+    "pages_converted",
+    "pages_processed",
+    "figures_described",
+    "chunks_embedded",
+    "points_upserted",
+)
+
+class JobProgress:
+    """
+    Progress of one ingestion job: page, figure, chunk and point counters and the time spent
+    in each stage. Pipeline stages update it from their own threads; it is written to the
+    job's row at most every PROGRESS_FLUSH_INTERVAL seconds, where the API picks it up.
+    Stage times are busy time summed over threads, so concurrent stages can add up to more
+    than the job's wall time.
+    """
+
+    def __init__(self, job_id: str, flush_interval: float = settings.PROGRESS_FLUSH_INTERVAL):
+        self.job_id = job_id
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(PROGRESS_COUNTERS, 0)
+        self._stage_seconds = {}
+        self._stage = None
+        self._started = time.monotonic()
+        self._started_at = datetime.now().isoformat(timespec="seconds")
+        self._last_flush = 0.0
+        self.flush()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "stage": self._stage,
+                **self._counters,
+                "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self._stage_seconds.items()},
+                "started_at": self._started_at,
+                "elapsed_seconds": round(time.monotonic() - self._started, 3),
+            }
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        set_job_progress(self.job_id, self.snapshot())
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def set(self, counter: str, value: int):
+        with self._lock:
+            self._counters[counter] = value
+        self._maybe_flush()
+
+    def add(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] += n
+        self._maybe_flush()
+
+    def set_stage(self, stage: str):
+        """Names the step the job is in, for the steps that do not overlap (e.g. finalizing)."""
+        with self._lock:
+            self._stage = stage
+        self.flush()
+
+    def finish(self, status: str):
+        """
+        Records the job's final stage and reports its stage timings and counters to the
+        worker's metrics. Stage timings stay on the job, in its progress.
+        """
+        self.set_stage(status)
+        snapshot = self.snapshot()
+        for stage, seconds in snapshot["stage_seconds"].items():
+            INGESTION_STAGE_SECONDS.labels(stage).observe(seconds)
+        INGESTION_JOB_SECONDS.labels(status).observe(snapshot["elapsed_seconds"])
+        INGESTION_PAGES.inc(snapshot["pages_converted"])
+        INGESTION_CHUNKS.inc(snapshot["points_upserted"])
+
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self._stage_seconds[stage] = self._stage_seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def count(self, iterable: Iterable[T], counter: str, stage: Optional[str] = None) -> Iterator[T]:
+        """
+        Passes items through, counting them, and charges the time spent producing each
+        one to stage.
+        """
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    if stage is not None:
+                        self.add_time(stage, time.perf_counter() - start)
+                self.add(counter)
+                yield item
+        finally:
+            # Let an early shutdown reach the wrapped generator
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
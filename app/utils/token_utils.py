@@ -0,0 +1,33 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """Loads the tiktoken encoding for a model, or None if tiktoken cannot be used."""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.info("tiktoken not installed, falling back to character-based token estimates.")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encoding files are downloaded on first use, which fails on offline nodes
+        logger.warning("Could not load tiktoken encoding, falling back to character-based token estimates.", exc_info=True)
+        return None
+
+def count_tokens(text: str, model: str = "text-embedding-3-large") -> int:
+    """Counts the tokens in a text, estimating from its length if no tokenizer is available."""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,20 +1,142 @@
 import logging
 import os
-import pandas as pd
-from app.utils.db_utils import update_job_status
-from app.services.docling_service import create_df_from_pdf
-from app.services.figure_service import process_figures
+from collections import deque
+from datetime import datetime
+from app.config import settings
+from app.utils.db_utils import update_job_status, get_job, set_job_collection, get_document, upsert_document, bump_collection_version, kb_version_key
+from app.utils.chunk_utils import PAGE_SEPARATOR
+from app.utils.file_utils import ParquetAppender, original_filename
+from app.utils.pipeline_utils import prefetch, batched
+from app.utils.content_cache import get_content_cache
+from app.utils.progress import JobProgress
+from app.services.docling_service import iter_pdf_pages, get_document_hash, get_pdf_page_count
+from app.services.figure_service import process_pages_figures
 from app.services.vector_store_service import VectorStoreService
 
 logger = logging.getLogger(__name__)
 
-def process_ingestion(file_path: str, job_id: str):
-    """Processes the ingestion of a file and updates the job status."""
+# Columns carried past the figure stage; page images, cells and segments only go to the parquet writer
+TEXT_COLUMNS = ['hash', 'page_hash', 'content_hash', 'contents_md', 'extra.page_num']
+# Marker spliced into a page's markdown for every described figure
+FIGURE_MARKER = "<!-- figure: "
+
+def _process_page_figures(rows, images_dir, parquet_writer, document, progress):
+    """
+    Describes the figures of each window of pages concurrently, persists the page rows
+    and yields text-only rows.
+    """
+    for window in batched(rows, settings.INGESTION_WINDOW_PAGES):
+        with progress.timed("figures"):
+            window = process_pages_figures(window, images_dir)
+        progress.add("figures_described", sum(row['contents_md'].count(FIGURE_MARKER) for row in window))
+        for row in window:
+            with progress.timed("parquet"):
+                parquet_writer.append(row)
+            progress.add("pages_processed")
+            text_row = {column: row[column] for column in TEXT_COLUMNS}
+            text_row['document'] = document
+            yield text_row
+
+def _select_changed_pages(rows, previous_hashes, page_spans, page_count, page_hashes, changed_pages, affected_pages):
+    """
+    Yields the pages whose chunks are rebuilt for a new version of a document. The previous
+    version's chunks that touch a changed or removed page are deleted afterwards, so every page
+    those chunks covered (page_spans holds the first and last page of each) is chunked again.
+    When pages were removed from the end, the new last page counts as changed.
+    Fills page_hashes with every page's content hash, changed_pages with the pages whose previous
+    chunks are stale and affected_pages with the pages yielded; a page is added to affected_pages
+    before it is yielded. Every yielded page carries its offset in the whole document's text, so
+    chunks keep document offsets across gaps.
+    """
+    # Pages sharing a previous chunk with each page: from first[page] to last[page]
+    first, last = {}, {}
+    for span_first, span_last in page_spans:
+        for page in range(span_first, span_last + 1):
+            first[page] = min(first.get(page, page), span_first)
+            last[page] = max(last.get(page, page), span_last)
+
+    def invalidate(page):
+        affected_pages.update(range(first.get(page, page), min(last.get(page, page), page_count) + 1))
+
+    removed_pages = [page for page in previous_hashes if page > page_count]
+    if removed_pages and page_count > 0:
+        changed_pages.add(page_count)
+        invalidate(page_count)
+    for page in removed_pages:
+        invalidate(page)
+
+    # A page waits until no later page can share a previous chunk with it
+    pending = deque()
+    document_offset = 0
+    for row in rows:
+        page_num = row['extra.page_num']
+        row['document_offset'] = document_offset
+        document_offset += len(row['contents_md']) + len(PAGE_SEPARATOR)
+        page_hashes[page_num] = row['content_hash']
+        if previous_hashes.get(page_num) != row['content_hash']:
+            changed_pages.add(page_num)
+            invalidate(page_num)
+        pending.append(row)
+        while pending:
+            pending_num = pending[0]['extra.page_num']
+            if pending_num not in affected_pages and last.get(pending_num, pending_num) > page_num:
+                break
+            pending_row = pending.popleft()
+            if pending_num in affected_pages:
+                yield pending_row
+
+    for row in pending:
+        if row['extra.page_num'] in affected_pages:
+            yield row
+
+def _record_page_hashes(rows, page_hashes):
+    for row in rows:
+        page_hashes[row['extra.page_num']] = row['content_hash']
+        yield row
+
+def process_ingestion(file_path: str, job_id: str, retry: bool = False):
+    """
+    Processes the ingestion of a file and updates the job status.
+    Pages stream through conversion, figure description, chunking, embedding and upsert;
+    each stage runs in its own thread with a bounded buffer, so memory depends on a window
+    of pages rather than the document size.
+    A document already ingested into the knowledge base with the same hash is skipped. A new
+    version of it only re-embeds the pages whose content changed and the pages sharing a chunk
+    with them, in the collection that holds the previous version, and then deletes the stale
+    points of those pages.
+    A retry of a job whose worker crashed first deletes the points the crashed attempt wrote.
+    """
     logger.info(f"Starting ingestion process for job ID: {job_id}")
+    vector_store_service = None
+    parquet_writer = None
+    progress = None
     try:
+        progress = JobProgress(job_id)
         update_job_status(job_id, "processing")
         logger.info(f"Updated job {job_id} status to 'processing'")
 
+        kb_name = get_job(job_id)['kb_name']
+        document = original_filename(file_path)
+        document_hash = get_document_hash(file_path)
+        previous = get_document(kb_name, document)
+
+        if previous is not None and previous['hash'] == document_hash:
+            set_job_collection(job_id, previous['collection_name'], document)
+            progress.finish("unchanged")
+            update_job_status(job_id, "completed")
+            logger.info(f"Document '{document}' is unchanged since job {previous['job_id']}, skipping ingestion "
+                        f"(collection '{previous['collection_name']}').")
+            return
+
+        # A new version stays where the previous one is, even if the storage mode changed since
+        if previous is not None:
+            collection_name = previous['collection_name']
+        elif settings.STORAGE_MODE == "shared":
+            collection_name = settings.SHARED_COLLECTION_NAME
+        else:
+            collection_name = job_id
+        set_job_collection(job_id, collection_name, document)
+
         # Get base path from file_path
         base_path = os.path.dirname(os.path.dirname(file_path))
         
@@ -28,38 +150,77 @@ def process_ingestion(file_path: str, job_id: str):
         os.makedirs(images_dir, exist_ok=True)
         logger.info(f"Created images directory: {images_dir}")
 
-        # Create dataframe from PDF
-        df_ingestion = create_df_from_pdf(file_path, processed_dir)
-
-        # Process figures for each page
-        updated_rows = []
-        for _, row in df_ingestion.iterrows():
-            updated_row = row.copy()
-            content_dt, content_md = process_figures(
-                row['contents_dt'],
-                row['contents_md'],
-                row['image.bytes'],
-                row['extra.page_num'],
-                images_dir
-            )
-            updated_row['contents_dt'] = content_dt
-            updated_row['contents_md'] = content_md
-            updated_rows.append(updated_row)
-
-        df_processed = pd.DataFrame(updated_rows)
-
-        # Save processed dataframe to parquet
+        # Processed pages are appended to parquet as they leave the figure stage
         file_name = os.path.basename(file_path)
         parquet_file_path = os.path.join(processed_dir, f"{os.path.splitext(file_name)[0]}.parquet")
-        df_processed.to_parquet(parquet_file_path, engine="fastparquet", index=False)
-        logger.info(f"Created parquet file: {parquet_file_path}")
+        parquet_writer = ParquetAppender(parquet_file_path, settings.INGESTION_WINDOW_PAGES,
+                                         page_images=settings.PAGE_IMAGE_STORAGE, keep_layout=settings.PROCESSED_KEEP_LAYOUT)
+
+        page_count = get_pdf_page_count(file_path)
+        progress.set("pages_total", page_count)
+
+        vector_store_service = VectorStoreService(
+            collection_name=collection_name,
+            multi_tenant=collection_name == settings.SHARED_COLLECTION_NAME,
+        )
+        # Point IDs are random, so points of an earlier attempt would otherwise stay next to the new ones
+        if retry:
+            vector_store_service.delete_job_points(job_id)
+
+        progress.set_stage("ingesting")
+        window = settings.INGESTION_WINDOW_PAGES
+        pages = progress.count(iter_pdf_pages(file_path, processed_dir), "pages_converted", stage="convert")
+        pages = prefetch(pages, maxsize=window, name=f"convert-{job_id}")
+        pages = prefetch(_process_page_figures(pages, images_dir, parquet_writer, document, progress), maxsize=window, name=f"figures-{job_id}")
+
+        page_hashes = {}
+        changed_pages = None
+        affected_pages = None
+        if previous is not None:
+            changed_pages, affected_pages = set(), set()
+            page_spans = vector_store_service.document_page_spans(document, kb_name)
+            pages = _select_changed_pages(pages, previous['page_hashes'], page_spans, page_count,
+                                          page_hashes, changed_pages, affected_pages)
+        else:
+            pages = _record_page_hashes(pages, page_hashes)
 
         # Embed and store in Qdrant
-        vector_store_service = VectorStoreService(collection_name=job_id)
-        vector_store_service.embed_and_store(df_processed)
+        vector_store_service.store_pages(pages, base_payload={"job_id": job_id, "kb_name": kb_name},
+                                         only_pages=affected_pages, progress=progress)
+
+        if previous is not None:
+            progress.set_stage("removing_stale_points")
+            removed_pages = set(previous['page_hashes']) - set(page_hashes)
+            stale_pages = changed_pages | removed_pages
+            logger.info(f"Re-chunked {len(affected_pages)} pages for {len(changed_pages)} changed and "
+                        f"{len(removed_pages)} removed pages of '{document}' ({len(page_hashes)} pages total).")
+            vector_store_service.delete_document_points(document, stale_pages, keep_job_id=job_id, kb_name=kb_name)
+
+        progress.set_stage("finalizing")
+        with progress.timed("parquet"):
+            parquet_writer.close()
+        logger.info(f"Created parquet file: {parquet_file_path}")
+
+        upsert_document(kb_name, document, document_hash, collection_name, job_id, page_hashes, datetime.now())
+        bump_collection_version(collection_name)
+        bump_collection_version(kb_version_key(collection_name, kb_name))
+
+        cache = get_content_cache()
+        if cache is not None:
+            logger.info(f"Content cache stats: {cache.stats()}")
 
+        progress.finish("completed")
         update_job_status(job_id, "completed")
         logger.info(f"Updated job {job_id} status to 'completed'")
     except Exception as e:
+        if progress is not None:
+            progress.finish("failed")
         update_job_status(job_id, "failed")
-        logger.error(f"Error processing {file_path} for job {job_id}: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"Error processing {file_path} for job {job_id}: {e}", exc_info=True)
+        if parquet_writer is not None:
+            parquet_writer.abort()
+        if vector_store_service is not None:
+            try:
+                vector_store_service.delete_job_points(job_id)
+            except Exception:
+                logger.error(f"Error cleaning up points of failed job {job_id}.", exc_info=True)
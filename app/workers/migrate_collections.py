@@ -0,0 +1,120 @@
+"""
+Migrates per-job collections into the shared multi-tenant collection: copies their points,
+tagged with kb_name and job_id, re-points the jobs and documents tables at the shared
+collection, and optionally deletes the old collections. Safe to re-run; point IDs are kept.
+
+Usage:
+    python -m app.workers.migrate_collections [--dry-run] [--delete-source] [--batch-size N]
+"""
+import argparse
+import logging
+from collections import defaultdict
+from app.config import settings, setup_logging
+from app.utils.db_utils import init_db, get_all_jobs, reassign_collection, set_job_collection, bump_collection_version, kb_version_key
+from app.services.vector_store_service import VectorStoreService
+from app.services.vector_clients import create_vector_client
+
+logger = logging.getLogger(__name__)
+
+def source_collections(jobs) -> dict:
+    """Groups completed jobs by the collection holding their points, skipping the shared one."""
+    collections = defaultdict(list)
+    for job in jobs:
+        if job['status'] != "completed":
+            continue
+        # Jobs from before collection_name was recorded used their own ID as the collection
+        collection_name = job['collection_name'] or job['job_id']
+        if collection_name != settings.SHARED_COLLECTION_NAME:
+            collections[collection_name].append(job)
+    return collections
+
+def migrate_collection(client, target: VectorStoreService, collection_name: str,
+                       jobs: list, batch_size: int) -> tuple:
+    """
+    Copies one collection's points into the target.
+    Returns the number of points copied and the document names found in their payloads.
+    """
+    kb_names = {job['kb_name'] for job in jobs}
+    if len(kb_names) != 1:
+        raise ValueError(f"Collection '{collection_name}' is used by several knowledge bases: {sorted(kb_names)}")
+    kb_name = kb_names.pop()
+
+    source = client.get_collection(collection_name=collection_name)
+    if source.config.params.vectors.size != target.dimensions:
+        raise ValueError(f"Collection '{collection_name}' has {source.config.params.vectors.size}-dimensional "
+                         f"vectors, the shared collection {target.dimensions}")
+
+    # Points written before job_id was recorded belong to the job that created the collection
+    payload_defaults = {"kb_name": kb_name, "job_id": collection_name}
+    copied, offset = 0, None
+    documents = set()
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        copied += target.import_points(records, payload_defaults)
+        documents.update(record.payload.get('document') for record in records if record.payload)
+        if offset is None:
+            break
+    return copied, documents
+
+def migrate(dry_run: bool = False, delete_source: bool = False, batch_size: int = 256):
+    client = create_vector_client()
+    collections = source_collections(get_all_jobs())
+    logger.info(f"Found {len(collections)} per-job collections to migrate into '{settings.SHARED_COLLECTION_NAME}'.")
+    if dry_run:
+        for collection_name, jobs in collections.items():
+            try:
+                points = client.count(collection_name=collection_name).count
+            except Exception:
+                points = None
+            logger.info(f"Would migrate '{collection_name}' (kb '{jobs[0]['kb_name']}', {len(jobs)} jobs, {points} points).")
+        return
+
+    target = VectorStoreService(collection_name=settings.SHARED_COLLECTION_NAME, multi_tenant=True)
+    migrated = failed = 0
+    for collection_name, jobs in collections.items():
+        try:
+            copied, documents = migrate_collection(client, target, collection_name, jobs, batch_size)
+        except Exception as e:
+            failed += 1
+            logger.error(f"Skipping collection '{collection_name}': {e}", exc_info=True)
+            continue
+        if not reassign_collection(collection_name, settings.SHARED_COLLECTION_NAME):
+            failed += 1
+            continue
+        # In the shared collection a job's searches are narrowed to its document, which jobs
+        # from before it was recorded lack; a per-job collection holds a single document
+        documents.discard(None)
+        if len(documents) == 1:
+            document = documents.pop()
+            for job in jobs:
+                if not job.get('document'):
+                    set_job_collection(job['job_id'], settings.SHARED_COLLECTION_NAME, document)
+        kb_name = jobs[0]['kb_name']
+        bump_collection_version(settings.SHARED_COLLECTION_NAME)
+        bump_collection_version(kb_version_key(settings.SHARED_COLLECTION_NAME, kb_name))
+        migrated += 1
+        logger.info(f"Migrated {copied} points of '{collection_name}' (kb '{kb_name}').")
+        if delete_source:
+            client.delete_collection(collection_name=collection_name)
+            logger.info(f"Deleted collection '{collection_name}'.")
+    logger.info(f"Migrated {migrated} collections, {failed} failed.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate per-job collections into the shared collection.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    parser.add_argument("--delete-source", action="store_true", help="Delete each per-job collection once migrated")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    setup_logging()
+    init_db()
+    migrate(dry_run=args.dry_run, delete_source=args.delete_source, batch_size=args.batch_size)
+
+if __name__ == "__main__":
+    main()
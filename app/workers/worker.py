@@ -0,0 +1,116 @@
+"""
+Ingestion worker: pulls queued jobs from the jobs table and runs them with bounded concurrency.
+
+Usage:
+    python -m app.workers.worker [--concurrency N]
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta
+from app.config import settings, setup_logging
+from app.utils.db_utils import init_db, claim_next_job, touch_job, requeue_stale_jobs, update_job_status
+from app.utils.metrics import start_metrics_server
+from app.services.docling_service import get_converter_pool, shutdown_converter_pool
+from app.workers.ingestion import process_ingestion
+
+logger = logging.getLogger(__name__)
+
+class IngestionWorker:
+    """
+    Runs queued ingestion jobs on a fixed number of threads. Jobs are claimed in priority
+    order, keep a heartbeat while they run, and jobs orphaned by a crashed worker are
+    re-queued once their heartbeat goes stale.
+    """
+
+    def __init__(self, concurrency: int = settings.WORKER_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def recover_stale_jobs(self):
+        stale_before = datetime.now() - timedelta(seconds=settings.JOB_STALE_AFTER)
+        requeue_stale_jobs(stale_before, settings.JOB_MAX_ATTEMPTS)
+
+    def _heartbeat(self, job_id: str, done: threading.Event):
+        while not done.wait(settings.JOB_HEARTBEAT_INTERVAL):
+            touch_job(job_id)
+
+    def run_job(self, job: dict):
+        job_id = job['job_id']
+        if not job['file_path']:
+            logger.error(f"Job {job_id} has no input file, marking it failed.")
+            update_job_status(job_id, "failed")
+            return
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True)
+        heartbeat.start()
+        try:
+            # attempts counts the claims before this one
+            process_ingestion(job['file_path'], job_id, retry=job['attempts'] > 0)
+        finally:
+            done.set()
+            heartbeat.join()
+
+    def _loop(self, slot: int):
+        worker_id = f"{self.worker_id}/{slot}"
+        while not self._stop.is_set():
+            job = claim_next_job(worker_id)
+            if job is None:
+                self._stop.wait(settings.WORKER_POLL_INTERVAL)
+                continue
+            self.run_job(job)
+
+    def _recovery_loop(self):
+        while not self._stop.wait(settings.JOB_STALE_AFTER):
+            self.recover_stale_jobs()
+
+    def start(self):
+        """Starts the job threads and returns; stop() and join() end them."""
+        logger.info(f"Worker {self.worker_id} starting with concurrency {self.concurrency}.")
+        init_db()
+        self.recover_stale_jobs()
+        get_converter_pool()
+
+        self._threads = [threading.Thread(target=self._loop, args=(slot,), name=f"ingest-{slot}") for slot in range(self.concurrency)]
+        self._threads.append(threading.Thread(target=self._recovery_loop, name="recovery", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def join(self):
+        """Waits for the job threads to finish after stop()."""
+        for thread in self._threads:
+            if not thread.daemon:
+                thread.join()
+
+        shutdown_converter_pool()
+        logger.info(f"Worker {self.worker_id} stopped.")
+
+    def run(self):
+        # Bound before any job starts; a port taken by another worker is logged and skipped
+        start_metrics_server(settings.WORKER_METRICS_PORT)
+        self.start()
+        self.join()
+
+    def stop(self, *_):
+        logger.info(f"Worker {self.worker_id} stopping after in-flight jobs finish.")
+        self._stop.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ingestion worker.")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    setup_logging()
+    worker = IngestionWorker(concurrency=args.concurrency)
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+    worker.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Measures API cold start in fresh processes: time to import app.main, to finish startup and
+to answer a first request, plus the resident memory and heavy libraries loaded. Compares the
+API-only role with an API that loads the ingestion stack at import, as it used to, and with
+APP_ROLE=all, which also runs the ingestion worker in the API process.
+
+Usage:
+    python -m benchmarks.api_startup --runs 5
+    python -m benchmarks.api_startup --roles api all --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("docling", "torch", "transformers", "pandas", "pyarrow", "PIL", "fitz", "langchain", "numpy", "qdrant_client", "openai")
+
+# Runs in a fresh interpreter; prints one JSON line
+CHILD = r"""
+import json, os, resource, sys, time
+start = time.perf_counter()
+if os.environ.get("BENCH_EAGER_INGESTION") == "1":
+    import app.workers.ingestion
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.utils import db_utils
+db_utils.DB_PATH = os.environ["BENCH_DB_PATH"]
+with TestClient(app.main.app) as client:
+    started = time.perf_counter()
+    response = client.get("/api/jobs")
+    responded = time.perf_counter()
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "import_seconds": imported - start,
+    "startup_seconds": started - start,
+    "first_response_seconds": responded - start,
+    "status_code": response.status_code,
+    "peak_rss_mb": rss_kb / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    "modules": sorted(m for m in json.loads(os.environ["BENCH_HEAVY_MODULES"]) if m in sys.modules),
+}))
+"""
+
+ROLES = {
+    # API-only replica: no ingestion stack
+    "api": {"APP_ROLE": "api"},
+    # The ingestion stack imported at load, as the API did when routes imported it
+    "eager": {"APP_ROLE": "api", "BENCH_EAGER_INGESTION": "1"},
+    # Single-node deployment: the worker runs in the API process
+    "all": {"APP_ROLE": "all"},
+}
+
+def measure(role: str, workdir: str) -> dict:
+    env = dict(os.environ, **ROLES[role])
+    env.update({
+        "BENCH_DB_PATH": os.path.join(workdir, f"{role}.db"),
+        "BENCH_HEAVY_MODULES": json.dumps(HEAVY_MODULES),
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "benchmark"),
+        "WORKER_METRICS_PORT": "0",
+    })
+    result = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": (result.stderr.strip().splitlines() or ["unknown error"])[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(runs: list) -> dict:
+    ok = [run for run in runs if "error" not in run]
+    if not ok:
+        return {"error": runs[0]['error']}
+    summary = {
+        key: round(statistics.median(run[key] for run in ok), 3)
+        for key in ("import_seconds", "startup_seconds", "first_response_seconds", "peak_rss_mb")
+    }
+    summary['runs'] = len(ok)
+    summary['modules'] = ok[0]['modules']
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--roles", nargs="+", choices=list(ROLES), default=["api", "eager"])
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="smart-rag-startup-")
+    report = {role: summarize([measure(role, workdir) for _ in range(args.runs)]) for role in args.roles}
+
+    print(f"{'role':>6} {'import (s)':>11} {'startup (s)':>12} {'first resp (s)':>15} {'RSS (MB)':>9}  modules")
+    for role, summary in report.items():
+        if "error" in summary:
+            print(f"{role:>6}  failed: {summary['error']}")
+            continue
+        print(f"{role:>6} {summary['import_seconds']:11.3f} {summary['startup_seconds']:12.3f} "
+              f"{summary['first_response_seconds']:15.3f} {summary['peak_rss_mb']:9.1f}  {', '.join(summary['modules'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares the old find()-based chunk-to-page attribution with the offset/bisect one
+on a synthetic document.
+
+Usage:
+    python -m benchmarks.chunk_attribution --pages 2000
+"""
+import argparse
+import random
+import time
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from app.utils.chunk_utils import join_pages, split_text_with_offsets, page_span
+
+WORDS = "pump valve pressure sensor flow rate manual maintenance error code table figure".split()
+
+def make_pages(n_pages: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    pages = []
+    for page_num in range(1, n_pages + 1):
+        header = "ACME Corp. Operating Manual - Confidential"
+        paragraphs = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+            for _ in range(rng.randint(3, 8))
+        ]
+        pages.append(f"{header}\n\n" + "\n\n".join(paragraphs) + f"\n\nPage {page_num}")
+    return pages
+
+def attribute_legacy(text_splitter, pages):
+    full_text = ""
+    page_offsets = []
+    for page in pages:
+        page_offsets.append(len(full_text))
+        full_text += page + "\n\n"
+
+    result = []
+    for chunk in text_splitter.split_text(full_text):
+        chunk_start_offset = full_text.find(chunk)
+        page_index = -1
+        for i, offset in enumerate(page_offsets):
+            if chunk_start_offset >= offset:
+                page_index = i
+            else:
+                break
+        result.append(page_index)
+    return result
+
+def attribute_offsets(text_splitter, pages):
+    full_text, page_offsets = join_pages(pages)
+    return [
+        page_span(page_offsets, chunk.start, chunk.end)[0]
+        for chunk in split_text_with_offsets(text_splitter, full_text)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        length_function=len,
+    )
+
+    start = time.perf_counter()
+    legacy = attribute_legacy(text_splitter, pages)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    offsets = attribute_offsets(text_splitter, pages)
+    offsets_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(legacy, offsets) if a != b)
+    print(f"pages={args.pages} chunks={len(offsets)}")
+    print(f"legacy find():     {legacy_time:8.3f}s")
+    print(f"offsets + bisect:  {offsets_time:8.3f}s  ({legacy_time / offsets_time:.1f}x faster)")
+    print(f"chunks attributed to a different page by the legacy path: {mismatches}")
+
+if __name__ == "__main__":
+    main()
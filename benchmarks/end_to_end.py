@@ -0,0 +1,384 @@
+"""
+End-to-end benchmark of ingestion and retrieval on synthetic PDFs, with the model APIs
+served by a local fake OpenAI-compatible server (injectable latency) and vectors kept in the
+embedded store. Ingestion runs the worker's pipeline (docling conversion, figure descriptions,
+embedding, upserts) on the generated documents; retrieval load-tests /api/retrieve against
+the ingested collections.
+
+The JSON report holds throughput, p50/p99 latency, peak RSS, the size of the processed files
+and the time spent per ingestion and retrieval stage. With --baseline, the run is compared
+against a stored report and the command exits with status 1 if a metric got worse by more
+than --tolerance.
+
+Usage:
+    python -m benchmarks.end_to_end --documents 4 --pages 50 --figures-per-page 0.5 --output report.json
+    python -m benchmarks.end_to_end --output benchmarks/baseline.json
+    python -m benchmarks.end_to_end --baseline benchmarks/baseline.json --tolerance 0.1
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+# Metrics compared against a baseline, by key prefix: +1 if higher is better, -1 if lower is
+COMPARED_METRICS = {
+    "ingestion.pages_per_second": 1,
+    "ingestion.job_seconds.": -1,
+    "ingestion.stage_seconds.": -1,
+    "ingestion.processed_mb.": -1,
+    "retrieval.requests_per_second": 1,
+    "retrieval.latency_seconds.": -1,
+    "retrieval.stage_seconds.": -1,
+    "peak_rss_mb.": -1,
+}
+# Settings that change the results, recorded with every report
+RECORDED_SETTINGS = (
+    "EMBEDDING_MODEL", "EMBEDDING_DIMENSIONS", "LLM_MODEL", "VISION_MODEL", "STORAGE_MODE",
+    "DOCLING_POOL_SIZE", "INGESTION_WINDOW_PAGES", "INGESTION_UPSERT_BATCH_SIZE",
+    "FIGURE_MAX_CONCURRENCY", "FIGURE_REQUESTS_PER_MINUTE", "EMBEDDING_MAX_CONCURRENCY",
+    "HYBRID_SEARCH_ENABLED", "RETRIEVAL_TOP_K", "EMBEDDED_INDEX", "PAGE_IMAGE_STORAGE", "PROCESSED_KEEP_LAYOUT",
+)
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def children_peak_rss_mb() -> Optional[float]:
+    """
+    Summed peak resident set size of this process's running children, i.e. the converter
+    workers. Read from /proc, so only available on Linux.
+    """
+    total_kb = 0
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # The parent PID follows the parenthesized command name
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            if ppid != os.getpid():
+                continue
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    return round(total_kb / 1024, 1)
+
+def configure_environment(args, workdir: str):
+    """Points the app at the benchmark's stand-ins. Must run before any app module is imported."""
+    os.environ.update({
+        "VECTOR_STORE_BACKEND": "embedded",
+        "EMBEDDED_STORE_PATH": os.path.join(workdir, "vectors"),
+        "EMBEDDING_PROVIDER": "openai",
+        "GENERATION_PROVIDER": "openai",
+        "OPENAI_API_KEY": "benchmark",
+        "EMBEDDING_DIMENSIONS": str(args.dimensions),
+        "CONTENT_CACHE_ENABLED": "true" if args.caches else "false",
+        "CONTENT_CACHE_PATH": os.path.join(workdir, "content_cache.db"),
+    })
+    if not args.caches:
+        os.environ.update({"QUERY_EMBEDDING_CACHE_SIZE": "0", "ANSWER_CACHE_MAX_ENTRIES": "0"})
+
+def summarize_latencies(latencies) -> dict:
+    from benchmarks.retrieval_load import percentile
+    if not latencies:
+        return {}
+    return {
+        "p50": round(percentile(latencies, 50), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "mean": round(sum(latencies) / len(latencies), 4),
+    }
+
+def directory_bytes(path: str) -> int:
+    """Total size of the files under path, 0 if it does not exist."""
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def run_ingestion(args, workdir: str) -> dict:
+    from app.utils.db_utils import add_job, get_job
+    from app.utils.file_utils import PAGE_IMAGE_DIR
+    from app.services.docling_service import get_converter_pool
+    from app.workers.ingestion import process_ingestion
+    from benchmarks.synthetic_pdfs import make_corpus
+
+    input_dir = os.path.join(workdir, "storage", args.kb_name, "input")
+    paths = make_corpus(input_dir, args.documents, args.pages, args.figures_per_page, args.seed)
+
+    # Start the converter workers, as the worker does, so model loading is not counted
+    get_converter_pool()
+
+    job_ids = []
+    for path in paths:
+        job_id = str(uuid.uuid4())
+        add_job(job_id, "in_queue", args.kb_name, datetime.now(), file_path=os.path.abspath(path))
+        job_ids.append(job_id)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="ingest") as executor:
+        list(executor.map(lambda item: process_ingestion(*item), zip(paths, job_ids)))
+    elapsed = time.perf_counter() - start
+
+    jobs = [get_job(job_id) for job_id in job_ids]
+    completed = [job for job in jobs if job['status'] == "completed"]
+    progress = [job['progress'] or {} for job in completed]
+    stage_seconds = {}
+    for job_progress in progress:
+        for stage, seconds in (job_progress.get('stage_seconds') or {}).items():
+            stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+    pages = sum(p.get('pages_converted', 0) for p in progress)
+
+    processed_dir = os.path.join(workdir, "storage", args.kb_name, "processed")
+    parquet_bytes = sum(os.path.getsize(os.path.join(processed_dir, name))
+                        for name in os.listdir(processed_dir) if name.endswith(".parquet"))
+
+    return {
+        # (document index, job ID) of the completed jobs, which retrieval queries
+        "jobs": [(index, job['job_id']) for index, job in enumerate(jobs) if job['status'] == "completed"],
+        "documents": len(jobs),
+        "failed": len(jobs) - len(completed),
+        "pages": pages,
+        "figures": sum(p.get('figures_described', 0) for p in progress),
+        "chunks": sum(p.get('points_upserted', 0) for p in progress),
+        "wall_seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 3) if elapsed else None,
+        "job_seconds": summarize_latencies([p['elapsed_seconds'] for p in progress if 'elapsed_seconds' in p]),
+        # Busy time summed over jobs; overlapping stages can add up to more than the wall time
+        "stage_seconds": {stage: round(seconds, 3) for stage, seconds in sorted(stage_seconds.items())},
+        "processed_mb": {
+            "parquet": round(parquet_bytes / 2**20, 3),
+            "page_images": round(directory_bytes(os.path.join(processed_dir, PAGE_IMAGE_DIR)) / 2**20, 3),
+        },
+    }
+
+def _retrieval_stage_totals(mode: str) -> dict:
+    from prometheus_client import REGISTRY
+    totals = {}
+    for stage in ("embed", "search", "llm", "total"):
+        labels = {"stage": stage, "mode": mode}
+        totals[stage] = (REGISTRY.get_sample_value("retrieval_stage_seconds_sum", labels) or 0.0,
+                         REGISTRY.get_sample_value("retrieval_stage_seconds_count", labels) or 0.0)
+    return totals
+
+async def _retrieval_load(args, documents) -> dict:
+    import asyncio
+    import httpx
+    from app.main import app
+    from app.services.retrieval_service import RetrievalService
+    from benchmarks.synthetic_pdfs import part_number
+
+    rng = random.Random(args.seed)
+
+    def _request(i):
+        document_index, job_id = rng.choice(documents)
+        part = part_number(document_index, rng.randrange(1, args.pages + 1))
+        return {"query": f"How often must part {part} be inspected? ({i})", "collection_name": job_id}
+
+    app.state.retrieval_service = RetrievalService()
+    semaphore = asyncio.Semaphore(args.retrieval_concurrency)
+    latencies, errors = [], 0
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+            async def _one(request, record=True):
+                nonlocal errors
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post("/api/retrieve", json=request)
+                    if response.status_code != 200 or response.json()['response'].startswith(("Error", "An error")):
+                        errors += 1
+                    elif record:
+                        latencies.append(time.perf_counter() - start)
+
+            # Warm-up: opens connections and loads the collections
+            await asyncio.gather(*[_one(_request(i), record=False) for i in range(min(10, args.requests))])
+            errors = 0
+            before = _retrieval_stage_totals("single")
+            start = time.perf_counter()
+            await asyncio.gather(*[_one(_request(i)) for i in range(args.requests)])
+            elapsed = time.perf_counter() - start
+            after = _retrieval_stage_totals("single")
+    finally:
+        await app.state.retrieval_service.close()
+
+    stage_seconds = {}
+    for stage, (total, count) in after.items():
+        n = count - before[stage][1]
+        if n:
+            stage_seconds[stage] = round((total - before[stage][0]) / n, 4)
+    return {
+        "requests": args.requests,
+        "concurrency": args.retrieval_concurrency,
+        "errors": errors,
+        "wall_seconds": round(elapsed, 3),
+        "requests_per_second": round(args.requests / elapsed, 2) if elapsed else None,
+        "latency_seconds": summarize_latencies(latencies),
+        # Mean seconds per request in each stage
+        "stage_seconds": stage_seconds,
+    }
+
+def run_retrieval(args, documents) -> dict:
+    import asyncio
+    return asyncio.run(_retrieval_load(args, documents))
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}{key}.")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix[:-1], value
+
+def _direction(key: str):
+    for prefix, direction in COMPARED_METRICS.items():
+        if key == prefix or (prefix.endswith(".") and key.startswith(prefix)):
+            return direction
+    return None
+
+def compare_reports(report: dict, baseline: dict, tolerance: float) -> dict:
+    """
+    Relative change of every compared metric against the baseline. A metric regressed
+    when it got worse by more than tolerance (e.g. 0.1 for 10%).
+    """
+    current = dict(_flatten(report))
+    previous = dict(_flatten(baseline))
+    metrics = {}
+    for key, value in current.items():
+        direction = _direction(key)
+        if direction is None or not previous.get(key):
+            continue
+        change = (value - previous[key]) / previous[key]
+        metrics[key] = {
+            "baseline": previous[key],
+            "current": value,
+            "change": round(change, 4),
+            "regressed": change * direction < -tolerance,
+        }
+    return {
+        "tolerance": tolerance,
+        "config_matches": report['config'] == baseline.get('config'),
+        "metrics": metrics,
+        "regressions": sorted(key for key, metric in metrics.items() if metric['regressed']),
+    }
+
+def print_comparison(comparison: dict):
+    if not comparison['config_matches']:
+        print("warning: the baseline was recorded with a different configuration")
+    print(f"{'metric':<40} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, metric in comparison['metrics'].items():
+        flag = "  REGRESSED" if metric['regressed'] else ""
+        print(f"{key:<40} {metric['baseline']:>10.4g} {metric['current']:>10.4g} {metric['change']:>+8.1%}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50, help="Pages per document")
+    parser.add_argument("--figures-per-page", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=2, help="Documents ingested at once, like the worker's --concurrency")
+    parser.add_argument("--requests", type=int, default=500, help="Retrieval requests; 0 skips retrieval")
+    parser.add_argument("--retrieval-concurrency", type=int, default=50)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--vision-latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--dimensions", type=int, default=256, help="Embedding size requested from the fake server")
+    parser.add_argument("--caches", action="store_true", help="Keep the content, query embedding and answer caches on")
+    parser.add_argument("--kb-name", default="benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Where documents, jobs and vectors are kept; a temporary directory by default")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Compare against this JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="smart-rag-bench-")
+    configure_environment(args, workdir)
+
+    from app.config import settings
+    from app.utils import db_utils
+    from app.services.docling_service import shutdown_converter_pool
+    from benchmarks.fake_openai_server import FakeOpenAIServer
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.disable(logging.WARNING)
+    db_utils.DB_PATH = os.path.join(workdir, "jobs.db")
+    db_utils.init_db()
+
+    server = FakeOpenAIServer(embed_latency=args.embed_latency, chat_latency=args.chat_latency,
+                              vision_latency=args.vision_latency, jitter=args.jitter).start()
+    settings.OPENAI_BASE_URL = server.base_url
+    try:
+        ingestion = run_ingestion(args, workdir)
+        rss_ingestion = peak_rss_mb()
+        documents = ingestion.pop('jobs')
+        retrieval = run_retrieval(args, documents) if args.requests > 0 and documents else None
+        rss_retrieval = peak_rss_mb()
+        rss_workers = children_peak_rss_mb()
+    finally:
+        server.stop()
+        shutdown_converter_pool()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "documents": args.documents,
+            "pages": args.pages,
+            "figures_per_page": args.figures_per_page,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "retrieval_concurrency": args.retrieval_concurrency,
+            "embed_latency": args.embed_latency,
+            "chat_latency": args.chat_latency,
+            "vision_latency": args.vision_latency,
+            "caches": args.caches,
+            "settings": {name: getattr(settings, name) for name in RECORDED_SETTINGS},
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "ingestion": ingestion,
+        "retrieval": retrieval,
+        "model_api": server.counts(),
+        "peak_rss_mb": {
+            "after_ingestion": rss_ingestion,
+            "after_retrieval": rss_retrieval,
+            "converter_workers": rss_workers,
+        },
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare_reports(report, json.load(f), args.tolerance)
+        report['comparison'] = comparison
+        print_comparison(comparison)
+        exit_code = 1 if comparison['regressions'] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Report written to {args.output}")
+    elif not args.baseline:
+        print(output)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
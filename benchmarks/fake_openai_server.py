@@ -0,0 +1,202 @@
+"""
+A local OpenAI-compatible server for benchmarks: /v1/embeddings and /v1/chat/completions
+(including streaming and image inputs) with injectable latency. Embeddings and answers come
+from the stub models, so retrieval over them still returns matching chunks, but every call
+goes through the real OpenAI client, HTTP connection pool and JSON handling.
+
+Usage:
+    python -m benchmarks.fake_openai_server --port 8100 --chat-latency 0.5
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from app.services.stub_models import stub_answer, stub_embedding
+
+# Full output size of the OpenAI embedding models, returned when no dimensions are requested
+DEFAULT_DIMENSIONS = {"text-embedding-3-large": 3072}
+FALLBACK_DIMENSIONS = 1536
+
+class Latency:
+    """Gaussian latency with a relative jitter, never negative."""
+
+    def __init__(self, mean: float, jitter: float = 0.2):
+        self.mean = mean
+        self.jitter = jitter
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        return max(0.0, random.gauss(self.mean, self.mean * self.jitter))
+
+def _approximate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def _is_vision_request(messages: list) -> bool:
+    return any(
+        not isinstance(message['content'], str) and any(part.get('type') == "image_url" for part in message['content'])
+        for message in messages
+    )
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeOpenAIServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/embeddings"):
+            self._embeddings(request)
+        elif path.endswith("/chat/completions"):
+            self._chat(request)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def _embeddings(self, request: dict):
+        texts = request['input']
+        texts = [texts] if isinstance(texts, str) else texts
+        model = request.get('model', "")
+        dimensions = request.get('dimensions') or DEFAULT_DIMENSIONS.get(model, FALLBACK_DIMENSIONS)
+        self.server.count("embeddings", inputs=len(texts))
+        time.sleep(self.server.embed_latency.sample())
+
+        data = []
+        for i, text in enumerate(texts):
+            embedding = stub_embedding(text, dimensions)
+            if request.get('encoding_format') == "base64":
+                embedding = base64.b64encode(np.asarray(embedding, dtype="<f4").tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(_approximate_tokens(text) for text in texts)
+        self._send_json(200, {
+            "object": "list",
+            "data": data,
+            "model": model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _chat(self, request: dict):
+        messages = request['messages']
+        vision = _is_vision_request(messages)
+        self.server.count("vision" if vision else "chat")
+        latency = (self.server.vision_latency if vision else self.server.chat_latency).sample()
+
+        answer = stub_answer(messages)
+        prompt_tokens = sum(_approximate_tokens(json.dumps(message['content'])) for message in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _approximate_tokens(answer),
+            "total_tokens": prompt_tokens + _approximate_tokens(answer),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get('model', "")
+        if not request.get('stream'):
+            time.sleep(latency)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        # A quarter of the latency before the first token, the rest spread over the tokens
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(choices, **extra):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices, **extra}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        tokens = [token + " " for token in answer.split(" ")]
+        time.sleep(latency / 4)
+        for token in tokens:
+            time.sleep(latency * 3 / 4 / len(tokens))
+            send([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+        send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get('stream_options') or {}).get('include_usage'):
+            send([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, embed_latency: float = 0.05,
+                 chat_latency: float = 0.5, vision_latency: float = 1.0, jitter: float = 0.2):
+        super().__init__((host, port), _Handler)
+        self.embed_latency = Latency(embed_latency, jitter)
+        self.chat_latency = Latency(chat_latency, jitter)
+        self.vision_latency = Latency(vision_latency, jitter)
+        self._counts = Counter()
+        self._counts_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, kind: str, inputs: int = 1):
+        with self._counts_lock:
+            self._counts[f"{kind}_requests"] += 1
+            self._counts[f"{kind}_inputs"] += inputs
+
+    def counts(self) -> dict:
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def start(self) -> "FakeOpenAIServer":
+        """Serves on a background thread."""
+        threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--vision-latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Standard deviation relative to the mean latency")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.embed_latency, args.chat_latency, args.vision_latency, args.jitter)
+    print(f"Serving a fake OpenAI API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Compares dense-only and hybrid (dense + BM25, fused with RRF) retrieval on a synthetic corpus
+of manual-like chunks, each mentioning a part number and an error code. Reports recall@10 and
+search latency for lookups by exact identifier, the case dense embeddings handle poorly.
+
+Runs against qdrant-client's in-process local mode, so no Qdrant server is needed. The dense
+stand-in embeds the words of a text with identifiers reduced to their letter prefix, which
+mimics how embeddings blur "PN-48213-B" and "PN-48231-B" into the same neighbourhood; it is
+deliberately pessimistic, so the dense recall here is a floor. Local mode searches by brute
+force in Python, so latencies are only meaningful relative to each other.
+
+Usage:
+    python -m benchmarks.hybrid_retrieval --chunks 5000 --queries 300
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import re
+import statistics
+import time
+
+os.environ.setdefault("QDRANT_URL", "localhost:6333")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient, models
+from app.config import settings
+from app.services.retrieval_service import RetrievalService
+from app.services.sparse_encoder import encode_document
+from benchmarks.stand_ins import FakeAsyncOpenAI
+
+DIM = 256
+TOPICS = "pump valve pressure sensor flow rate seal bearing motor controller filter gasket".split()
+FILLER = "check the replace inspect before after during operation maintenance interval torque".split()
+
+def dense_embedding(text: str) -> list:
+    """Hashed bag-of-words vector in which identifiers only contribute their letter prefix."""
+    text = re.sub(r"\b([A-Z]+)-[0-9][0-9A-Z-]*", r"\1", text)
+    vector = np.zeros(DIM)
+    for word in re.findall(r"[a-z]+", text.lower()):
+        bucket = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+        vector[bucket % DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+def make_corpus(n_chunks: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(n_chunks):
+        topic = rng.sample(TOPICS, 3)
+        part = f"PN-{rng.randint(10000, 99999)}-{rng.choice('ABCDEF')}"
+        code = f"E-{rng.randint(1000, 9999)}"
+        words = [rng.choice(FILLER + topic) for _ in range(rng.randint(80, 160))]
+        words.insert(rng.randrange(len(words)), f"part {part}")
+        words.insert(rng.randrange(len(words)), f"error {code}")
+        chunks.append({"id": i, "content": " ".join(words), "part": part, "code": code, "topic": topic})
+    return chunks
+
+def make_queries(chunks: list, n_queries: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    queries = []
+    for chunk in rng.sample(chunks, min(n_queries, len(chunks))):
+        if rng.random() < 0.5:
+            text = f"What does error {chunk['code']} mean for the {chunk['topic'][0]}?"
+        else:
+            text = f"How do I replace part {chunk['part']} on the {chunk['topic'][1]}?"
+        queries.append((text, chunk['id']))
+    return queries
+
+async def load_collection(client: AsyncQdrantClient, name: str, chunks: list, hybrid: bool):
+    await client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(size=DIM, distance=models.Distance.COSINE),
+        sparse_vectors_config={
+            settings.SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)
+        } if hybrid else None,
+    )
+    points = []
+    for chunk in chunks:
+        vector = dense_embedding(chunk['content'])
+        if hybrid:
+            vector = {"": vector, settings.SPARSE_VECTOR_NAME: encode_document(chunk['content'])}
+        points.append(models.PointStruct(id=chunk['id'], vector=vector, payload={"content": chunk['content']}))
+    for i in range(0, len(points), 500):
+        await client.upsert(collection_name=name, points=points[i:i + 500])
+
+async def evaluate(service: RetrievalService, collection_name: str, queries: list) -> dict:
+    hits, latencies = 0, []
+    for query, expected_id in queries:
+        embedding = dense_embedding(query)
+        start = time.perf_counter()
+        results = await service._search(query, embedding, collection_name)
+        latencies.append(time.perf_counter() - start)
+        hits += any(hit.id == expected_id for hit in results)
+    latencies.sort()
+    return {
+        "recall": hits / len(queries),
+        "p50": statistics.median(latencies),
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+async def main_async(n_chunks: int, n_queries: int):
+    chunks = make_corpus(n_chunks)
+    queries = make_queries(chunks, n_queries)
+    qdrant = AsyncQdrantClient(location=":memory:")
+    await load_collection(qdrant, "dense", chunks, hybrid=False)
+    await load_collection(qdrant, "hybrid", chunks, hybrid=True)
+
+    service = RetrievalService(openai_client=FakeAsyncOpenAI(), qdrant_client=qdrant)
+    print(f"{n_chunks} chunks, {len(queries)} identifier queries, top_k={settings.RETRIEVAL_TOP_K}")
+    for name in ("dense", "hybrid"):
+        result = await evaluate(service, name, queries)
+        print(f"{name:>6}: recall@{settings.RETRIEVAL_TOP_K} {result['recall']:.3f}  "
+              f"p50 {result['p50'] * 1000:.1f}ms  p99 {result['p99'] * 1000:.1f}ms")
+    await service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.chunks, args.queries))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures wall-clock time of page-range parallel PDF conversion against worker count,
+and checks the merged output matches the single-process conversion.
+
+Usage:
+    python -m benchmarks.parallel_conversion path/to/manual.pdf --workers 1 2 4 8
+"""
+import argparse
+import math
+import tempfile
+import time
+import pandas as pd
+from app.services.docling_service import ConverterPool, create_df_from_pdf, get_pdf_page_count
+
+COMPARED_COLUMNS = ["page_hash", "extra.page_num", "contents_md", "contents_dt"]
+
+def split_page_ranges(page_count: int, n_workers: int, min_pages_per_range: int) -> list:
+    """Splits pages 1..page_count into contiguous, 1-based inclusive ranges, one per worker."""
+    pages_per_range = max(min_pages_per_range, math.ceil(page_count / max(1, n_workers)))
+    return [
+        (start, min(start + pages_per_range - 1, page_count))
+        for start in range(1, page_count + 1, pages_per_range)
+    ]
+
+def convert_pdf_parallel(pool: ConverterPool, file_path, output_dir, min_pages_per_range: int) -> pd.DataFrame:
+    """
+    Converts a whole PDF by splitting it into page ranges, converting the ranges in the pool's
+    worker processes, and merging the per-page rows back in page order.
+    """
+    page_ranges = split_page_ranges(get_pdf_page_count(file_path), pool.size, min_pages_per_range)
+    if len(page_ranges) <= 1:
+        return pool.submit(file_path, output_dir).result()
+    futures = [pool.submit(file_path, output_dir, page_range) for page_range in page_ranges]
+    dfs = [df for df in (future.result() for future in futures) if not df.empty]
+    if not dfs:
+        return pd.DataFrame()
+    return pd.concat(dfs, ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--min-pages-per-range", type=int, default=16)
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp()
+
+    # Warm the in-process converter so model loading is not counted
+    create_df_from_pdf(args.pdf, output_dir, page_range=(1, 1))
+    start = time.perf_counter()
+    reference = create_df_from_pdf(args.pdf, output_dir)
+    baseline = time.perf_counter() - start
+    print(f"pages={len(reference)}")
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8} {'matches':>8}")
+    print(f"{'single':>8} {baseline:10.2f} {1.0:8.2f} {'-':>8}")
+
+    for n_workers in args.workers:
+        pool = ConverterPool(n_workers)
+        try:
+            start = time.perf_counter()
+            df = convert_pdf_parallel(pool, args.pdf, output_dir, args.min_pages_per_range)
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+        matches = df[COMPARED_COLUMNS].equals(reference[COMPARED_COLUMNS])
+        print(f"{n_workers:>8} {elapsed:10.2f} {baseline / elapsed:8.2f} {str(matches):>8}")
+
+if __name__ == "__main__":
+    main()
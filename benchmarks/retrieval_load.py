@@ -0,0 +1,84 @@
+"""
+Load-tests /api/retrieve with concurrent queries against in-process stand-ins and reports
+p50/p99 latency. Compares the shared async RetrievalService with stand-ins that block the
+event loop the way the previous synchronous clients did.
+
+Usage:
+    python -m benchmarks.retrieval_load --concurrency 100 --requests 500
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("QDRANT_URL", "localhost:6333")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import httpx
+from app.utils import db_utils
+from app.main import app
+from app.services.retrieval_service import RetrievalService
+from benchmarks.stand_ins import FakeAsyncOpenAI, FakeAsyncQdrant, BlockingFakeOpenAI, BlockingFakeQdrant
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+async def run_load(service, concurrency, n_requests):
+    app.state.retrieval_service = service
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def _one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/retrieve", json={"query": f"question {i}", "collection_name": "bench"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[_one(i) for i in range(n_requests)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.mean(latencies),
+        "throughput": n_requests / elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.01)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--skip-blocking", action="store_true", help="Only run the async service")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    db_utils.DB_PATH = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    db_utils.init_db()
+
+    modes = [("async", FakeAsyncOpenAI, FakeAsyncQdrant)]
+    if not args.skip_blocking:
+        modes.append(("blocking", BlockingFakeOpenAI, BlockingFakeQdrant))
+
+    print(f"concurrency={args.concurrency} requests={args.requests}")
+    print(f"{'mode':>10} {'p50 (s)':>9} {'p99 (s)':>9} {'mean (s)':>9} {'req/s':>8}")
+    for name, openai_cls, qdrant_cls in modes:
+        service = RetrievalService(
+            openai_client=openai_cls(embed_latency=args.embed_latency, chat_latency=args.chat_latency),
+            qdrant_client=qdrant_cls(search_latency=args.search_latency),
+        )
+        result = asyncio.run(run_load(service, args.concurrency, args.requests))
+        print(f"{name:>10} {result['p50']:9.3f} {result['p99']:9.3f} {result['mean']:9.3f} {result['throughput']:8.1f}")
+
+if __name__ == "__main__":
+    main()
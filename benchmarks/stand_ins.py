@@ -0,0 +1,106 @@
+"""
+In-process stand-ins for the OpenAI and Qdrant clients, with injectable latency.
+They mimic only the client methods the services call.
+"""
+import asyncio
+import hashlib
+import random
+import time
+from types import SimpleNamespace
+
+def fake_embedding(text: str, dim: int) -> list:
+    """Deterministic pseudo-random unit vector for a text."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+class _Latency:
+    def __init__(self, mean: float, jitter: float = 0.2):
+        self.mean = mean
+        self.jitter = jitter
+
+    def sample(self) -> float:
+        return max(0.0, random.gauss(self.mean, self.mean * self.jitter))
+
+class FakeAsyncOpenAI:
+    def __init__(self, embed_latency=0.05, chat_latency=0.5, dim=64, answer="See [Fig: pg_1_fig_1] for details."):
+        self._embed_latency = _Latency(embed_latency)
+        self._chat_latency = _Latency(chat_latency)
+        self.dim = dim
+        self.answer = answer
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    async def _embed(self, input, model, **kwargs):
+        await asyncio.sleep(self._embed_latency.sample())
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=fake_embedding(text, self.dim)) for i, text in enumerate(texts)
+        ])
+
+    async def _chat(self, model, messages, stream=False, **kwargs):
+        latency = self._chat_latency.sample()
+        if stream:
+            return self._stream_answer(latency)
+        await asyncio.sleep(latency)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer))])
+
+    async def _stream_answer(self, latency):
+        # A quarter of the latency before the first token, the rest spread over the tokens
+        tokens = [token + " " for token in self.answer.split(" ")]
+        await asyncio.sleep(latency / 4)
+        for token in tokens:
+            await asyncio.sleep(latency * 3 / 4 / len(tokens))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    async def close(self):
+        pass
+
+class FakeAsyncQdrant:
+    def __init__(self, search_latency=0.01, chunks=None):
+        self._search_latency = _Latency(search_latency)
+        self.chunks = chunks or [f"Chunk {i} <!-- figure: pg_1_fig_1 -->" for i in range(10)]
+
+    def _points(self, limit):
+        return SimpleNamespace(points=[
+            SimpleNamespace(id=i, score=1.0 - i / 100, payload={"content": chunk, "page_num": 1})
+            for i, chunk in enumerate(self.chunks[:limit])
+        ])
+
+    async def query_points(self, collection_name, query, limit=10, **kwargs):
+        await asyncio.sleep(self._search_latency.sample())
+        return self._points(limit)
+
+    async def query_batch_points(self, collection_name, requests, **kwargs):
+        await asyncio.sleep(self._search_latency.sample())
+        return [self._points(request.limit) for request in requests]
+
+    async def get_collection(self, collection_name):
+        return SimpleNamespace()
+
+    async def close(self):
+        pass
+
+class BlockingFakeOpenAI(FakeAsyncOpenAI):
+    """Same interface, but blocks the event loop like the synchronous client used to."""
+
+    async def _embed(self, input, model, **kwargs):
+        time.sleep(self._embed_latency.sample())
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=fake_embedding(text, self.dim)) for i, text in enumerate(texts)
+        ])
+
+    async def _chat(self, model, messages, **kwargs):
+        time.sleep(self._chat_latency.sample())
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer))])
+
+class BlockingFakeQdrant(FakeAsyncQdrant):
+    async def query_points(self, collection_name, query, limit=10, **kwargs):
+        time.sleep(self._search_latency.sample())
+        return self._points(limit)
+
+    async def query_batch_points(self, collection_name, requests, **kwargs):
+        time.sleep(self._search_latency.sample())
+        return [self._points(request.limit) for request in requests]
@@ -0,0 +1,105 @@
+"""
+Generates synthetic PDFs for benchmarks: pages of filler text that name a few unique
+part numbers (so benchmark queries have answers), with raster figures at a configurable
+density. The same seed always produces the same documents.
+
+Usage:
+    python -m benchmarks.synthetic_pdfs out_dir --documents 4 --pages 50 --figures-per-page 0.5
+"""
+import argparse
+import os
+import random
+from typing import List
+import fitz
+
+WORDS = (
+    "pump valve pressure flow sensor motor bearing seal housing impeller shaft coupling "
+    "inspection maintenance torque voltage current filter nozzle gasket calibration "
+    "temperature lubrication alignment vibration assembly bracket manifold controller "
+    "relay circuit fuse panel cable terminal actuator piston cylinder hydraulic reservoir"
+).split()
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 56
+FIGURE_HEIGHT = 180
+
+def part_number(document_index: int, page_num: int) -> str:
+    """The part number mentioned on a page, which benchmark queries ask about."""
+    return f"PX-{document_index:02d}{page_num:04d}"
+
+def _paragraph(rng: random.Random, n_words: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    return " ".join(words).capitalize() + "."
+
+def _figure(rng: random.Random, width: int, height: int) -> fitz.Pixmap:
+    """A raster image of random blocks, so each figure has distinct bytes."""
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+    pixmap.clear_with(255)
+    for _ in range(12):
+        x, y = rng.randrange(width - 20), rng.randrange(height - 20)
+        block = fitz.IRect(x, y, min(width, x + rng.randrange(20, 120)), min(height, y + rng.randrange(20, 80)))
+        pixmap.set_rect(block, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return pixmap
+
+def _figure_count(rng: random.Random, figures_per_page: float) -> int:
+    """Whole figures per page, plus one more with the fractional part as probability."""
+    whole = int(figures_per_page)
+    return whole + (1 if rng.random() < figures_per_page - whole else 0)
+
+def make_pdf(path: str, pages: int, figures_per_page: float = 0.5, document_index: int = 0,
+             seed: int = 0, words_per_page: int = 350) -> int:
+    """Writes a synthetic PDF and returns the number of figures in it."""
+    rng = random.Random(f"{seed}:{document_index}")
+    figures = 0
+    with fitz.open() as pdf:
+        for page_num in range(1, pages + 1):
+            page = pdf.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            n_figures = min(2, _figure_count(rng, figures_per_page))
+            text_bottom = PAGE_HEIGHT - MARGIN - n_figures * (FIGURE_HEIGHT + 30)
+
+            part = part_number(document_index, page_num)
+            text = [f"Section {page_num}: servicing part {part}",
+                    f"Part {part} must be inspected every {rng.randrange(100, 5000)} operating hours."]
+            remaining = words_per_page
+            while remaining > 0:
+                n_words = min(remaining, rng.randrange(40, 90))
+                text.append(_paragraph(rng, n_words))
+                remaining -= n_words
+            page.insert_textbox(fitz.Rect(MARGIN, MARGIN, PAGE_WIDTH - MARGIN, text_bottom), "\n\n".join(text), fontsize=9)
+
+            top = text_bottom + 10
+            for figure in range(1, n_figures + 1):
+                rect = fitz.Rect(MARGIN, top, PAGE_WIDTH - MARGIN, top + FIGURE_HEIGHT)
+                page.insert_image(rect, pixmap=_figure(rng, 480, FIGURE_HEIGHT))
+                page.insert_text((MARGIN, rect.y1 + 14), f"Figure {page_num}.{figure}: layout of part {part}", fontsize=8)
+                top = rect.y1 + 30
+            figures += n_figures
+        pdf.save(path, garbage=3, deflate=True)
+    return figures
+
+def make_corpus(output_dir: str, documents: int, pages: int, figures_per_page: float = 0.5,
+                seed: int = 0) -> List[str]:
+    """Writes documents synthetic PDFs into output_dir and returns their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for index in range(documents):
+        path = os.path.join(output_dir, f"synthetic-{index:02d}.pdf")
+        make_pdf(path, pages, figures_per_page, document_index=index, seed=seed)
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir")
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--figures-per-page", type=float, default=0.5,
+                        help="Average figures per page, at most 2 on any page")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for path in make_corpus(args.output_dir, args.documents, args.pages, args.figures_per_page, args.seed):
+        print(path)
+
+if __name__ == "__main__":
+    main()
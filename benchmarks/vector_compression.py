@@ -0,0 +1,151 @@
+"""
+Reports the memory footprint and recall@k of each vector compression setting: shortened
+embedding dimensions, scalar (int8) or binary quantization with and without rescoring, and
+full-precision vectors in RAM or on disk.
+
+Vectors are read from an existing collection (full-size embeddings), or generated when no
+collection is given. Shortened dimensions are emulated the way the text-embedding-3 models
+produce them: truncate, then re-normalize. Quantization is emulated in NumPy following
+Qdrant's schemes, so recall figures are close to, not identical to, what Qdrant returns.
+Ground truth is exact cosine search over the full vectors, with held-out vectors as queries.
+
+Usage:
+    python -m benchmarks.vector_compression --collection <job_id> --limit 20000
+    python -m benchmarks.vector_compression --synthetic 20000 --project 5000000
+"""
+import argparse
+import os
+
+os.environ.setdefault("QDRANT_URL", "localhost:6333")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import numpy as np
+from app.config import settings
+
+# Approximate per-point cost of the HNSW graph's bottom layer with the default m=16
+HNSW_BYTES_PER_POINT = 16 * 2 * 4
+
+def load_collection_vectors(collection_name: str, limit: int) -> np.ndarray:
+    from qdrant_client import QdrantClient
+    client = QdrantClient(url=settings.QDRANT_URL, timeout=60.0)
+    vectors, offset = [], None
+    while len(vectors) < limit:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=min(1000, limit - len(vectors)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=True,
+        )
+        vectors.extend(point.vector[""] if isinstance(point.vector, dict) else point.vector for point in points)
+        if offset is None:
+            break
+    return np.asarray(vectors, dtype=np.float32)
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """
+    Clustered vectors whose variance decays along the dimensions, so leading dimensions
+    carry most of the signal as in Matryoshka-trained embeddings. Only a rough stand-in:
+    use --collection for figures that reflect real embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    scale = 1.0 / np.sqrt(1.0 + np.arange(dim) / 256.0)
+    centers = rng.standard_normal((max(1, n // 50), dim)) * scale
+    vectors = centers[rng.integers(0, len(centers), n)] + rng.standard_normal((n, dim)) * scale
+    return vectors.astype(np.float32)
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    candidates = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+def rescore(candidates: np.ndarray, queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = np.einsum("qd,qcd->qc", queries, corpus[candidates])
+    return np.take_along_axis(candidates, scores.argsort(axis=1)[:, ::-1][:, :k], axis=1)
+
+def scalar_quantize(vectors: np.ndarray, quantile: float = 0.99) -> np.ndarray:
+    low, high = np.quantile(vectors, [1 - quantile, quantile])
+    codes = np.round((np.clip(vectors, low, high) - low) / (high - low) * 255)
+    return codes * (high - low) / 255 + low
+
+def binary_quantize(vectors: np.ndarray) -> np.ndarray:
+    return np.where(vectors > 0, 1.0, -1.0).astype(np.float32)
+
+def search(corpus: np.ndarray, queries: np.ndarray, quantization: str, k: int, oversampling: float,
+           rescore_candidates: bool) -> np.ndarray:
+    if quantization == "none":
+        return top_k(queries @ corpus.T, k)
+    quantize = scalar_quantize if quantization == "scalar" else binary_quantize
+    # Qdrant compares quantized corpus vectors against the query (binary: both are quantized)
+    query_codes = binary_quantize(queries) if quantization == "binary" else queries
+    approximate = query_codes @ quantize(corpus).T
+    if not rescore_candidates:
+        return top_k(approximate, k)
+    candidates = top_k(approximate, int(k * oversampling))
+    return rescore(candidates, queries, corpus, k)
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def footprint(dim: int, quantization: str, on_disk: bool) -> tuple:
+    """Returns (RAM bytes, disk bytes) per point for the vectors and graph, excluding payloads."""
+    original = dim * 4
+    codes = {"none": 0, "scalar": dim, "binary": (dim + 7) // 8}[quantization]
+    ram = codes + HNSW_BYTES_PER_POINT + (0 if on_disk else original)
+    return ram, original + codes
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} PB"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", help="Read full-size vectors from this collection")
+    parser.add_argument("--limit", type=int, default=20000, help="Vectors to read from the collection")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Vectors to generate without --collection")
+    parser.add_argument("--dim", type=int, default=3072, help="Size of generated vectors")
+    parser.add_argument("--dims", default="3072,1536,1024,512,256", help="Comma-separated sizes to evaluate")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument("--oversampling", type=float, default=settings.QUANTIZATION_OVERSAMPLING)
+    parser.add_argument("--project", type=int, help="Points to project memory for (default: vectors loaded)")
+    args = parser.parse_args()
+
+    if args.collection:
+        vectors = load_collection_vectors(args.collection, args.limit + args.queries)
+    else:
+        vectors = synthetic_vectors(args.synthetic + args.queries, args.dim)
+    if len(vectors) <= args.queries:
+        parser.error(f"Need more than {args.queries} vectors, got {len(vectors)}.")
+
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    full_dim = corpus.shape[1]
+    n_points = args.project or len(corpus)
+    truth = top_k(normalize(queries) @ normalize(corpus).T, args.k)
+
+    print(f"{len(corpus)} vectors of {full_dim} dims, {len(queries)} queries, recall@{args.k}, "
+          f"oversampling {args.oversampling}, memory projected for {n_points} points")
+    print(f"{'dims':>5} {'quantization':>12} {'recall':>8} {'rescored':>9} "
+          f"{'RAM':>10} {'RAM (on disk)':>14} {'disk':>10}")
+    for dim in sorted({int(d) for d in args.dims.split(",") if int(d) <= full_dim}, reverse=True):
+        corpus_d, queries_d = normalize(corpus[:, :dim]), normalize(queries[:, :dim])
+        for quantization in ("none", "scalar", "binary"):
+            raw = recall(search(corpus_d, queries_d, quantization, args.k, args.oversampling, False), truth)
+            rescored = "-"
+            if quantization != "none":
+                found = search(corpus_d, queries_d, quantization, args.k, args.oversampling, True)
+                rescored = f"{recall(found, truth):.3f}"
+            ram, disk = footprint(dim, quantization, on_disk=False)
+            ram_on_disk, _ = footprint(dim, quantization, on_disk=True)
+            print(f"{dim:>5} {quantization:>12} {raw:>8.3f} {rescored:>9} {format_bytes(ram * n_points):>10} "
+                  f"{format_bytes(ram_on_disk * n_points):>14} {format_bytes(disk * n_points):>10}")
+
+if __name__ == "__main__":
+    main()
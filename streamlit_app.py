@@ -3,6 +3,7 @@ import requests
 import pandas as pd
 import re
 import os
+import json
 
 # Configuration
 API_BASE_URL = "http://localhost:8000/api"
@@ -11,15 +12,27 @@ STORAGE_PATH = "storage"
 st.set_page_config(page_title="Smart Data Q&A", layout="wide")
 
 # --- Helper Functions ---
-def get_all_jobs():
+# Cached between reruns; the "Refresh List" button clears the cache
+@st.cache_data(ttl=30, show_spinner=False)
+def get_recent_jobs(limit=50):
     try:
-        response = requests.get(f"{API_BASE_URL}/jobs")
+        response = requests.get(f"{API_BASE_URL}/jobs", params={'limit': limit})
         response.raise_for_status()
         return response.json().get('jobs', [])
     except requests.exceptions.RequestException as e:
         st.error(f"Error getting jobs: {e}")
         return []
 
+@st.cache_data(ttl=30, show_spinner=False)
+def get_knowledge_bases():
+    try:
+        response = requests.get(f"{API_BASE_URL}/kbs")
+        response.raise_for_status()
+        return response.json().get('knowledge_bases', [])
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error getting knowledge bases: {e}")
+        return []
+
 def get_job_details(job_id):
     try:
         response = requests.get(f"{API_BASE_URL}/job/{job_id}")
@@ -42,24 +55,57 @@ def ingest_file(kb_name, uploaded_file):
             return None
     return None
 
-def get_ingestion_status(job_id):
+def iter_events(response):
+    """Yields (event, data) pairs from a Server-Sent Events response."""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: ") and event:
+            yield event, json.loads(line[len("data: "):])
+            event = None
+
+def stream_answer(query, collection_name):
+    """Yields (event, data) pairs from the streaming retrieval endpoint."""
     try:
-        response = requests.get(f"{API_BASE_URL}/ingest/status/{job_id}")
-        response.raise_for_status()
-        return response.json()
+        payload = {"query": query, "collection_name": collection_name}
+        with requests.post(f"{API_BASE_URL}/retrieve/stream", json=payload, stream=True) as response:
+            response.raise_for_status()
+            yield from iter_events(response)
     except requests.exceptions.RequestException as e:
-        st.error(f"Error getting status: {e}")
-        return None
+        st.error(f"Error during retrieval: {e}")
 
-def retrieve_answer(query, collection_name):
+def progress_fraction(status, progress):
+    if status == "completed":
+        return 1.0
+    total = progress.get('pages_total') or 0
+    if not total:
+        return 0.0
+    # Pages pass through conversion and then figure description; chunks are stored right behind
+    done = progress.get('pages_converted', 0) + progress.get('pages_processed', 0)
+    return min(0.99, done / (2 * total))
+
+def progress_text(status, progress):
+    if not progress or status == "in_queue":
+        return "Waiting for a worker..."
+    return (f"{status.capitalize()}: {progress.get('pages_converted', 0)}/{progress.get('pages_total', 0)} pages converted, "
+            f"{progress.get('figures_described', 0)} figures described, "
+            f"{progress.get('points_upserted', 0)} chunks stored")
+
+def follow_progress(job_id, container):
+    """Shows a progress bar for a job, updated from the progress stream until the job ends."""
+    bar = container.progress(0.0, text="Connecting...")
+    status = None
     try:
-        payload = {"query": query, "collection_name": collection_name}
-        response = requests.post(f"{API_BASE_URL}/retrieve", json=payload)
-        response.raise_for_status()
-        return response.json()
+        # The server sends a keep-alive line at least every 15 seconds
+        with requests.get(f"{API_BASE_URL}/ingest/progress/{job_id}", stream=True, timeout=(5, 60)) as response:
+            response.raise_for_status()
+            for event, data in iter_events(response):
+                status, progress = data['status'], data.get('progress') or {}
+                bar.progress(progress_fraction(status, progress), text=progress_text(status, progress))
     except requests.exceptions.RequestException as e:
-        st.error(f"Error during retrieval: {e}")
-        return None
+        container.error(f"Error following progress: {e}")
+    return status
 
 # --- Sidebar for Ingestion and Status ---
 st.sidebar.title("Knowledge Base Management")
@@ -70,14 +116,20 @@ uploaded_file = st.sidebar.file_uploader("Upload a PDF document", type=["pdf"])
 
 if st.sidebar.button("Create KB", key="create_kb_button"):
     if kb_name_input and uploaded_file:
-        with st.spinner("Processing document... This may take a moment."):
+        with st.spinner("Uploading document..."):
             ingest_result = ingest_file(kb_name_input, uploaded_file)
             if ingest_result:
                 st.session_state.job_id = ingest_result.get('job_id')
                 st.session_state.kb_name = kb_name_input
                 st.sidebar.success(f"Ingestion started for KB '{st.session_state.kb_name}'.")
                 st.sidebar.info(f"Job ID: {st.session_state.job_id}")
-                st.sidebar.info("You can now check the status below or see the list of all KBs.")
+        if ingest_result:
+            status = follow_progress(st.session_state.job_id, st.sidebar)
+            st.cache_data.clear()
+            if status == "completed":
+                st.sidebar.success("Ingestion completed. You can now ask questions.")
+            elif status == "failed":
+                st.sidebar.error("Ingestion failed.")
     else:
         st.sidebar.warning("Please provide a name and upload a PDF file.")
 
@@ -86,26 +138,32 @@ st.sidebar.header("2. Existing Knowledge Bases")
 if st.sidebar.button("Refresh List", key="refresh_jobs"):
     st.cache_data.clear()
 
-# Fetch and display jobs
-jobs_list = get_all_jobs()
-if jobs_list:
-    df = pd.DataFrame(jobs_list)
-    df = df[['kb_name', 'job_id', 'status', 'timestamp']]
-    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-    st.sidebar.dataframe(df, hide_index=True)
+# Fetch and display knowledge bases and the latest jobs
+kb_list = get_knowledge_bases()
+if kb_list:
+    kb_df = pd.DataFrame(kb_list)
+    kb_df = kb_df[['kb_name', 'documents', 'jobs', 'last_job_id', 'last_job_at']]
+    kb_df['last_job_at'] = pd.to_datetime(kb_df['last_job_at']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    st.sidebar.dataframe(kb_df, hide_index=True)
+
+    jobs_list = get_recent_jobs()
+    if jobs_list:
+        df = pd.DataFrame(jobs_list)
+        df = df[['kb_name', 'job_id', 'status', 'timestamp']]
+        df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        st.sidebar.expander(f"Latest {len(jobs_list)} jobs").dataframe(df, hide_index=True)
 else:
     st.sidebar.info("No knowledge bases found.")
 
 st.sidebar.markdown("---")
-st.sidebar.header("3. Check Ingestion Status")
-job_id_input = st.sidebar.text_input("Enter Job ID to check status", key="job_id_input")
+st.sidebar.header("3. Follow Ingestion Progress")
+job_id_input = st.sidebar.text_input("Enter Job ID to follow", key="job_id_input")
 
-if st.sidebar.button("Check Status", key="check_status_button"):
+if st.sidebar.button("Follow Progress", key="check_status_button"):
     if job_id_input:
-        with st.spinner("Checking status..."):
-            status_result = get_ingestion_status(job_id_input)
-            if status_result:
-                st.sidebar.metric(label=f"Status for {job_id_input}", value=status_result.get('status', 'Unknown').capitalize())
+        status = follow_progress(job_id_input, st.sidebar)
+        if status:
+            st.sidebar.metric(label=f"Status for {job_id_input}", value=status.capitalize())
     else:
         st.sidebar.warning("Please enter a Job ID.")
 
@@ -125,41 +183,49 @@ query = st.text_area("Enter your question here", height=150)
 
 if st.button("Get Answer", key="get_answer_button"):
     if collection_name and query:
+        answer_placeholder = st.empty()
+        response_text = None
+        error_message = None
+        figure_ids = []
         with st.spinner("Searching for answers..."):
-            retrieval_result = retrieve_answer(query, collection_name)
-            if retrieval_result and 'response' in retrieval_result:
-                st.success("Answer Found!")
-                response_text = retrieval_result['response']
-                
-                with st.expander("Show Raw LLM Response"):
-                    st.code(response_text)
-                
-                # Look for both [Fig: ...] and [figure: ...] patterns
-                figure_matches = list(re.finditer(r'\[Fig: (.*?)\]', response_text, re.IGNORECASE))
-                figure_matches.extend(re.finditer(r'\[figure: (.*?)\]', response_text, re.IGNORECASE))
-                
-                if figure_matches:
-                    job_details = get_job_details(collection_name)
-                    if job_details:
-                        kb_name = job_details.get('kb_name')
-                        displayed_figures = set() # Keep track of displayed figures
-                        for match in figure_matches:
-                            unique_id = match.group(1)
-                            if unique_id not in displayed_figures:
-                                image_path = os.path.join(STORAGE_PATH, kb_name, "processed", "images", f"{unique_id}.png")
-                                if os.path.exists(image_path):
-                                    st.image(image_path, caption=f"Figure: {unique_id}")
-                                else:
-                                    st.warning(f"Could not find image: {image_path}")
-                                displayed_figures.add(unique_id)
-
-                        # Clean the response text - remove both formats
-                        response_text = re.sub(r'\[Fig: (.*?)\]', "", response_text, flags=re.IGNORECASE)
-                        response_text = re.sub(r'\[figure: (.*?)\]', "", response_text, flags=re.IGNORECASE).strip()
-
-                st.markdown(response_text)
-
-            else:
-                st.error("Could not retrieve an answer.")
+            partial_answer = ""
+            for event, data in stream_answer(query, collection_name):
+                if event == "sources":
+                    pages = sorted({source['page_num'] for source in data if source.get('page_num') is not None})
+                    st.caption(f"Retrieved {len(data)} passages from pages {', '.join(map(str, pages))}")
+                elif event == "delta":
+                    partial_answer += data
+                    answer_placeholder.markdown(partial_answer + "▌")
+                elif event == "done":
+                    response_text = data['response']
+                    figure_ids = data['figures']
+                elif event == "error":
+                    error_message = data
+
+        if response_text is not None:
+            st.success("Answer Found!")
+
+            with st.expander("Show Raw LLM Response"):
+                st.code(response_text)
+
+            if figure_ids:
+                job_details = get_job_details(collection_name)
+                if job_details:
+                    kb_name = job_details.get('kb_name')
+                    for unique_id in figure_ids:
+                        image_path = os.path.join(STORAGE_PATH, kb_name, "processed", "images", f"{unique_id}.png")
+                        if os.path.exists(image_path):
+                            st.image(image_path, caption=f"Figure: {unique_id}")
+                        else:
+                            st.warning(f"Could not find image: {image_path}")
+
+                    # Clean the response text - remove both formats
+                    response_text = re.sub(r'\[Fig: (.*?)\]', "", response_text, flags=re.IGNORECASE)
+                    response_text = re.sub(r'\[figure: (.*?)\]', "", response_text, flags=re.IGNORECASE).strip()
+
+            answer_placeholder.markdown(response_text)
+        else:
+            answer_placeholder.empty()
+            st.error(error_message or "Could not retrieve an answer.")
     else:
         st.warning("Please provide the Knowledge Base Name and a question.")
\ No newline at end of file
@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# Settings are read when app.config is imported: run against stub models and the embedded store
+os.environ.update({
+    "OPENAI_API_KEY": "test",
+    "EMBEDDING_PROVIDER": "stub",
+    "GENERATION_PROVIDER": "stub",
+    "VECTOR_STORE_BACKEND": "embedded",
+    "EMBEDDED_STORE_PATH": tempfile.mkdtemp(prefix="smart-rag-test-store-"),
+    "CONTENT_CACHE_ENABLED": "false",
+})
@@ -0,0 +1,98 @@
+import hashlib
+from datetime import datetime
+import pytest
+from qdrant_client import models
+from app.config import settings
+from app.utils import db_utils
+from app.workers import ingestion
+from app.services.vector_clients import create_vector_client
+
+def make_pages(n_pages: int, edited: tuple = ()) -> list:
+    """
+    Short pages, so that chunks of CHUNK_SIZE characters span two or three of them. Every word
+    names its page, so a page whose text is missing from the stored chunks can be told apart.
+    """
+    return [
+        " ".join(f"p{page_num}{'edit' if page_num in edited else 'w'}{i}" for i in range(20))
+        for page_num in range(1, n_pages + 1)
+    ]
+
+@pytest.fixture(autouse=True)
+def small_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 300)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP", 50)
+    monkeypatch.setattr(db_utils, "DB_PATH", str(tmp_path / "jobs.db"))
+    db_utils.init_db()
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    """Runs process_ingestion on the given page texts, in place of a converted PDF."""
+    documents = {}
+
+    def document_hash(file_path):
+        return hashlib.sha256("\0".join(documents[file_path]).encode("utf-8")).hexdigest()
+
+    def pdf_pages(file_path, output_dir):
+        for page_num, text in enumerate(documents[file_path], start=1):
+            content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            yield {"document": "manual.pdf", "hash": document_hash(file_path), "page_hash": f"{page_num}:{content_hash}",
+                   "content_hash": content_hash, "contents_md": text, "extra.page_num": page_num}
+
+    monkeypatch.setattr(ingestion, "get_document_hash", document_hash)
+    monkeypatch.setattr(ingestion, "get_pdf_page_count", lambda file_path: len(documents[file_path]))
+    monkeypatch.setattr(ingestion, "iter_pdf_pages", pdf_pages)
+    monkeypatch.setattr(ingestion, "process_pages_figures", lambda rows, images_dir: rows)
+
+    def run(kb_name: str, pages: list) -> dict:
+        input_dir = tmp_path / kb_name / "input"
+        input_dir.mkdir(parents=True, exist_ok=True)
+        file_path = str(input_dir / "manual.pdf")
+        documents[file_path] = pages
+        job_id = f"{kb_name}-{len(pages)}-{hashlib.sha1(str(pages).encode()).hexdigest()[:8]}"
+        db_utils.add_job(job_id, "in_queue", kb_name, datetime.now(), file_path=file_path)
+        ingestion.process_ingestion(file_path, job_id)
+        job = db_utils.get_job(job_id)
+        assert job['status'] == "completed"
+        return job
+
+    return run
+
+def stored_points(job: dict) -> list:
+    client = create_vector_client()
+    records, offset = [], None
+    while True:
+        page, offset = client.scroll(
+            collection_name=job['collection_name'],
+            scroll_filter=models.Filter(must=[
+                models.FieldCondition(key="document", match=models.MatchValue(value="manual.pdf")),
+            ]),
+            limit=256,
+            offset=offset,
+            with_payload=True,
+        )
+        records.extend(page)
+        if offset is None:
+            return [record.payload for record in records]
+
+def covered_pages(job: dict) -> set:
+    return {page for payload in stored_points(job) for page in payload['page_nums']}
+
+def assert_matches_fresh_ingest(ingest, incremental_job: dict, pages: list, kb_name: str):
+    fresh_job = ingest(kb_name, pages)
+    assert covered_pages(incremental_job) == covered_pages(fresh_job) == set(range(1, len(pages) + 1))
+    # Every word of the new version is stored, and nothing else
+    stored_words = {word for payload in stored_points(incremental_job) for word in payload['content'].split()}
+    assert stored_words == {word for text in pages for word in text.split()}
+
+def test_edit_covers_the_same_pages_as_a_fresh_ingest(ingest):
+    ingest("kb", make_pages(10))
+    edited = make_pages(10, edited=(5,))
+    job = ingest("kb", edited)
+    assert_matches_fresh_ingest(ingest, job, edited, "kb-fresh")
+
+def test_truncation_covers_the_same_pages_as_a_fresh_ingest(ingest):
+    ingest("kb", make_pages(10))
+    ingest("kb", make_pages(10, edited=(5,)))
+    truncated = make_pages(7, edited=(5,))
+    job = ingest("kb", truncated)
+    assert_matches_fresh_ingest(ingest, job, truncated, "kb-fresh")